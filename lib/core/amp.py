@@ -0,0 +1,95 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+
+import torch
+
+
+logger = logging.getLogger(__name__)
+
+AMP_DTYPES = {
+    'fp16': torch.float16,
+    'bf16': torch.bfloat16,
+}
+
+
+def _grad_scaler(device_type, enabled):
+    if hasattr(torch, 'amp') and hasattr(torch.amp, 'GradScaler'):
+        return torch.amp.GradScaler(device_type, enabled=enabled)
+    return torch.cuda.amp.GradScaler(enabled=enabled)
+
+
+def float32(outputs):
+    ''' outputs (a tensor or nested lists of them) cast to fp32 '''
+    if isinstance(outputs, (list, tuple)):
+        return type(outputs)(float32(o) for o in outputs)
+    if torch.is_tensor(outputs) and outputs.is_floating_point():
+        return outputs.float()
+    return outputs
+
+
+class MixedPrecision(object):
+    '''
+    Autocast and loss scaling for the training loops. mode is one of
+
+        '' / 'off'  fp32, everything below is a no-op
+        'fp16'      fp16 autocast with loss scaling, bf16 without a GPU
+        'bf16'      bf16 autocast, no scaling needed
+        'auto'      fp16 on CUDA, bf16 on CPU
+
+    One instance serves any number of models, losses and optimizers:
+    backward scales every loss with the same GradScaler, step unscales
+    and steps every optimizer (skipping those whose gradients overflowed)
+    and only then updates the scale, once per iteration. Keep it across
+    epochs, and in checkpoints through state_dict, so the scale does not
+    restart from its initial value.
+    '''
+    def __init__(self, mode='', device_type=None):
+        if device_type is None:
+            device_type = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.device_type = device_type
+
+        mode = (mode or 'off').lower()
+        if mode == 'auto':
+            mode = 'fp16' if device_type == 'cuda' else 'bf16'
+        if mode == 'fp16' and device_type != 'cuda':
+            logger.info('=> no fp16 autocast on {}, using bf16'.format(
+                device_type))
+            mode = 'bf16'
+        if mode != 'off' and mode not in AMP_DTYPES:
+            raise ValueError('unknown TRAIN.AMP mode {}'.format(mode))
+
+        self.enabled = mode != 'off'
+        self.dtype = AMP_DTYPES.get(mode, torch.float32)
+        self.scaler = _grad_scaler(device_type, mode == 'fp16')
+
+    def autocast(self):
+        return torch.autocast(self.device_type, dtype=self.dtype,
+                              enabled=self.enabled)
+
+    def backward(self, *losses):
+        for loss in losses:
+            self.scaler.scale(loss).backward()
+
+    def step(self, *optimizers):
+        for optimizer in optimizers:
+            self.scaler.step(optimizer)
+        self.scaler.update()
+
+    def state_dict(self):
+        return self.scaler.state_dict()
+
+    def load_state_dict(self, state_dict):
+        self.scaler.load_state_dict(state_dict)
+
+
+def build_mixed_precision(config, device_type=None):
+    ''' MixedPrecision of TRAIN.AMP, fp32 if unset '''
+    amp = MixedPrecision(config.TRAIN.get('AMP', ''), device_type)
+    if amp.enabled:
+        logger.info('=> {} autocast on {}{}'.format(
+            str(amp.dtype).split('.')[-1], amp.device_type,
+            ' with loss scaling' if amp.scaler.is_enabled() else ''))
+    return amp
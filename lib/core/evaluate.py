@@ -4,6 +4,7 @@ from __future__ import division
 from __future__ import print_function
 
 import numpy as np
+import torch
 
 from core.inference import get_max_preds
 
@@ -66,3 +67,37 @@ def accuracy(output, target, hm_type='gaussian', thr=0.5):
     return acc, avg_acc, cnt, pred
 
 
+def get_max_preds_on_device(batch_heatmaps):
+    '''
+    get_max_preds for a torch [batch_size, num_joints, height, width]
+    tensor, computed where the tensor is
+    '''
+    width = batch_heatmaps.size(3)
+    maxvals, idx = batch_heatmaps.flatten(2).max(2)
+    preds = torch.stack([idx % width, idx // width], 2).float()
+    preds *= (maxvals > 0).unsqueeze(2).float()
+    return preds, maxvals.unsqueeze(2)
+
+
+def accuracy_on_device(output, target, thr=0.5):
+    '''
+    accuracy (gaussian heatmaps) without leaving the device, so that
+    training loops do not sync on every iteration
+    :return: avg_acc and cnt as 0-dim tensors, pred [B, J, 2]
+    '''
+    pred, _ = get_max_preds_on_device(output.detach())
+    target, _ = get_max_preds_on_device(target.detach())
+    h = output.size(2)
+    w = output.size(3)
+    norm = pred.new_tensor([h, w]).double() / 10
+
+    valid = (target[:, :, 0] > 1) & (target[:, :, 1] > 1)
+    dists = ((pred.double() - target.double()) / norm).norm(dim=2)
+    hits = ((dists < thr) & valid).sum(0).double()
+    counted = valid.sum(0).double()
+
+    joint_valid = counted > 0
+    cnt = joint_valid.sum()
+    joint_acc = hits / counted.clamp(min=1)
+    avg_acc = (joint_acc * joint_valid).sum() / cnt.clamp(min=1)
+    return avg_acc, cnt, pred
@@ -0,0 +1,87 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+
+import numpy as np
+import torch
+import torch.distributed as dist
+
+from dataset.teacher_cache import flatten_outputs
+from dataset.teacher_cache import unflatten_outputs
+
+
+logger = logging.getLogger(__name__)
+
+# process of each network in process-parallel mutual learning
+GNET_RANK = 0
+ENET_RANK = 1
+ROLES = ('GNet', 'ENet')
+
+
+class FeatureExchange(object):
+    '''
+    Swaps the outputs of the two networks of process-parallel mutual
+    learning every step. start posts the .data of the local outputs to the
+    peer process together with a receive for its outputs, wait returns
+    those on the local device; the work in between overlaps with the
+    transfer.
+
+    Every direction is one flat fp32 message. Over gloo it goes through
+    host memory, over nccl it stays on the GPU. The per-sample shapes of
+    the peer's outputs are swapped once, on the first step, so the two
+    networks do not need to match. Both processes must run the same
+    number of steps with the same batch size.
+    '''
+    def __init__(self):
+        if dist.get_world_size() != 2:
+            raise ValueError('process-parallel mutual learning needs a world '
+                             'of 2 processes, got {}'.format(
+                                 dist.get_world_size()))
+        self.rank = dist.get_rank()
+        self.peer = 1 - self.rank
+        self.on_host = dist.get_backend() != 'nccl'
+        self._shapes = None
+        self._layout = None
+        self._pending = None
+
+    def _handshake(self, tensors, layout):
+        mine = ([tuple(t.shape[1:]) for t in tensors], layout)
+        both = [None, None]
+        dist.all_gather_object(both, mine)
+        shapes, layout = both[self.peer]
+        logger.info('=> receiving {} tensors per step from {}'.format(
+            len(shapes), ROLES[self.peer]))
+        return [tuple(s) for s in shapes], layout
+
+    def start(self, outputs):
+        ''' :param outputs: the local model output, a tensor or lists of them '''
+        if self._pending is not None:
+            raise RuntimeError('wait for the previous exchange first')
+        tensors, layout = flatten_outputs(outputs)
+        if self._shapes is None:
+            self._shapes, self._layout = self._handshake(tensors, layout)
+
+        device = tensors[0].device
+        batch_size = tensors[0].size(0)
+        sizes = [batch_size * int(np.prod(s)) for s in self._shapes]
+        send = torch.cat([t.detach().float().reshape(-1) for t in tensors])
+        if self.on_host:
+            send = send.cpu()
+        recv = torch.empty(sum(sizes), dtype=torch.float32,
+                           device=send.device)
+        requests = [dist.isend(send, self.peer), dist.irecv(recv, self.peer)]
+        self._pending = (requests, send, recv, sizes, batch_size, device)
+
+    def wait(self):
+        ''' :return: the peer's outputs of the step, like its model returned '''
+        requests, _, recv, sizes, batch_size, device = self._pending
+        self._pending = None
+        for request in requests:
+            request.wait()
+
+        recv = recv.to(device)
+        tensors = [chunk.view((batch_size,) + shape)
+                   for chunk, shape in zip(recv.split(sizes), self._shapes)]
+        return unflatten_outputs(tensors, self._layout)
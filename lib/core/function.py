@@ -15,8 +15,18 @@ import os
 import numpy as np
 import torch
 
+from core.amp import build_mixed_precision
+from core.amp import float32
 from core.evaluate import accuracy
+from core.evaluate import accuracy_on_device
+from core.exchange import ENET_RANK
+from core.exchange import ROLES
 from core.inference import get_final_preds
+from core.loss import MultiStageDistillLoss
+from core.normalize import build_input_normalize
+from core.occlusion import build_batch_occlusion
+from core.stacked import build_stacked_models
+from utils.heatmap import render_gaussian_targets
 from utils.transforms import flip_back
 from utils.vis import save_debug_images
 
@@ -25,11 +35,15 @@ logger = logging.getLogger(__name__)
 
 
 def train(config, train_loader, model, criterion, optimizer, epoch,
-          output_dir, tb_log_dir):
+          output_dir, tb_log_dir, amp=None):
     batch_time = AverageMeter()
     data_time = AverageMeter()
-    losses = AverageMeter()
-    acc = AverageMeter()
+    losses = DeviceAverageMeter()
+    acc = DeviceAverageMeter()
+
+    normalize = build_input_normalize(train_loader.dataset)
+    if amp is None:
+        amp = build_mixed_precision(config)
 
     # switch to train mode
     model.train()
@@ -38,12 +52,16 @@ def train(config, train_loader, model, criterion, optimizer, epoch,
     for i, (input, target, target_weight, meta) in enumerate(train_loader):
         # measure data loading time
         data_time.update(time.time() - end)
+        input = normalize(input)
 
-        # compute output
-        outputs = model(input)
+        # compute output, the loss in fp32
+        with amp.autocast():
+            outputs = model(input)
+        outputs = float32(outputs)
 
         target = target.cuda(non_blocking=True)
         target_weight = target_weight.cuda(non_blocking=True)
+        target, target_weight = dense_targets(config, target, target_weight)
 
         if isinstance(outputs, list):
             loss = criterion(outputs[0], target, target_weight)
@@ -58,14 +76,13 @@ def train(config, train_loader, model, criterion, optimizer, epoch,
         # compute gradient and do update step
         optimizer.zero_grad()
         #print(loss.device)
-        loss.backward()
-        optimizer.step()
+        amp.backward(loss)
+        amp.step(optimizer)
 
-        # measure accuracy and record loss
-        losses.update(loss.item(), input.size(0))
+        # measure accuracy and record loss, read back at PRINT_FREQ only
+        losses.update(loss, input.size(0))
 
-        _, avg_acc, cnt, pred = accuracy(output.detach().cpu().numpy(),
-                                         target.detach().cpu().numpy())
+        avg_acc, cnt, pred = accuracy_on_device(output, target)
         acc.update(avg_acc, cnt)
 
         # measure elapsed time
@@ -86,12 +103,13 @@ def train(config, train_loader, model, criterion, optimizer, epoch,
 
             
             prefix = '{}_{}'.format(os.path.join(output_dir, 'train'), i)
-            save_debug_images(config, input, meta, target, pred*4, output,
+            save_debug_images(config, input, meta, target,
+                              pred.cpu().numpy()*4, output,
                               prefix)
 
 
 def validate(config, val_loader, val_dataset, model, criterion, output_dir,
-             tb_log_dir, mode='student'):
+             tb_log_dir, mode='student', device=None):
     batch_time = AverageMeter()
     losses = AverageMeter()
     acc = AverageMeter()
@@ -112,15 +130,21 @@ def validate(config, val_loader, val_dataset, model, criterion, output_dir,
     imgnums = []
     idx = 0
     k=0
+    if device is None:
+        device = torch.device('cuda')
+    occlusion = build_batch_occlusion(val_dataset)
+    normalize = build_input_normalize(val_dataset, device)
     with torch.no_grad():
         end = time.time()
         for i, (input,input_new,target, target_weight, meta) in enumerate(val_loader):
+            input = normalize(input.to(device))
+            if occlusion is not None:
+                input_new = occlusion(input, meta['occluders'])
+            input_new = normalize(input_new.to(device))
             # compute output
             if (input_new==input).all() :
                 k=k+1
             #print((input_new==input).all())
-            input = input.cuda()
-            input_new = input_new.cuda()
             if mode=='teacher':                
                 _, _, _, outputs = model(input)
             elif mode=='student':
@@ -147,7 +171,7 @@ def validate(config, val_loader, val_dataset, model, criterion, output_dir,
 
                 output_flipped = flip_back(output_flipped.cpu().numpy(),
                                            val_dataset.flip_pairs)
-                output_flipped = torch.from_numpy(output_flipped.copy()).cuda()
+                output_flipped = torch.from_numpy(output_flipped.copy()).to(device)
 
 
                 # feature is not aligned, shift flipped heatmap for higher accuracy
@@ -157,8 +181,9 @@ def validate(config, val_loader, val_dataset, model, criterion, output_dir,
 
                 output = (output + output_flipped) * 0.5
 
-            target = target.cuda(non_blocking=True)
-            target_weight = target_weight.cuda(non_blocking=True)
+            target = target.to(device, non_blocking=True)
+            target_weight = target_weight.to(device, non_blocking=True)
+            target, target_weight = dense_targets(config, target, target_weight)
 
             loss = criterion(output, target, target_weight)
 
@@ -246,13 +271,14 @@ def validateys(config, val_loader, val_dataset, model, criterion, output_dir,
     imgnums = []
     idx = 0
     k=0
+    normalize = build_input_normalize(val_dataset)
     with torch.no_grad():
         end = time.time()
         for i, (input,target, target_weight, meta) in enumerate(val_loader):
             # compute output
             
             #print((input_new==input).all())
-            input = input.cuda()
+            input = normalize(input.cuda())
             
             outputs = model(input)
             
@@ -284,6 +310,7 @@ def validateys(config, val_loader, val_dataset, model, criterion, output_dir,
 
             target = target.cuda(non_blocking=True)
             target_weight = target_weight.cuda(non_blocking=True)
+            target, target_weight = dense_targets(config, target, target_weight)
 
             loss = criterion(output, target, target_weight)
 
@@ -345,13 +372,23 @@ def validateys(config, val_loader, val_dataset, model, criterion, output_dir,
     return perf_indicator
 
 def mutual_learning(config, train_loader, teacher,student, criterion, optimizer_t,optimizer_s, epoch,
-          output_dir, tb_log_dir):
+          output_dir, tb_log_dir, amp=None):
     batch_time = AverageMeter()
     data_time = AverageMeter()
-    losses = AverageMeter()
-    criterion1=torch.nn.MSELoss(reduction='mean').cuda()
-    #criterion1=criterion
-    acc = AverageMeter()
+    losses = DeviceAverageMeter()
+    # each network mimics the features of the other one
+    stage_weights = config.LOSS.get('DISTILL_STAGE_WEIGHTS', None)
+    distill_s = MultiStageDistillLoss(
+        'mse', config.LOSS.get('MUTUAL_WEIGHT_S', 0.001), stage_weights)
+    distill_t = MultiStageDistillLoss(
+        'mse', config.LOSS.get('MUTUAL_WEIGHT_T', 0.00001), stage_weights)
+    acc = DeviceAverageMeter()
+
+    occlusion = build_batch_occlusion(train_loader.dataset)
+    normalize = build_input_normalize(train_loader.dataset)
+    if amp is None:
+        amp = build_mixed_precision(config)
+    stacked = build_stacked_models(config, teacher, student)
 
     # switch to train mode
     teacher.train()
@@ -361,54 +398,46 @@ def mutual_learning(config, train_loader, teacher,student, criterion, optimizer_
     for i, (input,input_new,target, target_weight, meta) in enumerate(train_loader):
         # measure data loading time
         data_time.update(time.time() - end)
-        input = input.cuda()
-        input_new = input_new.cuda()
-        # compute output
-        outputs_t = teacher(input)
-        outputs_s = student(input_new)
-        loss_dist_s=[]
-        loss_dist_t=[]
+        input = normalize(input.cuda())
+        if occlusion is not None:
+            input_new = occlusion(input, meta['occluders'])
+        input_new = normalize(input_new.cuda())
+        # compute output, the losses in fp32
+        with amp.autocast():
+            if stacked is not None:
+                outputs_t, outputs_s = stacked(input, input_new)
+            else:
+                outputs_t = teacher(input)
+                outputs_s = student(input_new)
+        outputs_t = float32(outputs_t)
+        outputs_s = float32(outputs_s)
         target = target.cuda(non_blocking=True)
         target_weight = target_weight.cuda(non_blocking=True)
+        target, target_weight = dense_targets(config, target, target_weight)
 
-        for j in range(3):
-            for k in range(len(outputs_s[j])):
-                if k == 0:
-                    loss_dist_s.append(criterion1(outputs_s[j][k], outputs_t[j][k].data))
-                    loss_dist_t.append(criterion1(outputs_t[j][k], outputs_s[j][k].data))
-                else:
-                    loss_dist_s[j] += criterion1(outputs_s[j][k], outputs_t[j][k].data)
-                    loss_dist_t[j] += criterion1(outputs_t[j][k], outputs_s[j][k].data)
-            loss_dist_s[j] = loss_dist_s[j] / (k + 1)
-            loss_dist_t[j] = loss_dist_t[j] / (k + 1)
-
-        loss_dist_last_s = criterion1(outputs_s[-1], outputs_t[-1].data)
-        loss_dist_last_t = criterion1(outputs_t[-1], outputs_s[-1].data)
         loss_ori_s = criterion(outputs_s[-1], target,target_weight)
         loss_ori_t = criterion(outputs_t[-1], target,target_weight)
 
-        #loss_s = 0.001*(loss_dist_s[1] + loss_dist_s[2] + loss_dist_last_s) + loss_ori_s
-        #loss_t = 0.00001*( loss_dist_last_t) + loss_ori_t
-        loss_s = 0.001*(loss_dist_s[0] + loss_dist_s[1] + loss_dist_s[2] + loss_dist_last_s) + loss_ori_s
-        loss_t = 0.00001*(loss_dist_t[0] + loss_dist_t[1] + loss_dist_t[2] + loss_dist_last_t) + loss_ori_t
-        #loss_s = loss_dist_last_s + loss_ori_s
-        #loss_t = loss_dist_last_t + loss_ori_t
+        loss_s = distill_s(outputs_s, outputs_t) + loss_ori_s
+        loss_t = distill_t(outputs_t, outputs_s) + loss_ori_t
 
         # loss = criterion(output, target, target_weight)
 
         # compute gradient and do update step
+        # one scale for both losses, updated after both steps
         optimizer_s.zero_grad()
         optimizer_t.zero_grad()
-        loss_s.backward()
-        loss_t.backward()
-        optimizer_s.step()
-        optimizer_t.step()
+        if stacked is not None:
+            # one graph for both, each loss only reaches its own network
+            amp.backward(loss_s + loss_t)
+        else:
+            amp.backward(loss_s, loss_t)
+        amp.step(optimizer_s, optimizer_t)
 
-        # measure accuracy and record loss
-        losses.update(loss_s.item(), input_new.size(0))
+        # measure accuracy and record loss, read back at PRINT_FREQ only
+        losses.update(loss_s, input_new.size(0))
 
-        _, avg_acc, cnt, pred = accuracy(outputs_s[-1].detach().cpu().numpy(),
-                                         target.detach().cpu().numpy())
+        avg_acc, cnt, pred = accuracy_on_device(outputs_s[-1], target)
         acc.update(avg_acc, cnt)
 
         # measure elapsed time
@@ -428,55 +457,145 @@ def mutual_learning(config, train_loader, teacher,student, criterion, optimizer_
             logger.info(msg)           
 
             prefix = '{}_{}'.format(os.path.join(output_dir, 'train'), i)
-            save_debug_images(config, input_new, meta, target, pred*4,outputs_s[-1],
+            save_debug_images(config, input_new, meta, target,
+                              pred.cpu().numpy()*4, outputs_s[-1],
                               prefix)
 
-def distilling(config, train_loader, teacher,student, criterion,optimizer_s, epoch,
-          output_dir, tb_log_dir):
+def mutual_learning_worker(config, train_loader, model, criterion, optimizer,
+                           epoch, output_dir, tb_log_dir, exchange, amp=None):
+    '''
+    One side of mutual_learning with GNet and ENet in separate processes
+    (tools/mutual_train.py): GNet trains on input, ENet on input_new, each
+    against the outputs of the other one received through exchange, a
+    core.exchange.FeatureExchange. Both processes need the same batches,
+    see dataset.samplers.SeededDataset.
+    '''
     batch_time = AverageMeter()
     data_time = AverageMeter()
-    losses = AverageMeter()
-    lossesys = AverageMeter()
-    #criterion1=torch.nn.MSELoss(reduction='mean').cuda()
-    criterion1=torch.nn.SmoothL1Loss(reduction='mean').cuda()
-
-    #criterion1=criterion
-    acc = AverageMeter()
+    losses = DeviceAverageMeter()
+    acc = DeviceAverageMeter()
+    role = ROLES[exchange.rank]
+    enet = exchange.rank == ENET_RANK
+    distill = MultiStageDistillLoss(
+        'mse',
+        config.LOSS.get('MUTUAL_WEIGHT_S', 0.001) if enet
+        else config.LOSS.get('MUTUAL_WEIGHT_T', 0.00001),
+        config.LOSS.get('DISTILL_STAGE_WEIGHTS', None))
+
+    # the batches follow the model, the two processes may share a CPU box
+    device = next(model.parameters()).device
+    occlusion = build_batch_occlusion(train_loader.dataset) if enet else None
+    normalize = build_input_normalize(train_loader.dataset, device)
+    if amp is None:
+        amp = build_mixed_precision(config, device.type)
 
     # switch to train mode
-    teacher.eval()
+    model.train()
+
+    end = time.time()
+    for i, (input,input_new,target, target_weight, meta) in enumerate(train_loader):
+        # measure data loading time
+        data_time.update(time.time() - end)
+        input = normalize(input.to(device))
+        if enet:
+            if occlusion is not None:
+                input_new = occlusion(input, meta['occluders'])
+            input = normalize(input_new.to(device))
+        # compute output, the losses in fp32
+        with amp.autocast():
+            outputs = model(input)
+        outputs = float32(outputs)
+        # the peer's outputs travel while the supervised loss is computed
+        exchange.start(outputs)
+        target = target.to(device, non_blocking=True)
+        target_weight = target_weight.to(device, non_blocking=True)
+        target, target_weight = dense_targets(config, target, target_weight)
+
+        loss_ori = criterion(outputs[-1], target, target_weight)
+        loss = distill(outputs, exchange.wait()) + loss_ori
+
+        # compute gradient and do update step
+        optimizer.zero_grad()
+        amp.backward(loss)
+        amp.step(optimizer)
+
+        # measure accuracy and record loss, read back at PRINT_FREQ only
+        losses.update(loss, input.size(0))
+
+        avg_acc, cnt, pred = accuracy_on_device(outputs[-1], target)
+        acc.update(avg_acc, cnt)
+
+        # measure elapsed time
+        batch_time.update(time.time() - end)
+        end = time.time()
+
+        if i % config.PRINT_FREQ == 0:
+            msg = '{role} Epoch: [{0}][{1}/{2}]\t' \
+                  'Time {batch_time.val:.3f}s ({batch_time.avg:.3f}s)\t' \
+                  'Speed {speed:.1f} samples/s\t' \
+                  'Data {data_time.val:.3f}s ({data_time.avg:.3f}s)\t' \
+                  'Loss {loss.val:.5f} ({loss.avg:.5f})\t' \
+                  'Accuracy {acc.val:.3f} ({acc.avg:.3f})'.format(
+                      epoch, i, len(train_loader), role=role,
+                      batch_time=batch_time,
+                      speed=input.size(0)/batch_time.val,
+                      data_time=data_time, loss=losses, acc=acc)
+            logger.info(msg)
+
+            prefix = '{}_{}'.format(os.path.join(output_dir, 'train'), i)
+            save_debug_images(config, input, meta, target,
+                              pred.cpu().numpy()*4, outputs[-1],
+                              prefix)
+
+def distilling(config, train_loader, teacher,student, criterion,optimizer_s, epoch,
+          output_dir, tb_log_dir, amp=None):
+    batch_time = AverageMeter()
+    data_time = AverageMeter()
+    losses = DeviceAverageMeter()
+    lossesys = DeviceAverageMeter()
+    distill = MultiStageDistillLoss(
+        'smooth_l1', config.LOSS.get('DISTILL_WEIGHT', 0.00001),
+        config.LOSS.get('DISTILL_STAGE_WEIGHTS', None))
+    acc = DeviceAverageMeter()
+
+    occlusion = build_batch_occlusion(train_loader.dataset)
+    normalize = build_input_normalize(train_loader.dataset)
+    if amp is None:
+        amp = build_mixed_precision(config)
+
+    # switch to train mode, no teacher is needed with DATASET.TEACHER_CACHE
+    if teacher is not None:
+        teacher.eval()
     student.train()
     #device=torch.device("cuda:4" )
     end = time.time()
     for i, (input,input_new,target, target_weight, meta) in enumerate(train_loader):
         # measure data loading time
-        input=input.cuda()
-        input_new=input_new.cuda()        
+        input=normalize(input.cuda())
+        if occlusion is not None:
+            input_new = occlusion(input, meta['occluders'])
+        input_new=normalize(input_new.cuda())
         data_time.update(time.time() - end)
 
-        # compute output
-        outputs_t = teacher(input)        
-        outputs_s = student(input_new)
+        # compute output, the losses in fp32; the frozen teacher's outputs
+        # are only targets, read them from the cache when there is one
+        if 'teacher' in meta:
+            outputs_t = cached_teacher_outputs(meta['teacher'])
+        else:
+            with torch.no_grad(), amp.autocast():
+                outputs_t = teacher(input)
+        with amp.autocast():
+            outputs_s = student(input_new)
+        outputs_t = float32(outputs_t)
+        outputs_s = float32(outputs_s)
         #print(len(outputs_s),outputs_s[0].shape,outputs_s[1].shape,outputs_s[2].shape,outputs_s[3].shape)
-        loss_dist_s=[]
 
         target = target.cuda(non_blocking=True)
         target_weight = target_weight.cuda(non_blocking=True)
-
-        for j in range(3):
-            for k in range(len(outputs_s[j])):
-                if k == 0:
-                    loss_dist_s.append(criterion1(outputs_s[j][k], outputs_t[j][k]))
-                else:
-                    loss_dist_s[j] += criterion1(outputs_s[j][k], outputs_t[j][k])
-            loss_dist_s[j] = loss_dist_s[j] / (k + 1)
-
-        loss_dist_last_s = criterion1(outputs_s[-1], outputs_t[-1])
+        target, target_weight = dense_targets(config, target, target_weight)
 
         loss_ori_s = criterion(outputs_s[-1], target,target_weight)
-        #loss_s = 0.001*( loss_dist_s[2] + loss_dist_last_s) + loss_ori_s
-        loss_s = 0.00001*(loss_dist_s[0] + loss_dist_s[1] + loss_dist_s[2] + loss_dist_last_s) + loss_ori_s
-        #loss_s = loss_ori_s  loss_dist_s[0] + 
+        loss_s = distill(outputs_s, outputs_t) + loss_ori_s
         #print("loss_s",loss_s,loss_ori_s)
         if loss_s=="nan":
             print(meta)
@@ -489,15 +608,14 @@ def distilling(config, train_loader, teacher,student, criterion,optimizer_s, epo
 
         # compute gradient and do update step
         optimizer_s.zero_grad()
-        loss_s.backward()
-        optimizer_s.step()
+        amp.backward(loss_s)
+        amp.step(optimizer_s)
 
-        # measure accuracy and record loss
-        losses.update(loss_s.item(), input_new.size(0))
-        lossesys.update(loss_ori_s.item(), input_new.size(0))
+        # measure accuracy and record loss, read back at PRINT_FREQ only
+        losses.update(loss_s, input_new.size(0))
+        lossesys.update(loss_ori_s, input_new.size(0))
 
-        _, avg_acc, cnt, pred = accuracy(outputs_s[-1].detach().cpu().numpy(),
-                                         target.detach().cpu().numpy())
+        avg_acc, cnt, pred = accuracy_on_device(outputs_s[-1], target)
         acc.update(avg_acc, cnt)
 
         # measure elapsed time
@@ -518,11 +636,33 @@ def distilling(config, train_loader, teacher,student, criterion,optimizer_s, epo
             logger.info(msg)
 
             prefix = '{}_{}'.format(os.path.join(output_dir, 'train'), i)
-            save_debug_images(config, input_new, meta, target, pred*4,outputs_s[-1],
+            save_debug_images(config, input_new, meta, target,
+                              pred.cpu().numpy()*4, outputs_s[-1],
                               prefix)
 
 
 
+def cached_teacher_outputs(cached):
+    ''' meta['teacher'] of a DATASET.TEACHER_CACHE batch, on the GPU '''
+    if isinstance(cached, (list, tuple)):
+        return [cached_teacher_outputs(c) for c in cached]
+    return cached.cuda(non_blocking=True)
+
+
+def dense_targets(config, target, target_weight):
+    '''
+    With MODEL.TARGET_ON_DEVICE the loader sends joints [B, J, 3] instead of
+    heatmaps, render them where the batch already is.
+    '''
+    if target.dim() != 3:
+        return target, target_weight
+    target, visible = render_gaussian_targets(
+        target, config.MODEL.SIGMA,
+        config.MODEL.IMAGE_SIZE, config.MODEL.HEATMAP_SIZE
+    )
+    return target, visible * target_weight
+
+
 # markdown format output
 def _print_name_value(name_value, full_arch_name):
     names = name_value.keys()
@@ -560,3 +700,39 @@ class AverageMeter(object):
         self.sum += val * n
         self.count += n
         self.avg = self.sum / self.count if self.count != 0 else 0
+
+
+class DeviceAverageMeter(AverageMeter):
+    '''
+    AverageMeter that takes 0-dim tensors (a loss, accuracy_on_device)
+    without reading them back: the sums stay on the device and are only
+    synced when val / avg / sum / count are read, e.g. when logging.
+    '''
+    def reset(self):
+        self._val = 0.
+        self._sum = 0.
+        self._count = 0
+
+    def update(self, val, n=1):
+        if torch.is_tensor(val):
+            val = val.detach().double()
+        self._val = val
+        self._sum = self._sum + val * n
+        self._count = self._count + n
+
+    @property
+    def val(self):
+        return float(self._val)
+
+    @property
+    def sum(self):
+        return float(self._sum)
+
+    @property
+    def count(self):
+        return float(self._count)
+
+    @property
+    def avg(self):
+        count = self.count
+        return self.sum / count if count != 0 else 0
@@ -12,31 +12,36 @@ import torch
 import torch.nn as nn
 
 
+def joint_mse(criterion, output, target, target_weight, use_target_weight):
+    '''
+    [B, J] MSE of every heatmap, weighted like the MSE of the heatmaps
+    multiplied by target_weight: the weight is constant over a heatmap, so
+    it scales the mean of the squared error by weight ** 2
+    :param criterion: nn.MSELoss(reduction='none')
+    '''
+    # fp32 even for fp16 / bf16 heatmaps from autocast
+    batch_size = output.size(0)
+    num_joints = output.size(1)
+    heatmaps_pred = output.float().reshape((batch_size, num_joints, -1))
+    heatmaps_gt = target.float().reshape((batch_size, num_joints, -1))
+
+    loss = criterion(heatmaps_pred, heatmaps_gt).mean(dim=2)
+    if use_target_weight:
+        loss = loss * target_weight.float().reshape(
+            (batch_size, num_joints)).pow(2)
+    return loss
+
+
 class JointsMSELoss(nn.Module):
     def __init__(self, use_target_weight):
         super(JointsMSELoss, self).__init__()
-        self.criterion = nn.MSELoss(reduction='mean')
+        self.criterion = nn.MSELoss(reduction='none')
         self.use_target_weight = use_target_weight
 
     def forward(self, output, target, target_weight):
-        batch_size = output.size(0)
-        num_joints = output.size(1)
-        heatmaps_pred = output.reshape((batch_size, num_joints, -1)).split(1, 1)
-        heatmaps_gt = target.reshape((batch_size, num_joints, -1)).split(1, 1)
-        loss = 0
-
-        for idx in range(num_joints):
-            heatmap_pred = heatmaps_pred[idx].squeeze()
-            heatmap_gt = heatmaps_gt[idx].squeeze()
-            if self.use_target_weight:
-                loss += 0.5 * self.criterion(
-                    heatmap_pred.mul(target_weight[:, idx]),
-                    heatmap_gt.mul(target_weight[:, idx])
-                )
-            else:
-                loss += 0.5 * self.criterion(heatmap_pred, heatmap_gt)
-
-        return loss / num_joints
+        # the mean over joints of the per joint MSE, as one reduction
+        return 0.5 * joint_mse(self.criterion, output, target, target_weight,
+                               self.use_target_weight).mean()
 
 
 class JointsOHKMMSELoss(nn.Module):
@@ -47,38 +52,79 @@ class JointsOHKMMSELoss(nn.Module):
         self.topk = topk
 
     def ohkm(self, loss):
-        ohkm_loss = 0.
-        for i in range(loss.size()[0]):
-            sub_loss = loss[i]
-            topk_val, topk_idx = torch.topk(
-                sub_loss, k=self.topk, dim=0, sorted=False
-            )
-            tmp_loss = torch.gather(sub_loss, 0, topk_idx)
-            ohkm_loss += torch.sum(tmp_loss) / self.topk
-        ohkm_loss /= loss.size()[0]
-        return ohkm_loss
+        ''' mean over the batch of the mean of the topk joint losses '''
+        topk_val, _ = torch.topk(loss, k=self.topk, dim=1, sorted=False)
+        return topk_val.sum(dim=1).div(self.topk).mean()
 
     def forward(self, output, target, target_weight):
-        batch_size = output.size(0)
-        num_joints = output.size(1)
-        heatmaps_pred = output.reshape((batch_size, num_joints, -1)).split(1, 1)
-        heatmaps_gt = target.reshape((batch_size, num_joints, -1)).split(1, 1)
-
-        loss = []
-        for idx in range(num_joints):
-            heatmap_pred = heatmaps_pred[idx].squeeze()
-            heatmap_gt = heatmaps_gt[idx].squeeze()
-            if self.use_target_weight:
-                loss.append(0.5 * self.criterion(
-                    heatmap_pred.mul(target_weight[:, idx]),
-                    heatmap_gt.mul(target_weight[:, idx])
-                ))
-            else:
-                loss.append(
-                    0.5 * self.criterion(heatmap_pred, heatmap_gt)
-                )
-
-        loss = [l.mean(dim=1).unsqueeze(dim=1) for l in loss]
-        loss = torch.cat(loss, dim=1)
+        loss = 0.5 * joint_mse(self.criterion, output, target, target_weight,
+                               self.use_target_weight)
 
         return self.ohkm(loss)
+
+
+class MultiStageDistillLoss(nn.Module):
+    '''
+    Feature mimicking loss between the (stage 2, stage 3, stage 4 branch
+    lists, heatmap) outputs of the *_kd / *_kdstu models:
+
+        weight * sum_j stage_weights[j] * mean_k criterion(out[j][k], tgt[j][k])
+
+    the heatmap counting as a stage of one branch. Every tensor is reduced
+    to its criterion sum once and the sums are combined by a single dot
+    with the weight of each tensor.
+    :param criterion: 'mse' or 'smooth_l1'
+    :param detach_targets: no gradient into the targets, for the mutual
+                           direction where both sides are trained
+    '''
+    def __init__(self, criterion='mse', weight=1., stage_weights=None,
+                 detach_targets=True):
+        super(MultiStageDistillLoss, self).__init__()
+        if criterion == 'mse':
+            self.criterion = nn.MSELoss(reduction='sum')
+        elif criterion == 'smooth_l1':
+            self.criterion = nn.SmoothL1Loss(reduction='sum')
+        else:
+            raise ValueError('unknown distillation criterion {}'.format(
+                criterion))
+        self.weight = weight
+        self.stage_weights = stage_weights
+        self.detach_targets = detach_targets
+        self._coefficients = {}
+
+    @staticmethod
+    def _flatten(outputs):
+        ''' the tensors of outputs and the (stage, branches) of each '''
+        tensors, stages = [], []
+        for j, stage in enumerate(outputs):
+            branches = stage if isinstance(stage, (list, tuple)) else [stage]
+            tensors.extend(branches)
+            stages.extend([(j, len(branches))] * len(branches))
+        return tensors, stages
+
+    def _coefficient(self, tensors, stages, device):
+        ''' weight of the criterion sum of every tensor '''
+        numels = tuple(t.numel() for t in tensors)
+        key = (numels, tuple(stages), str(device))
+        if key not in self._coefficients:
+            stage_weights = self.stage_weights
+            if stage_weights is None:
+                stage_weights = [1.] * (stages[-1][0] + 1)
+            self._coefficients[key] = torch.tensor(
+                [self.weight * stage_weights[j] / (branches * numel)
+                 for (j, branches), numel in zip(stages, numels)],
+                dtype=torch.float32, device=device)
+        return self._coefficients[key]
+
+    def forward(self, outputs, targets):
+        outputs, stages = self._flatten(outputs)
+        targets, _ = self._flatten(targets)
+        # fp32 even for fp16 / bf16 features from autocast
+        outputs = [o.float() for o in outputs]
+        targets = [t.detach().float() if self.detach_targets else t.float()
+                   for t in targets]
+        sums = torch.stack([self.criterion(o, t)
+                            for o, t in zip(outputs, targets)])
+        return torch.dot(sums,
+                         self._coefficient(outputs, stages,
+                                           outputs[0].device))
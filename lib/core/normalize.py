@@ -0,0 +1,69 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+
+import torch
+import torchvision.transforms as transforms
+
+
+logger = logging.getLogger(__name__)
+
+
+def base_dataset(dataset):
+    ''' the JointsDataset behind a Subset or a dataset.record_shards stream '''
+    while not hasattr(dataset, 'transform') and hasattr(dataset, 'dataset'):
+        dataset = dataset.dataset
+    return dataset
+
+
+def find_normalize(transform):
+    ''' (mean, std) of the Normalize in transform, identity if there is none '''
+    mean, std = (0., 0., 0.), (1., 1., 1.)
+    for t in getattr(transform, 'transforms', [transform]):
+        if isinstance(t, transforms.Normalize):
+            mean, std = t.mean, t.std
+    return mean, std
+
+
+class InputNormalize(object):
+    '''
+    ToTensor + Normalize (and the BGR -> RGB swap of COLOR_RGB) for a batch
+    of uint8 [B, H, W, 3] crops from datasets with DATASET.UINT8_INPUT, as
+    one multiply-add on the compute device. Float batches are passed
+    through untouched, so it can be applied unconditionally.
+    '''
+    def __init__(self, mean=(0., 0., 0.), std=(1., 1., 1.), swap_rb=False,
+                 device=None):
+        mean = torch.as_tensor(mean, dtype=torch.float32).view(1, 3, 1, 1)
+        std = torch.as_tensor(std, dtype=torch.float32).view(1, 3, 1, 1)
+        # (x / 255 - mean) / std = x * scale + shift
+        self.scale = 1. / (255. * std)
+        self.shift = - mean / std
+        self.channels = [2, 1, 0] if swap_rb else [0, 1, 2]
+        if device is None:
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.device = torch.device(device)
+
+    def __call__(self, input):
+        if input.dtype != torch.uint8 or input.numel() == 0:
+            return input
+        input = input.to(self.device, non_blocking=True)
+        scale = self.scale.to(input.device)
+        shift = self.shift.to(input.device)
+        x = input.permute(0, 3, 1, 2)[:, self.channels]
+        return torch.addcmul(shift, x.float(), scale).contiguous()
+
+
+def build_input_normalize(dataset, device=None):
+    '''
+    InputNormalize matching the transform and colour order of dataset,
+    on device (the GPU if there is one when None)
+    '''
+    dataset = base_dataset(dataset)
+    mean, std = find_normalize(getattr(dataset, 'transform', None))
+    if getattr(dataset, 'uint8_input', False):
+        logger.info('=> normalizing uint8 batches on the device')
+    return InputNormalize(mean, std, getattr(dataset, 'color_rgb', False),
+                          device)
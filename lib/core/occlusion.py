@@ -0,0 +1,120 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from core.normalize import base_dataset
+from core.normalize import find_normalize
+from dataset.occlusion import fetch_occluder
+
+
+logger = logging.getLogger(__name__)
+
+
+class BatchOcclusion(object):
+    '''
+    Occlusion stage for a collated batch. With DATASET.OCCLUSION_SPACE
+    'batch' the workers only send the occluder records of every sample
+    (meta['occluders'], see dataset.occlusion.encode_occluders) and
+    input_new is made here from input, one grid_sample per occluder slot
+    for the whole batch.
+    '''
+    def __init__(self, occluder_bank=None, mean=(0., 0., 0.),
+                 std=(1., 1., 1.), rgb=False):
+        self.occluder_bank = occluder_bank
+        self.mean = torch.as_tensor(mean, dtype=torch.float32).view(1, 3, 1, 1)
+        self.std = torch.as_tensor(std, dtype=torch.float32).view(1, 3, 1, 1)
+        self.rgb = rgb
+
+    def _patch(self, params):
+        ''' premultiplied patch at its crop size and crop -> patch affine '''
+        width, height = params[3], params[4]
+        m = np.vstack([params[5:].reshape(2, 3), [0., 0., 1.]])
+        zoom = np.sqrt(abs(np.linalg.det(m[:2, :2])))
+        w = max(int(round(width * zoom)), 1)
+        h = max(int(round(height * zoom)), 1)
+        patch = fetch_occluder(
+            '{}'.format(int(params[1])), int(params[2]), w, h,
+            self.occluder_bank
+        )
+        m = m.dot(np.diag([width / w, height / h, 1.]))
+        return patch, np.linalg.inv(m)
+
+    def __call__(self, input, occluders):
+        '''
+        :param input: normalized batch [B, 3, H, W]
+        :param occluders: meta['occluders'], [B, MAX_OCCLUDERS, 11]
+        :return: occluded copy of input
+        '''
+        params = occluders.cpu().numpy()
+        output = input.clone()
+        B, _, H, W = input.shape
+        device = input.device
+        mean = self.mean.to(device)
+        std = self.std.to(device)
+
+        # pixel centres of the crop, (x, y, 1)
+        ys, xs = torch.meshgrid(
+            torch.arange(H, dtype=torch.float32),
+            torch.arange(W, dtype=torch.float32),
+            indexing='ij'
+        )
+        base = torch.stack([xs, ys, torch.ones_like(xs)], -1).to(device)
+
+        # slots are blended in drawing order, all samples of a slot at once
+        for k in range(params.shape[1]):
+            samples = np.nonzero(params[:, k, 0] > 0)[0]
+            if len(samples) == 0:
+                continue
+
+            patches, inverses = zip(*[self._patch(params[b, k])
+                                      for b in samples])
+            ph = max(p.shape[0] for p in patches)
+            pw = max(p.shape[1] for p in patches)
+            stack = np.zeros((len(patches), ph, pw, 4), dtype=np.uint8)
+            for j, p in enumerate(patches):
+                stack[j, :p.shape[0], :p.shape[1]] = p
+            stack = torch.from_numpy(stack).to(device) \
+                .permute(0, 3, 1, 2).float() / 255
+
+            # crop pixel -> patch pixel -> grid_sample coordinates
+            to_grid = np.array([[2. / pw, 0., 1. / pw - 1.],
+                                [0., 2. / ph, 1. / ph - 1.]])
+            theta = torch.as_tensor(
+                np.stack([to_grid.dot(inv) for inv in inverses]),
+                dtype=torch.float32, device=device
+            )
+            grid = torch.einsum('hwc,nkc->nhwk', base, theta)
+            warped = F.grid_sample(
+                stack, grid, mode='bilinear', padding_mode='zeros',
+                align_corners=False
+            )
+
+            color = warped[:, :3] if self.rgb else warped[:, [2, 1, 0]]
+            alpha = warped[:, 3:4]
+            index = torch.as_tensor(samples, device=device)
+            # premultiplied "over" done on the normalized input:
+            # ((color + x * (1 - a)) - mean) / std with x = x' * std + mean
+            output[index] = output[index] * (1 - alpha) \
+                + ((color - alpha * mean) / std).to(output.dtype)
+
+        return output
+
+
+def build_batch_occlusion(dataset):
+    '''
+    BatchOcclusion matching the occluder bank, colour order and
+    normalization of dataset, None unless it runs in 'batch' occlusion space
+    '''
+    dataset = base_dataset(dataset)
+    if getattr(dataset, 'occlusion_space', 'image') != 'batch':
+        return None
+
+    mean, std = find_normalize(dataset.transform)
+    logger.info('=> blending occluders on the collated batch')
+    return BatchOcclusion(dataset.occluder_bank, mean, std, dataset.color_rgb)
@@ -0,0 +1,120 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+
+import torch
+import torch.nn as nn
+
+try:
+    from torch.func import functional_call
+    from torch.func import vmap
+except ImportError:
+    functional_call = vmap = None
+
+
+logger = logging.getLogger(__name__)
+
+
+def _unwrap(model):
+    ''' the module of a single device DataParallel, model otherwise '''
+    if isinstance(model, nn.DataParallel) and len(model.device_ids) <= 1:
+        return model.module
+    return model
+
+
+def same_architecture(model_a, model_b):
+    '''
+    same (name, shape, dtype) of every parameter and buffer, and the same
+    module classes and hyperparameters (extra_repr: strides, batch norm
+    eps and momentum, ...) by name. The _kd / _kdstu twins are different
+    classes of the same name.
+    '''
+    def signature(model):
+        return (
+            [(n, p.shape, p.dtype) for n, p in model.named_parameters()],
+            [(n, b.shape, b.dtype) for n, b in model.named_buffers()],
+            [(n, type(m).__name__, m.extra_repr())
+             for n, m in model.named_modules()],
+        )
+    return signature(model_a) == signature(model_b)
+
+
+def _select(outputs, i):
+    if isinstance(outputs, (list, tuple)):
+        return [_select(o, i) for o in outputs]
+    return outputs[i]
+
+
+class StackedModels(object):
+    '''
+    Two networks of the same architecture run as one: their parameters
+    and buffers are stacked along a new leading dimension and the forward
+    of model_a is vmapped over the stack, so every layer is one kernel for
+    both networks. The stack is differentiable, gradients land in the
+    parameters of each model and their optimizers work as before; the
+    batch norm statistics updated in the stack are copied back.
+
+    Both outputs come from one graph: backward their losses together,
+    e.g. (loss_a + loss_b).backward(), which gives each model the
+    gradient of its own loss as long as the losses only see the other
+    model's outputs detached.
+    '''
+    def __init__(self, model_a, model_b):
+        self.models = (model_a, model_b)
+        self.param_names = [n for n, _ in model_a.named_parameters()]
+        self.buffer_names = [n for n, _ in model_a.named_buffers()]
+
+    def _forward(self, params, buffers, input):
+        return functional_call(self.models[0], (params, buffers), (input,))
+
+    def __call__(self, input_a, input_b):
+        model_a, model_b = self.models
+        if model_a.training != model_b.training:
+            raise ValueError('stacked models must both train or both eval')
+        params = [dict(m.named_parameters()) for m in self.models]
+        buffers = [dict(m.named_buffers()) for m in self.models]
+        stacked_params = {
+            n: torch.stack([params[0][n], params[1][n]])
+            for n in self.param_names
+        }
+        stacked_buffers = {
+            n: torch.stack([buffers[0][n], buffers[1][n]])
+            for n in self.buffer_names
+        }
+
+        outputs = vmap(self._forward, randomness='different')(
+            stacked_params, stacked_buffers,
+            torch.stack([input_a, input_b])
+        )
+
+        with torch.no_grad():
+            for n in self.buffer_names:
+                buffers[0][n].copy_(stacked_buffers[n][0])
+                buffers[1][n].copy_(stacked_buffers[n][1])
+        return _select(outputs, 0), _select(outputs, 1)
+
+
+def build_stacked_models(config, model_a, model_b):
+    '''
+    StackedModels of the two models with TRAIN.STACK_MODELS, None (run
+    them one after the other) when it is off or cannot be used
+    '''
+    if not config.TRAIN.get('STACK_MODELS', False):
+        return None
+    if vmap is None:
+        logger.info('=> no torch.func, running the models one by one')
+        return None
+    model_a, model_b = _unwrap(model_a), _unwrap(model_b)
+    wrapped = (nn.DataParallel, nn.parallel.DistributedDataParallel)
+    if isinstance(model_a, wrapped) or isinstance(model_b, wrapped):
+        # their gradient reduction would be bypassed
+        logger.info('=> multi GPU models, running the models one by one')
+        return None
+    if not same_architecture(model_a, model_b):
+        logger.info('=> architectures differ, running the models one by one')
+        return None
+    logger.info('=> running {} and {} stacked'.format(
+        type(model_a).__name__, type(model_b).__name__))
+    return StackedModels(model_a, model_b)
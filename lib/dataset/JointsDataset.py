@@ -8,38 +8,144 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-import copy
 import logging
+import os
 import random
 
 import cv2
 import numpy as np
 import torch
 from torch.utils.data import Dataset
-import os
+
 from utils.transforms import get_affine_transform
 from utils.transforms import affine_transform
 from utils.transforms import fliplr_joints
+from utils.heatmap import generate_gaussian_targets
+from dataset.crop_shards import CropShards
+from dataset.crop_shards import full_image_center
+from dataset.image_cache import DecodedImageCache
+from dataset.joints_db import JointsDB
+from dataset.joints_db import annotation_cache_file
+from dataset.occluder_bank import OCCLUDER_PYRAMID_LEVELS
+from dataset.occluder_bank import OCCLUDER_ROOT
+from dataset.occluder_bank import get_occluder_bank
+from dataset.occlusion import COCO_OCCLUSION
+from dataset.occlusion import composite_occluders_warped
+from dataset.occlusion import encode_occluders
+from dataset.occlusion import sample_occluders
+from dataset.occlusion import synthesize_occlusion
+from dataset.teacher_cache import TeacherCache
+from dataset.teacher_cache import fixed_random
+
 
-import os
-import json_tricks as json
-import torchvision
-import numpy as np
-import cv2
-import torch
-import copy
-from PIL import Image
-import math
-import matplotlib.pyplot as plt
-import random
-from collections import defaultdict
-from collections import OrderedDict
-import logging
-import os
 logger = logging.getLogger(__name__)
 
+_REDUCED_COLOR = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+class JointsRecordMixin(object):
+    '''
+    Loading of the db and reading of the record images, shared by the
+    joints dataset bases. Expects the attributes their __init__ sets.
+    '''
+    def load_db(self, cfg, sources=(), config=()):
+        '''
+        _get_db() (records or a JointsDB) as a JointsDB, reduced by
+        select_data when training with DATASET.SELECT_DATA. With
+        DATASET.ANNOTATION_CACHE_DIR set the db is compiled once into an
+        .npz keyed by the sha1 of the annotation sources and the settings
+        it depends on (config).
+        '''
+        select = bool(self.is_train and cfg.DATASET.SELECT_DATA)
+        cache_file = annotation_cache_file(
+            cfg.DATASET.get('ANNOTATION_CACHE_DIR', ''), type(self), sources,
+            [self.root, self.image_set, bool(self.is_train), self.data_format,
+             [int(x) for x in self.image_size], select, self.num_joints]
+            + list(config)
+        )
+        if cache_file and os.path.isfile(cache_file):
+            logger.info('=> loading db from {}'.format(cache_file))
+            return JointsDB.load(cache_file)
+
+        db = self._get_db()
+        if not isinstance(db, JointsDB):
+            db = JointsDB.from_records(db, self.num_joints)
+        if select:
+            db = self.select_data(db)
+        if cache_file:
+            logger.info('=> saving db to {}'.format(cache_file))
+            db.save(cache_file)
+        return db
+
+    def read_image(self, image_file, reduction=1):
+        '''
+        decoded BGR image, None if it cannot be read
+        :param reduction: 1, 2, 4 or 8, decode at that fraction of the size
+        '''
+        flags = _REDUCED_COLOR[reduction] | cv2.IMREAD_IGNORE_ORIENTATION
+        if self.data_format == 'zip':
+            from utils import zipreader
+            return zipreader.imread(image_file, flags)
+        return cv2.imread(image_file, flags)
+
+    def decode_reduction(self, db_rec):
+        '''
+        Largest decode reduction that still leaves one decoded pixel per
+        input pixel at every scale the augmentation can pick for db_rec:
+        the smallest scale factor, applied to the person box or to either
+        half-body box.
+        '''
+        if not self.reduced_decode or self.crop_shard_dir:
+            return 1
+
+        joints = db_rec['joints_3d']
+        visible = db_rec['joints_3d_vis'][:, 0] > 0
+        widths = [db_rec['scale'][0] * self.pixel_std]
+        if self.is_train and self.prob_half_body > 0 \
+                and visible.sum() > self.num_joints_half_body:
+            upper = np.isin(np.arange(self.num_joints), self.upper_body_ids)
+            for part in (visible & upper, visible & ~upper):
+                if part.sum() >= 2:
+                    w, h = np.ptp(joints[part, 0:2], axis=0)
+                    widths.append(1.5 * max(w, h * self.aspect_ratio))
+        width = min(widths)
+        if self.is_train:
+            width *= 1 - self.scale_factor
+
+        reduction = max(_REDUCED_COLOR)
+        while reduction > 1 and width / reduction < self.image_size[0]:
+            reduction //= 2
+        return reduction
+
+    def read_record_image(self, idx, image_file, reduction=1):
+        '''
+        :return: image of record idx and the position of its top left corner
+                 in the full image, None when it is the full image
+        '''
+        if self.crop_shard_dir:
+            if self.crop_shards is None:
+                self.crop_shards = CropShards(self.crop_shard_dir, self.db)
+            return self.crop_shards.read(idx)
+
+        # persons of the same image are read back to back with
+        # ImageGroupedBatchSampler, decode the image only once for them
+        key = image_file if reduction == 1 else (image_file, reduction)
+        data_numpy = self.image_cache.get(key)
+        if data_numpy is None:
+            data_numpy = self.image_cache.put(
+                key, self.read_image(image_file, reduction))
+        return data_numpy, None
+
+
+class JointsDataset(JointsRecordMixin, Dataset):
+    # where the synthetic occluders go, see dataset.occlusion
+    occlusion_layout = COCO_OCCLUSION
 
-class JointsDataset(Dataset):
     def __init__(self, cfg, root, image_set, is_train, transform=None):
         self.num_joints = 0
         self.pixel_std = 200
@@ -66,9 +172,48 @@ class JointsDataset(Dataset):
         self.sigma = cfg.MODEL.SIGMA
         self.use_different_joints_weight = cfg.LOSS.USE_DIFFERENT_JOINTS_WEIGHT
         self.joints_weight = 1
+        # return joint coordinates and render the heatmaps on the compute
+        # device (utils.heatmap.render_gaussian_targets) instead
+        self.target_on_device = cfg.MODEL.get('TARGET_ON_DEVICE', False)
 
         self.transform = transform
+        # hand out the uint8 HWC crops as they are, in BGR order; the
+        # colour swap and the normalization of transform are done on the
+        # batch by core.normalize.InputNormalize
+        self.uint8_input = cfg.DATASET.get('UINT8_INPUT', False)
         self.db = []
+        # decoded images kept per worker, 0 disables
+        self.image_cache = DecodedImageCache(
+            cfg.DATASET.get('IMAGE_CACHE_SIZE', 0))
+        # person crops written by tools/build_crop_shards.py, read instead of
+        # the full images when training
+        self.crop_shard_dir = cfg.DATASET.get('CROP_SHARDS', '') \
+            if is_train else ''
+        self.crop_shards = None
+        # teacher outputs written by tools/build_teacher_cache.py for a fixed
+        # set of augmentations per record, handed out in meta['teacher']
+        self.teacher_cache_dir = cfg.DATASET.get('TEACHER_CACHE', '') \
+            if is_train else ''
+        self.teacher_cache = None
+        # decode full images with IMREAD_REDUCED_COLOR_2/4/8 when the person
+        # is large enough, see decode_reduction
+        self.reduced_decode = cfg.DATASET.get('REDUCED_DECODE', False)
+
+        # decode the occluder library once into shared memory instead of
+        # opening PNGs in save_image1 for every sample
+        self.occluder_bank = None
+        if cfg.DATASET.get('OCCLUDER_BANK', False):
+            self.occluder_bank = get_occluder_bank(
+                cfg.DATASET.get('OCCLUDER_ROOT', OCCLUDER_ROOT),
+                cfg.DATASET.get('OCCLUDER_BANK_FILE', ''),
+                cfg.DATASET.get('OCCLUDER_PYRAMID_LEVELS',
+                                OCCLUDER_PYRAMID_LEVELS)
+            )
+
+        # 'image': blend occluders into the full image before the warp,
+        # 'crop': blend them into the warped input only,
+        # 'batch': leave input_new empty and only report the occluders
+        self.occlusion_space = cfg.DATASET.get('OCCLUSION_SPACE', 'image')
 
     def _get_db(self):
         raise NotImplementedError
@@ -125,8 +270,41 @@ class JointsDataset(Dataset):
         return len(self.db)
 
     def __getitem__(self, idx):
-        db_rec = copy.deepcopy(self.db[idx])
-
+        if not self.teacher_cache_dir:
+            return self.get_record(idx)
+
+        if self.teacher_cache is None:
+            self.teacher_cache = TeacherCache(self.teacher_cache_dir, self.db)
+        entry = self.teacher_cache.draw(idx)
+        sample = self.get_record(idx, self.teacher_cache.seed_of(entry))
+        sample[-1]['teacher'] = self.teacher_cache.read(entry)
+        return sample
+
+    def get_record(self, idx, augment_seed=None):
+        ''' sample of record idx, see transform_record for augment_seed '''
+        # JointsDB hands out fresh copies, no deepcopy needed
+        db_rec = self.db[idx]
+        reduction = self.decode_reduction(db_rec)
+        data_numpy, origin = self.read_record_image(
+            idx, db_rec['image'], reduction)
+        full_width = None if origin is None \
+            else self.crop_shards.image_width[idx]
+        return self.transform_record(
+            db_rec, data_numpy, origin, full_width, reduction, augment_seed)
+
+    def transform_record(self, db_rec, data_numpy, origin=None,
+                         full_width=None, reduction=1, augment_seed=None):
+        '''
+        Training / test sample of one db record, shared by __getitem__ and
+        the streaming dataset.record_shards.RecordShardDataset
+        :param data_numpy: decoded BGR image of the record
+        :param origin: position of data_numpy in the full image if it is a
+                       crop, full_width is then the width of the full image
+        :param reduction: data_numpy was decoded at 1 / reduction of the
+                          full size
+        :param augment_seed: draw the half body, scale, rotation and flip
+                             from this seed, the occluders stay random
+        '''
         image_file = db_rec['image']
         #image_file_new = db_rec['image_new']
         filename = db_rec['filename'] if 'filename' in db_rec else ''
@@ -138,30 +316,37 @@ class JointsDataset(Dataset):
         s = db_rec['scale']
         score = db_rec['score'] if 'score' in db_rec else 1
         r = 0
-        if self.data_format == 'zip':
-            from utils import zipreader
-            data_numpy = zipreader.imread(
-                image_file, cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
-            )
-            data_numpy_new=save_image1(s, joints, joints_vis,data_numpy)
-            #data_numpy_new = zipreader.imread(
-            #    image_file_new, cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
-            #)
-        else:
-            data_numpy = cv2.imread(
-                image_file, cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
-            )            
-            data_numpy_new=save_image1(s, joints, joints_vis,data_numpy)
-            #cv2.imwrite("./zh2{}.jpg".format(image_file.split('/')[-1].split('.')[0]), data_numpy)
-            #cv2.imwrite("./zh3{}.jpg".format(image_file.split('/')[-1].split('.')[0]), data_numpy_new)
-            #print("./zh3{}.jpg".format(image_file.split('/')[-1].split('.')[0]))
-            #data_numpy_new = cv2.imread(
-            #    image_file_new, cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
-            #)
-
-        if self.color_rgb:
+        flip_width = None
+
+        occluders = []
+        if self.occlusion_space in ('crop', 'batch'):
+            # occluders are drawn now but blended after the warp ('crop')
+            # or on the collated batch ('batch')
+            data_numpy_new = None
+            occluders = sample_occluders(
+                s, joints, joints_vis, self.occlusion_layout,
+                self.occluder_bank, origin, reduction)
+        else:
+            data_numpy_new=save_image1(s, joints, joints_vis,data_numpy,
+                                       self.occluder_bank, origin, reduction,
+                                       self.occlusion_layout)
+
+        if origin is not None:
+            # crop coordinates, kept at 0 for the unlabeled joints
+            c = c - origin
+            joints[joints_vis[:, 0] > 0, 0:2] -= origin
+        if reduction > 1:
+            # pixel centres of the reduced image
+            c = (c - (reduction - 1) / 2.) / reduction
+            s = s / reduction
+            joints[joints_vis[:, 0] > 0, 0:2] = \
+                (joints[joints_vis[:, 0] > 0, 0:2] - (reduction - 1) / 2.) \
+                / reduction
+
+        if self.color_rgb and not self.uint8_input:
             data_numpy = cv2.cvtColor(data_numpy, cv2.COLOR_BGR2RGB)
-            data_numpy_new = cv2.cvtColor(data_numpy_new, cv2.COLOR_BGR2RGB)
+            if data_numpy_new is not None:
+                data_numpy_new = cv2.cvtColor(data_numpy_new, cv2.COLOR_BGR2RGB)
             #cv2.imwrite("./zh.jpg", data_numpy)
             #cv2.imwrite("./zh1.jpg", data_numpy_new)
 
@@ -172,27 +357,31 @@ class JointsDataset(Dataset):
 
 
         if self.is_train:
-            if (np.sum(joints_vis[:, 0]) > self.num_joints_half_body
-                and np.random.rand() < self.prob_half_body):
-                c_half_body, s_half_body = self.half_body_transform(
-                    joints, joints_vis
-                )
-
-                if c_half_body is not None and s_half_body is not None:
-                    c, s = c_half_body, s_half_body
-
-            sf = self.scale_factor
-            rf = self.rotation_factor
-            s = s * np.clip(np.random.randn()*sf + 1, 1 - sf, 1 + sf)
-            r = np.clip(np.random.randn()*rf, -rf*2, rf*2) \
-                if random.random() <= 0.6 else 0
-
-            if self.flip and random.random() <= 0.5:
-                data_numpy = data_numpy[:, ::-1, :]
-                data_numpy_new = data_numpy_new[:, ::-1, :]
-                joints, joints_vis = fliplr_joints(
-                    joints, joints_vis, data_numpy.shape[1], self.flip_pairs)
-                c[0] = data_numpy.shape[1] - c[0] - 1
+            with fixed_random(augment_seed):
+                if (np.sum(joints_vis[:, 0]) > self.num_joints_half_body
+                    and np.random.rand() < self.prob_half_body):
+                    c_half_body, s_half_body = self.half_body_transform(
+                        joints, joints_vis
+                    )
+
+                    if c_half_body is not None and s_half_body is not None:
+                        c, s = c_half_body, s_half_body
+
+                sf = self.scale_factor
+                rf = self.rotation_factor
+                s = s * np.clip(np.random.randn()*sf + 1, 1 - sf, 1 + sf)
+                r = np.clip(np.random.randn()*rf, -rf*2, rf*2) \
+                    if random.random() <= 0.6 else 0
+
+                if self.flip and random.random() <= 0.5:
+                    data_numpy = data_numpy[:, ::-1, :]
+                    if data_numpy_new is not None:
+                        data_numpy_new = data_numpy_new[:, ::-1, :]
+                    flip_width = data_numpy.shape[1]
+                    joints, joints_vis = fliplr_joints(
+                        joints, joints_vis, data_numpy.shape[1],
+                        self.flip_pairs)
+                    c[0] = data_numpy.shape[1] - c[0] - 1
 
         trans = get_affine_transform(c, s, r, self.image_size)
         input = cv2.warpAffine(
@@ -200,24 +389,49 @@ class JointsDataset(Dataset):
             trans,
             (int(self.image_size[0]), int(self.image_size[1])),
             flags=cv2.INTER_LINEAR)
-        input_new = cv2.warpAffine(
-            data_numpy_new,
-            trans,
-            (int(self.image_size[0]), int(self.image_size[1])),
-            flags=cv2.INTER_LINEAR)
-
-        if self.transform:
+        if self.occlusion_space == 'batch':
+            # made from input by core.occlusion.BatchOcclusion
+            input_new = None
+        elif data_numpy_new is None:
+            input_new = composite_occluders_warped(
+                input.copy(), occluders, trans, flip_width,
+                self.occluder_bank, self.color_rgb and not self.uint8_input)
+        else:
+            input_new = cv2.warpAffine(
+                data_numpy_new,
+                trans,
+                (int(self.image_size[0]), int(self.image_size[1])),
+                flags=cv2.INTER_LINEAR)
+
+        if self.uint8_input:
+            input = torch.from_numpy(input)
+            if input_new is not None:
+                input_new = torch.from_numpy(input_new)
+        elif self.transform:
             input = self.transform(input)
-            input_new = self.transform(input_new)
+            if input_new is not None:
+                input_new = self.transform(input_new)
+        if input_new is None:
+            input_new = torch.zeros(0)
         for i in range(self.num_joints):
             if joints_vis[i, 0] > 0.0:
                 joints[i, 0:2] = affine_transform(joints[i, 0:2], trans)
 
-        target, target_weight = self.generate_target(joints, joints_vis)
+        if self.target_on_device:
+            target, target_weight = self.generate_joint_target(
+                joints, joints_vis)
+        else:
+            target, target_weight = self.generate_target(joints, joints_vis)
 
         target = torch.from_numpy(target)
         target_weight = torch.from_numpy(target_weight)
 
+        if reduction > 1:
+            c = c * reduction + (reduction - 1) / 2.
+            s = s * reduction
+        if origin is not None:
+            c = full_image_center(c, origin, full_width, flip_width)
+
         meta = {
             'image': image_file,
             'filename': filename,
@@ -229,12 +443,14 @@ class JointsDataset(Dataset):
             'rotation': r,
             'score': score
         }
+        if self.occlusion_space == 'batch':
+            meta['occluders'] = encode_occluders(occluders, trans, flip_width)
 
         return input,input_new,target, target_weight, meta
 
     def select_data(self, db):
         db_selected = []
-        for rec in db:
+        for idx, rec in enumerate(db):
             num_vis = 0
             joints_x = 0.0
             joints_y = 0.0
@@ -259,845 +475,62 @@ class JointsDataset(Dataset):
 
             metric = (0.2 / 16) * num_vis + 0.45 - 0.2 / 16
             if ks > metric:
-                db_selected.append(rec)
+                db_selected.append(idx)
 
         logger.info('=> num db: {}'.format(len(db)))
         logger.info('=> num selected db: {}'.format(len(db_selected)))
-        return db_selected
+        return db.take(db_selected)
 
-    def generate_target(self, joints, joints_vis):
+    def generate_joint_target(self, joints, joints_vis):
         '''
         :param joints:  [num_joints, 3]
         :param joints_vis: [num_joints, 3]
-        :return: target, target_weight(1: visible, 0: invisible)
+        :return: target [num_joints, 3] (x, y, visibility),
+                 target_weight [num_joints, 1] with the joint weights only
         '''
+        target = np.zeros((self.num_joints, 3), dtype=np.float64)
+        target[:, 0:2] = joints[:, 0:2]
+        target[:, 2] = joints_vis[:, 0]
         target_weight = np.ones((self.num_joints, 1), dtype=np.float32)
-        target_weight[:, 0] = joints_vis[:, 0]
 
+        if self.use_different_joints_weight:
+            target_weight = np.multiply(target_weight, self.joints_weight)
+
+        return target, target_weight
+
+    def generate_target(self, joints, joints_vis):
+        '''
+        :param joints:  [num_joints, 3]
+        :param joints_vis: [num_joints, 3]
+        :return: target, target_weight(1: visible, 0: invisible)
+        '''
         assert self.target_type == 'gaussian', \
             'Only support gaussian map now!'
 
         if self.target_type == 'gaussian':
-            target = np.zeros((self.num_joints,
-                               self.heatmap_size[1],
-                               self.heatmap_size[0]),
-                              dtype=np.float32)
-
-            tmp_size = self.sigma * 3
-
-            for joint_id in range(self.num_joints):
-                feat_stride = self.image_size / self.heatmap_size
-                mu_x = int(joints[joint_id][0] / feat_stride[0] + 0.5)
-                mu_y = int(joints[joint_id][1] / feat_stride[1] + 0.5)
-                # Check that any part of the gaussian is in-bounds
-                ul = [int(mu_x - tmp_size), int(mu_y - tmp_size)]
-                br = [int(mu_x + tmp_size + 1), int(mu_y + tmp_size + 1)]
-                if ul[0] >= self.heatmap_size[0] or ul[1] >= self.heatmap_size[1] \
-                        or br[0] < 0 or br[1] < 0:
-                    # If not, just return the image as is
-                    target_weight[joint_id] = 0
-                    continue
-
-                # # Generate gaussian
-                size = 2 * tmp_size + 1
-                x = np.arange(0, size, 1, np.float32)
-                y = x[:, np.newaxis]
-                x0 = y0 = size // 2
-                # The gaussian is not normalized, we want the center value to equal 1
-                g = np.exp(- ((x - x0) ** 2 + (y - y0) ** 2) / (2 * self.sigma ** 2))
-
-                # Usable gaussian range
-                g_x = max(0, -ul[0]), min(br[0], self.heatmap_size[0]) - ul[0]
-                g_y = max(0, -ul[1]), min(br[1], self.heatmap_size[1]) - ul[1]
-                # Image range
-                img_x = max(0, ul[0]), min(br[0], self.heatmap_size[0])
-                img_y = max(0, ul[1]), min(br[1], self.heatmap_size[1])
-
-                v = target_weight[joint_id]
-                if v > 0.5:
-                    target[joint_id][img_y[0]:img_y[1], img_x[0]:img_x[1]] = \
-                        g[g_y[0]:g_y[1], g_x[0]:g_x[1]]
+            target, target_weight = generate_gaussian_targets(
+                joints, joints_vis, self.sigma,
+                self.image_size, self.heatmap_size
+            )
 
         if self.use_different_joints_weight:
             target_weight = np.multiply(target_weight, self.joints_weight)
 
         return target, target_weight
         
-def save_image1(scale, batch_joints, batch_joints_vis, imageys):
+def save_image1(scale, batch_joints, batch_joints_vis, imageys,
+                occluder_bank=None, origin=None, reduction=1,
+                layout=COCO_OCCLUSION):
     '''
-    batch_image: [batch_size, channel, height, width]
-    batch_joints: [batch_size, num_joints, 3],
-    batch_joints_vis: [batch_size, num_joints, 1],
-    }
+    scale: [2],
+    batch_joints: [num_joints, 3],
+    batch_joints_vis: [num_joints, 3],
+    imageys: decoded BGR image, never modified
+    origin: position of imageys in the full image if it is a crop
+    reduction: imageys is decoded at 1 / reduction of the full size
+    layout: dataset.occlusion.OcclusionLayout of the joints
+    return: BGR image with up to three occluders blended around the joints
     '''
-    #print("zh1",batch_joints[11].shape,batch_joints[0],scale.shape,scale)
-    #print("zh",batch_joints.shape,batch_joints[0].shape,batch_joints[0],scale.shape,scale)
-    batch_joints=batch_joints[:,0:2]
-    #print(batch_joints.shape,batch_joints)
-    x = random.randint(0, 1)
-    y = random.randint(0, 1)
-    z = random.randint(1, 3)
-    img4=imageys
-    img4 = cv2.cvtColor(img4, cv2.COLOR_BGR2RGB)
-    img4 = Image.fromarray(img4)
-    img4 = img4.convert('RGBA')
-    #img4 = cv2.cvtColor(img4, cv2.COLOR_RGB2BGR)
-    
-    if x == 0 and y == 0 and z == 1:
-        n1 = random.randint(1, 2584)
-        kuai_name1 = os.path.join('gengxin3', "{}-14".format(n1) + '.png')
-        img1 = Image.open(kuai_name1)  
-        n2 = random.randint(1, 2339)
-        n4 = random.randint(1, 8583)
-        if random.randint(0, 1):
-            kuai_name2 = os.path.join('gengxin3', "{}-20".format(n2) + '.png')
-        else:
-            kuai_name2 = os.path.join('gengxin3', "{}-23".format(n4) + '.png')
-        img2 = Image.open(kuai_name2) 
-        n3 = random.randint(1, 9630)
-        kuai_name3 = os.path.join('gengxin3', "{}-24".format(n3) + '.png')
-        img3 = Image.open(kuai_name3)  
-
-        w1 = img1.size[0]
-        h1 = img1.size[1]
-        w2 = img2.size[0]
-        h2 = img2.size[1]
-        w3 = img3.size[0]
-        h3 = img3.size[1]
-          
-
-        if batch_joints[11][0] != 0 and batch_joints[15][0] != 0 and (
-                abs(batch_joints[2] - batch_joints[0]) > scale * 40).all():
-            ss = abs(batch_joints[2] - batch_joints[0])
-        else:
-            ss = scale * 200 * 0.5 * 0.8
-        if w1 > h1:
-            if w1 < ss[1] * 0.3:
-                w11 = ss[1] * 0.4
-            else:
-                w11 = ss[1] * 0.6
-            h11 = h1 / w1 * w11
-        else:
-            if h1 < ss[1] * 0.3:
-                h11 = ss[1] * 0.4
-            else:
-                h11 = ss[1] * 0.6
-            w11 = w1 / h1 * h11
-        if (int(w11)<=0) or (int(h11)<=0):
-            print(kuai_name1)
-        if (int(w11)>0) and (int(h11)>0):
-            img1 = img1.resize((int(w11), int(h11)))
-            if batch_joints_vis[8][0] > 0:
-                ww = int(batch_joints[8][0] - w11 / 2)
-                hh = int(batch_joints[8][1] - h11 / 2 * 0.5)            
-                img4.paste(img1, (ww, hh), img1)
-            #img4.save(image_file, format='png')
-
-        if w2 > h2:
-            if w2 < ss[1] * 0.3:
-                w22 = ss[1] * 0.5
-            else:
-                w22 = ss[1] * 0.8
-            h22 = h2 / w2 * w22
-        else:
-            if h2 < ss[1] * 0.3:
-                h22 = ss[1] * 0.5
-            else:
-                h22 = ss[1] * 0.8
-            w22 = w2 / h2 * h22
-        if (int(w22)<=0) or (int(h22)<=0):
-            print(kuai_name2)
-        if (int(w22)>0) and (int(h22)>0):
-            img2 = img2.resize((int(w22), int(h22)))
-            if batch_joints_vis[13][0] > 0:
-                ww = int(batch_joints[13][0] - w22 / 2)
-                hh = int(batch_joints[13][1] - h22 / 2 * 0.5)
-            
-                img4.paste(img2, (ww, hh), img2)
-            #img4.save(image_file, format='png')
-
-        if w3 > h3:
-            if w3 < ss[1] * 0.3:
-                w33 = ss[1] * 0.5
-            else:
-                w33 = ss[1]
-            h33 = h3 / w3 * w33
-        else:
-            if h3 < ss[1] * 0.3:
-                h33 = ss[1] * 0.5
-            else:
-                h33 = ss[1]
-            w33 = w3 / h3 * h33
-        if (int(w33)<=0) or (int(h33)<=0):
-            print(kuai_name3)
-        if (int(w33)>0) and (int(h33)>0):
-            img3 = img3.resize((int(w33), int(h33)))
-            if batch_joints_vis[7][0] > 0:
-                ww = int(batch_joints[7][0] - w33 / 2)
-                hh = int(batch_joints[7][1] - h33 / 2 * 0.5)
-                img4.paste(img3, (ww, hh), img3)
-            #img4.save(image_file, format='png')
-
-
-    if x == 0 and y == 0 and z == 3:
-        n1 = random.randint(1, 2584)
-        kuai_name1 = os.path.join('gengxin3', "{}-14".format(n1) + '.png')
-        img1 = Image.open(kuai_name1)  
-        n2 = random.randint(1, 2339)
-        n4 = random.randint(1, 8583)
-        if random.randint(0, 1):
-            kuai_name2 = os.path.join('gengxin3', "{}-20".format(n2) + '.png')
-        else:
-            kuai_name2 = os.path.join('gengxin3', "{}-23".format(n4) + '.png')
-        img2 = Image.open(kuai_name2)  
-        n3 = random.randint(1, 224)
-        kuai_name3 = os.path.join('gengxin3', "{}-10".format(n3) + '.png')
-        img3 = Image.open(kuai_name3)  
-
-        w1 = img1.size[0]
-        h1 = img1.size[1]
-        w2 = img2.size[0]
-        h2 = img2.size[1]
-        w3 = img3.size[0]
-        h3 = img3.size[1]  
-
-        if batch_joints[11][0] != 0 and batch_joints[15][0] != 0 and (
-                abs(batch_joints[2] - batch_joints[0]) > scale * 40).all():
-            ss = abs(batch_joints[2] - batch_joints[0])
-        else:
-            ss = scale * 200 * 0.5 * 0.8
-
-        if w1 > h1:
-            if w1 < ss[1] * 0.3:
-                w11 = ss[1] * 0.4
-            else:
-                w11 = ss[1] * 0.6
-            h11 = h1 / w1 * w11
-        else:
-            if h1 < ss[1] * 0.3:
-                h11 = ss[1] * 0.4
-            else:
-                h11 = ss[1] * 0.6
-            w11 = w1 / h1 * h11
-        if (int(w11)<=0) or (int(h11)<=0):
-            print(kuai_name1)
-        if (int(w11)>0) and (int(h11)>0):                
-            img1 = img1.resize((int(w11), int(h11)))
-            if batch_joints_vis[8][0] > 0:
-                ww = int(batch_joints[8][0] - w11 / 2)
-                hh = int(batch_joints[8][1] - h11 / 2 * 0.5)            
-                img4.paste(img1, (ww, hh), img1)
-            #img4.save(image_file, format='png')
-
-        if w2 > h2:
-            if w2 < ss[1] * 0.3:
-                w22 = ss[1] * 0.5
-            else:
-                w22 = ss[1] * 0.8
-            h22 = h2 / w2 * w22
-        else:
-            if h2 < ss[1] * 0.3:
-                h22 = ss[1] * 0.5
-            else:
-                h22 = ss[1] * 0.8
-            w22 = w2 / h2 * h22
-        if (int(w22)<=0) or (int(h22)<=0):
-            print(kuai_name2)
-        if (int(w22)>0) and (int(h22)>0):
-            img2 = img2.resize((int(w22), int(h22)))
-            if batch_joints_vis[13][0] > 0:
-                ww = int(batch_joints[13][0] - w22 / 2)
-                hh = int(batch_joints[13][1] - h22 / 2 * 0.5)
-                img4.paste(img2, (ww, hh), img2)
-            #img4.save(image_file, format='png')
-
-        if w3 > h3:
-            if w3 < ss[1] * 0.3:
-                w33 = ss[1] * 0.5
-            else:
-                w33 = ss[1]
-            h33 = h3 / w3 * w33
-        else:
-            if h3 < ss[1] * 0.3:
-                h33 = ss[1] * 0.5
-            else:
-                h33 = ss[1]
-            w33 = w3 / h3 * h33
-        if (int(w33)<=0) or (int(h33)<=0):
-            print(kuai_name3)
-        if (int(w33)>0) and (int(h33)>0):
-            img3 = img3.resize((int(w33), int(h33)))
-            if batch_joints_vis[11][0] > 0 and batch_joints_vis[12][0] > 0 and  random.randint(0, 6) > 5:
-                ww = int((batch_joints[11][0] +batch_joints[12][0])/2- w33 / 2)
-                hh = int((batch_joints[11][1] +batch_joints[12][1])/2 + h33 / 2 * 0.5)
-                img4.paste(img3, (ww, hh), img3)
-            #img4.save(image_file, format='png')
-
-    if x == 0 and y == 1 and z == 1:
-        n1 = random.randint(1, 2584)
-        kuai_name1 = os.path.join('gengxin3', "{}-14".format(n1) + '.png')
-        img1 = Image.open(kuai_name1)  
-        n2 = random.randint(1, 2367)
-        n4 = random.randint(1, 8583)
-        if random.randint(0, 1):
-            kuai_name2 = os.path.join('gengxin3', "{}-21".format(n2) + '.png')
-        else:
-            kuai_name2 = os.path.join('gengxin3', "{}-23".format(n4) + '.png')
-        img2 = Image.open(kuai_name2)  
-        n3 = random.randint(1, 9630)
-        kuai_name3 = os.path.join('gengxin3', "{}-24".format(n3) + '.png')
-        img3 = Image.open(kuai_name3)  
-
-        w1 = img1.size[0]
-        h1 = img1.size[1]
-        w2 = img2.size[0]
-        h2 = img2.size[1]
-        w3 = img3.size[0]
-        h3 = img3.size[1]
-
-        if batch_joints[11][0] != 0 and batch_joints[15][0] != 0 and (
-                abs(batch_joints[2] - batch_joints[0]) > scale * 40).all():
-            ss = abs(batch_joints[2] - batch_joints[0])
-        else:
-            ss = scale * 200 * 0.5 * 0.8
-
-        if w1 > h1:
-            if w1 < ss[1] * 0.3:
-                w11 = ss[1] * 0.4
-            else:
-                w11 = ss[1] * 0.6
-            h11 = h1 / w1 * w11
-        else:
-            if h1 < ss[1] * 0.3:
-                h11 = ss[1] * 0.4
-            else:
-                h11 = ss[1] * 0.6
-            w11 = w1 / h1 * h11
-        if (int(w11)<=0) or (int(h11)<=0):
-            print(kuai_name1)
-        if (int(w11)>0) and (int(h11)>0):
-            img1 = img1.resize((int(w11), int(h11)))
-            if batch_joints_vis[8][0] > 0:
-                ww = int(batch_joints[8][0] - w11 / 2)
-                hh = int(batch_joints[8][1] - h11 / 2 * 0.5)
-                img4.paste(img1, (ww, hh), img1)
-            #img4.save(image_file, format='png')
-
-        if w2 > h2:
-            if w2 < ss[1] * 0.3:
-                w22 = ss[1] * 0.5
-            else:
-                w22 = ss[1] * 0.8
-            h22 = h2 / w2 * w22
-        else:
-            if h2 < ss[1] * 0.3:
-                h22 = ss[1] * 0.5
-            else:
-                h22 = ss[1] * 0.8
-            w22 = w2 / h2 * h22
-        if (int(w22)<=0) or (int(h22)<=0):
-            print(kuai_name2)
-        if (int(w22)>0) and (int(h22)>0):
-            img2 = img2.resize((int(w22), int(h22)))
-            if batch_joints_vis[14][0] > 0:
-                ww = int(batch_joints[14][0] - w22 / 2)
-                hh = int(batch_joints[14][1] - h22 / 2 * 0.5)
-                img4.paste(img2, (ww, hh), img2)
-            #img4.save(image_file, format='png')
-
-        if w3 > h3:
-            if w3 < ss[1] * 0.3:
-                w33 = ss[1] * 0.5
-            else:
-                w33 = ss[1]
-            h33 = h3 / w3 * w33
-        else:
-            if h3 < ss[1] * 0.3:
-                h33 = ss[1] * 0.5
-            else:
-                h33 = ss[1]
-            w33 = w3 / h3 * h33
-        if (int(w33)<=0) or (int(h33)<=0):
-            print(kuai_name3)
-        if (int(w33)>0) and (int(h33)>0):
-            img3 = img3.resize((int(w33), int(h33)))
-            if batch_joints_vis[7][0] > 0:
-                ww = int(batch_joints[7][0] - w33 / 2)
-                hh = int(batch_joints[7][1] - h33 / 2 * 0.5)
-                img4.paste(img3, (ww, hh), img3)
-            #img4.save(image_file, format='png')
-
-
-    if x == 0 and y == 1 and z == 3:
-        n1 = random.randint(1, 2584)
-        kuai_name1 = os.path.join('gengxin3', "{}-14".format(n1) + '.png')
-        img1 = Image.open(kuai_name1)  
-        n2 = random.randint(1, 2367)
-        n4 = random.randint(1, 8583)
-        if random.randint(0, 1):
-            kuai_name2 = os.path.join('gengxin3', "{}-21".format(n2) + '.png')
-        else:
-            kuai_name2 = os.path.join('gengxin3', "{}-23".format(n4) + '.png')
-        img2 = Image.open(kuai_name2)  
-        n3 = random.randint(1, 224)
-        kuai_name3 = os.path.join('gengxin3', "{}-10".format(n3) + '.png')
-        img3 = Image.open(kuai_name3) 
-
-        w1 = img1.size[0]
-        h1 = img1.size[1]
-        w2 = img2.size[0]
-        h2 = img2.size[1]
-        w3 = img3.size[0]
-        h3 = img3.size[1]
-        if batch_joints[11][0] != 0 and batch_joints[15][0] != 0 and (
-                abs(batch_joints[2] - batch_joints[0]) > scale * 40).all():
-            ss = abs(batch_joints[2] - batch_joints[0])
-        else:
-            ss = scale * 200 * 0.5 * 0.8
-        if w1 > h1:
-            if w1 < ss[1] * 0.3:
-                w11 = ss[1] * 0.4
-            else:
-                w11 = ss[1] * 0.6
-            h11 = h1 / w1 * w11
-        else:
-            if h1 < ss[1] * 0.3:
-                h11 = ss[1] * 0.4
-            else:
-                h11 = ss[1] * 0.6
-            w11 = w1 / h1 * h11
-        if (int(w11)<=0) or (int(h11)<=0):
-            print(kuai_name1)
-        if (int(w11)>0) and (int(h11)>0):
-            img1 = img1.resize((int(w11), int(h11)))
-            if batch_joints_vis[8][0] > 0:
-                ww = int(batch_joints[8][0] - w11 / 2)
-                hh = int(batch_joints[8][1] - h11 / 2 * 0.5)
-                img4.paste(img1, (ww, hh), img1)
-            #img4.save(image_file, format='png')
-
-        if w2 > h2:
-            if w2 < ss[1] * 0.3:
-                w22 = ss[1] * 0.5
-            else:
-                w22 = ss[1] * 0.8
-            h22 = h2 / w2 * w22
-        else:
-            if h2 < ss[1] * 0.3:
-                h22 = ss[1] * 0.5
-            else:
-                h22 = ss[1] * 0.8
-            w22 = w2 / h2 * h22
-        if (int(w22)<=0) or (int(h22)<=0):
-            print(kuai_name2)
-        if (int(w22)>0) and (int(h22)>0):
-            img2 = img2.resize((int(w22), int(h22)))
-            if batch_joints_vis[14][0] > 0:
-                ww = int(batch_joints[14][0] - w22 / 2)
-                hh = int(batch_joints[14][1] - h22 / 2 * 0.5)
-                img4.paste(img2, (ww, hh), img2)
-            #img4.save(image_file, format='png')
-
-        if w3 > h3:
-            if w3 < ss[1] * 0.3:
-                w33 = ss[1] * 0.5
-            else:
-                w33 = ss[1]
-            h33 = h3 / w3 * w33
-        else:
-            if h3 < ss[1] * 0.3:
-                h33 = ss[1] * 0.5
-            else:
-                h33 = ss[1]
-            w33 = w3 / h3 * h33
-        if (int(w33)<=0) or (int(h33)<=0):
-            print(kuai_name3)
-        if (int(w33)>0) and (int(h33)>0):
-            img3 = img3.resize((int(w33), int(h33)))
-            if batch_joints_vis[11][0] > 0 and batch_joints_vis[12][0] > 0 and  random.randint(0, 6) > 5:
-                ww = int((batch_joints[11][0] +batch_joints[12][0])/2- w33 / 2)
-                hh = int((batch_joints[11][1] +batch_joints[12][1])/2 + h33 / 2 * 0.5)
-                img4.paste(img3, (ww, hh), img3)
-            #img4.save(image_file, format='png')
-        
-
-    if x == 1 and y == 0 and z == 1:
-        n1 = random.randint(1, 2938)
-        kuai_name1 = os.path.join('gengxin3', "{}-15".format(n1) + '.png')
-        img1 = Image.open(kuai_name1)  
-        n2 = random.randint(1, 2339)
-        n4 = random.randint(1, 8583)
-        if random.randint(0, 1):
-            kuai_name2 = os.path.join('gengxin3', "{}-20".format(n2) + '.png')
-        else:
-            kuai_name2 = os.path.join('gengxin3', "{}-23".format(n4) + '.png')
-        img2 = Image.open(kuai_name2)  
-        n3 = random.randint(1, 9630)
-        kuai_name3 = os.path.join('gengxin3', "{}-24".format(n3) + '.png')
-        img3 = Image.open(kuai_name3)  
-
-        w1 = img1.size[0]
-        h1 = img1.size[1]
-        w2 = img2.size[0]
-        h2 = img2.size[1]
-        w3 = img3.size[0]
-        h3 = img3.size[1] 
-
-        if batch_joints[11][0] != 0 and batch_joints[15][0] != 0 and (
-                abs(batch_joints[2] - batch_joints[0]) > scale * 40).all():
-            ss = abs(batch_joints[2] - batch_joints[0])
-        else:
-            ss = scale * 200 * 0.5 * 0.8
-
-        if w1 > h1:
-            if w1 < ss[1] * 0.3:
-                w11 = ss[1] * 0.4
-            else:
-                w11 = ss[1] * 0.6
-            h11 = h1 / w1 * w11
-        else:
-            if h1 < ss[1] * 0.3:
-                h11 = ss[1] * 0.4
-            else:
-                h11 = ss[1] * 0.6
-            w11 = w1 / h1 * h11
-        if (int(w11)<=0) or (int(h11)<=0):
-            print(kuai_name1)
-        if (int(w11)>0) and (int(h11)>0):
-            img1 = img1.resize((int(w11), int(h11)))
-            if batch_joints_vis[7][0] > 0:
-                ww = int(batch_joints[7][0] - w11 / 2)
-                hh = int(batch_joints[7][1] - h11 / 2 * 0.5)
-                img4.paste(img1, (ww, hh), img1)
-            #img4.save(image_file, format='png')
-
-        if w2 > h2:
-            if w2 < ss[1] * 0.3:
-                w22 = ss[1] * 0.5
-            else:
-                w22 = ss[1] * 0.8
-            h22 = h2 / w2 * w22
-        else:
-            if h2 < ss[1] * 0.3:
-                h22 = ss[1] * 0.5
-            else:
-                h22 = ss[1] * 0.8
-            w22 = w2 / h2 * h22
-        if (int(w22)<=0) or (int(h22)<=0):
-            print(kuai_name2)
-        if (int(w22)>0) and (int(h22)>0):
-            img2 = img2.resize((int(w22), int(h22)))
-            if batch_joints_vis[13][0] > 0:
-                ww = int(batch_joints[13][0] - w22 / 2)
-                hh = int(batch_joints[13][1] - h22 / 2 * 0.5)
-                img4.paste(img2, (ww, hh), img2)
-            #img4.save(image_file, format='png')
-
-        if w3 > h3:
-            if w3 < ss[1] * 0.3:
-                w33 = ss[1] * 0.5
-            else:
-                w33 = ss[1]
-            h33 = h3 / w3 * w33
-        else:
-            if h3 < ss[1] * 0.3:
-                h33 = ss[1] * 0.5
-            else:
-                h33 = ss[1]
-            w33 = w3 / h3 * h33
-        if (int(w33)<=0) or (int(h33)<=0):
-            print(kuai_name3)
-        if (int(w33)>0) and (int(h33)>0):
-            img3 = img3.resize((int(w33), int(h33)))
-            if batch_joints_vis[8][0] > 0:
-                ww = int(batch_joints[8][0] - w33 / 2)
-                hh = int(batch_joints[8][1] - h33 / 2 * 0.5)
-                img4.paste(img3, (ww, hh), img3)
-            #img4.save(image_file, format='png')
-
-    if x == 1 and y == 0 and z == 3:
-        n1 = random.randint(1, 2938)
-        kuai_name1 = os.path.join('gengxin3', "{}-15".format(n1) + '.png')
-        img1 = Image.open(kuai_name1)  
-        n2 = random.randint(1, 2339)
-        n4 = random.randint(1, 8583)
-        if random.randint(0, 1):
-            kuai_name2 = os.path.join('gengxin3', "{}-20".format(n2) + '.png')
-        else:
-            kuai_name2 = os.path.join('gengxin3', "{}-23".format(n4) + '.png')
-        img2 = Image.open(kuai_name2)  
-        n3 = random.randint(1, 224)
-        kuai_name3 = os.path.join('gengxin3', "{}-10".format(n3) + '.png')
-        img3 = Image.open(kuai_name3) 
-
-        w1 = img1.size[0]
-        h1 = img1.size[1]
-        w2 = img2.size[0]
-        h2 = img2.size[1]
-        w3 = img3.size[0]
-        h3 = img3.size[1]
-        if batch_joints[11][0] != 0 and batch_joints[15][0] != 0 and (
-                abs(batch_joints[2] - batch_joints[0]) > scale * 40).all():
-            ss = abs(batch_joints[2] - batch_joints[0])
-        else:
-            ss = scale * 200 * 0.5 * 0.8
-
-        if w1 > h1:
-            if w1 < ss[1] * 0.3:
-                w11 = ss[1] * 0.4
-            else:
-                w11 = ss[1] * 0.6
-            h11 = h1 / w1 * w11
-        else:
-            if h1 < ss[1] * 0.3:
-                h11 = ss[1] * 0.4
-            else:
-                h11 = ss[1] * 0.6
-            w11 = w1 / h1 * h11
-        if (int(w11)<=0) or (int(h11)<=0):
-            print(kuai_name1)
-        if (int(w11)>0) and (int(h11)>0):
-            img1 = img1.resize((int(w11), int(h11)))
-            if batch_joints_vis[7][0] > 0:
-                ww = int(batch_joints[7][0] - w11 / 2)
-                hh = int(batch_joints[7][1] - h11 / 2 * 0.5)
-                img4.paste(img1, (ww, hh), img1)
-            #img4.save(image_file, format='png')
-
-        if w2 > h2:
-            if w2 < ss[1] * 0.3:
-                w22 = ss[1] * 0.5
-            else:
-                w22 = ss[1] * 0.8
-            h22 = h2 / w2 * w22
-        else:
-            if h2 < ss[1] * 0.3:
-                h22 = ss[1] * 0.5
-            else:
-                h22 = ss[1] * 0.8
-            w22 = w2 / h2 * h22
-        if (int(w22)<=0) or (int(h22)<=0):
-            print(kuai_name2)
-        if (int(w22)>0) and (int(h22)>0):
-            img2 = img2.resize((int(w22), int(h22)))
-            if batch_joints_vis[13][0] > 0:
-                ww = int(batch_joints[13][0] - w22 / 2)
-                hh = int(batch_joints[13][1] - h22 / 2 * 0.5)
-                img4.paste(img2, (ww, hh), img2)
-            #img4.save(image_file, format='png')
-
-        if w3 > h3:
-            if w3 < ss[1] * 0.3:
-                w33 = ss[1] * 0.5
-            else:
-                w33 = ss[1]
-            h33 = h3 / w3 * w33
-        else:
-            if h3 < ss[1] * 0.3:
-                h33 = ss[1] * 0.5
-            else:
-                h33 = ss[1]
-            w33 = w3 / h3 * h33
-        if (int(w33)<=0) or (int(h33)<=0):
-            print(kuai_name3)
-        if (int(w33)>0) and (int(h33)>0):
-            img3 = img3.resize((int(w33), int(h33)))
-            if batch_joints_vis[11][0] > 0 and batch_joints_vis[12][0] > 0 and  random.randint(0, 6) > 5:
-                ww = int((batch_joints[11][0] +batch_joints[12][0])/2- w33 / 2)
-                hh = int((batch_joints[11][1] +batch_joints[12][1])/2 + h33 / 2 * 0.5)
-                img4.paste(img3, (ww, hh), img3)
-            #img4.save(image_file, format='png')
-    if x == 1 and y == 1 and z == 1:
-        n1 = random.randint(1, 2938)
-        kuai_name1 = os.path.join('gengxin3', "{}-15".format(n1) + '.png')
-        img1 = Image.open(kuai_name1)  
-        n2 = random.randint(1, 2367)
-        n4 = random.randint(1, 8583)
-        if random.randint(0, 1):
-            kuai_name2 = os.path.join('gengxin3', "{}-21".format(n2) + '.png')
-        else:
-            kuai_name2 = os.path.join('gengxin3', "{}-23".format(n4) + '.png')
-        img2 = Image.open(kuai_name2)  
-        n3 = random.randint(1, 9630)
-        kuai_name3 = os.path.join('gengxin3', "{}-24".format(n3) + '.png')
-        img3 = Image.open(kuai_name3)  
-
-        w1 = img1.size[0]
-        h1 = img1.size[1]
-        w2 = img2.size[0]
-        h2 = img2.size[1]
-        w3 = img3.size[0]
-        h3 = img3.size[1]
-
-        if batch_joints[11][0] != 0 and batch_joints[15][0] != 0 and (
-                abs(batch_joints[2] - batch_joints[0]) > scale * 40).all():
-            ss = abs(batch_joints[2] - batch_joints[0])
-        else:
-            ss = scale * 200 * 0.5 * 0.8
-        if w1 > h1:
-            if w1 < ss[1] * 0.3:
-                w11 = ss[1] * 0.4
-            else:
-                w11 = ss[1] * 0.6
-            h11 = h1 / w1 * w11
-        else:
-            if h1 < ss[1] * 0.3:
-                h11 = ss[1] * 0.4
-            else:
-                h11 = ss[1] * 0.6
-            w11 = w1 / h1 * h11
-        if (int(w11)<=0) or (int(h11)<=0):
-            print(kuai_name1)
-        if (int(w11)>0) and (int(h11)>0):
-            img1 = img1.resize((int(w11), int(h11)))
-            if batch_joints_vis[7][0] > 0:
-                ww = int(batch_joints[7][0] - w11 / 2)
-                hh = int(batch_joints[7][1] - h11 / 2 * 0.5)
-                img4.paste(img1, (ww, hh), img1)
-            #img4.save(image_file, format='png')
-
-        if w2 > h2:
-            if w2 < ss[1] * 0.3:
-                w22 = ss[1] * 0.5
-            else:
-                w22 = ss[1] * 0.8
-            h22 = h2 / w2 * w22
-        else:
-            if h2 < ss[1] * 0.3:
-                h22 = ss[1] * 0.5
-            else:
-                h22 = ss[1] * 0.8
-            w22 = w2 / h2 * h22
-        if (int(w22)<=0) or (int(h22)<=0):
-            print(kuai_name2)
-        if (int(w22)>0) and (int(h22)>0):
-            img2 = img2.resize((int(w22), int(h22)))
-            if batch_joints_vis[14][0] > 0:
-                ww = int(batch_joints[14][0] - w22 / 2)
-                hh = int(batch_joints[14][1] - h22 / 2 * 0.5)
-                img4.paste(img2, (ww, hh), img2)
-            #img4.save(image_file, format='png')
-
-        if w3 > h3:
-            if w3 < ss[1] * 0.3:
-                w33 = ss[1] * 0.5
-            else:
-                w33 = ss[1]
-            h33 = h3 / w3 * w33
-        else:
-            if h3 < ss[1] * 0.3:
-                h33 = ss[1] * 0.5
-            else:
-                h33 = ss[1]
-            w33 = w3 / h3 * h33
-        if (int(w33)<=0) or (int(h33)<=0):
-            print(kuai_name3)
-        if (int(w33)>0) and (int(h33)>0):
-            img3 = img3.resize((int(w33), int(h33)))
-            if batch_joints_vis[8][0] > 0:
-                ww = int(batch_joints[8][0] - w33 / 2)
-                hh = int(batch_joints[8][1] - h33 / 2 * 0.5)
-                img4.paste(img3, (ww, hh), img3)
-            #img4.save(image_file, format='png')
-
-
-    if x == 1 and y == 1 and z == 3:
-        n1 = random.randint(1, 2938)
-        kuai_name1 = os.path.join('gengxin3', "{}-15".format(n1) + '.png')
-        img1 = Image.open(kuai_name1)  
-        n2 = random.randint(1, 2367)
-        n4 = random.randint(1, 8583)
-        if random.randint(0, 1):
-            kuai_name2 = os.path.join('gengxin3', "{}-21".format(n2) + '.png')
-        else:
-            kuai_name2 = os.path.join('gengxin3', "{}-23".format(n4) + '.png')
-        img2 = Image.open(kuai_name2)  
-        n3 = random.randint(1, 224)
-        kuai_name3 = os.path.join('gengxin3', "{}-10".format(n3) + '.png')
-        img3 = Image.open(kuai_name3)  
-
-        w1 = img1.size[0]
-        h1 = img1.size[1]
-        w2 = img2.size[0]
-        h2 = img2.size[1]
-        w3 = img3.size[0]
-        h3 = img3.size[1]
-
-        if batch_joints[11][0] != 0 and batch_joints[15][0] != 0 and (
-                abs(batch_joints[2] - batch_joints[0]) > scale * 40).all():
-            ss = abs(batch_joints[2] - batch_joints[0])
-        else:
-            ss = scale * 200 * 0.5 * 0.8
-
-        if w1 > h1:
-            if w1 < ss[1] * 0.3:
-                w11 = ss[1] * 0.4
-            else:
-                w11 = ss[1] * 0.6
-            h11 = h1 / w1 * w11
-        else:
-            if h1 < ss[1] * 0.3:
-                h11 = ss[1] * 0.4
-            else:
-                h11 = ss[1] * 0.6
-            w11 = w1 / h1 * h11
-        if (int(w11)<=0) or (int(h11)<=0):
-            print(kuai_name1)
-        if (int(w11)>0) and (int(h11)>0):
-            img1 = img1.resize((int(w11), int(h11)))
-            if batch_joints_vis[7][0] > 0:
-                ww = int(batch_joints[7][0] - w11 / 2)
-                hh = int(batch_joints[7][1] - h11 / 2 * 0.5)
-                img4.paste(img1, (ww, hh), img1)
-            #img4.save(image_file, format='png')
-
-        if w2 > h2:
-            if w2 < ss[1] * 0.3:
-                w22 = ss[1] * 0.5
-            else:
-                w22 = ss[1] * 0.8
-            h22 = h2 / w2 * w22
-        else:
-            if h2 < ss[1] * 0.3:
-                h22 = ss[1] * 0.5
-            else:
-                h22 = ss[1] * 0.8
-            w22 = w2 / h2 * h22
-        if (int(w22)<=0) or (int(h22)<=0):
-            print(kuai_name2)
-        if (int(w22)>0) and (int(h22)>0):
-            img2 = img2.resize((int(w22), int(h22)))
-            if batch_joints_vis[14][0] > 0:
-                ww = int(batch_joints[14][0] - w22 / 2)
-                hh = int(batch_joints[14][1] - h22 / 2 * 0.5)
-                img4.paste(img2, (ww, hh), img2)
-            #img4.save(image_file, format='png')
-
-        if w3 > h3:
-            if w3 < ss[1] * 0.3:
-                w33 = ss[1] * 0.5
-            else:
-                w33 = ss[1]
-            h33 = h3 / w3 * w33
-        else:
-            if h3 < ss[1] * 0.3:
-                h33 = ss[1] * 0.5
-            else:
-                h33 = ss[1]
-            w33 = w3 / h3 * h33
-        if (int(w33)<=0) or (int(h33)<=0):
-            print(kuai_name3)
-        if (int(w33)>0) and (int(h33)>0):
-            img3 = img3.resize((int(w33), int(h33)))
-            if batch_joints_vis[11][0] > 0 and batch_joints_vis[12][0] > 0 and  random.randint(0, 6) > 5:
-                ww = int((batch_joints[11][0] +batch_joints[12][0])/2- w33 / 2)
-                hh = int((batch_joints[11][1] +batch_joints[12][1])/2 + h33 / 2 * 0.5)
-                img4.paste(img3, (ww, hh), img3)
-            #img4.save(image_file, format='png')
-    #print("zh221",type(img4))
-    #img4 = Image.fromarray(img4)    
-    img4 = img4.convert('RGB')
-    img4 = np.asarray(img4)
-    img4 = cv2.cvtColor(img4, cv2.COLOR_RGB2BGR)
-    return img4
-
+    return synthesize_occlusion(scale, batch_joints, batch_joints_vis,
+                                imageys, layout, occluder_bank,
+                                origin, reduction)
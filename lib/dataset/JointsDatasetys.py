@@ -8,7 +8,6 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-import copy
 import logging
 import random
 
@@ -20,12 +19,16 @@ from torch.utils.data import Dataset
 from utils.transforms import get_affine_transform
 from utils.transforms import affine_transform
 from utils.transforms import fliplr_joints
+from utils.heatmap import generate_gaussian_targets
+from dataset.crop_shards import full_image_center
+from dataset.image_cache import DecodedImageCache
+from dataset.JointsDataset import JointsRecordMixin
 
 
 logger = logging.getLogger(__name__)
 
 
-class JointsDataset(Dataset):
+class JointsDataset(JointsRecordMixin, Dataset):
     def __init__(self, cfg, root, image_set, is_train, transform=None):
         self.num_joints = 0
         self.pixel_std = 200
@@ -52,9 +55,27 @@ class JointsDataset(Dataset):
         self.sigma = cfg.MODEL.SIGMA
         self.use_different_joints_weight = cfg.LOSS.USE_DIFFERENT_JOINTS_WEIGHT
         self.joints_weight = 1
+        # return joint coordinates and render the heatmaps on the compute
+        # device (utils.heatmap.render_gaussian_targets) instead
+        self.target_on_device = cfg.MODEL.get('TARGET_ON_DEVICE', False)
 
         self.transform = transform
+        # hand out the uint8 HWC crops as they are, in BGR order; the
+        # colour swap and the normalization of transform are done on the
+        # batch by core.normalize.InputNormalize
+        self.uint8_input = cfg.DATASET.get('UINT8_INPUT', False)
         self.db = []
+        # decoded images kept per worker, 0 disables
+        self.image_cache = DecodedImageCache(
+            cfg.DATASET.get('IMAGE_CACHE_SIZE', 0))
+        # person crops written by tools/build_crop_shards.py, read instead of
+        # the full images when training
+        self.crop_shard_dir = cfg.DATASET.get('CROP_SHARDS', '') \
+            if is_train else ''
+        self.crop_shards = None
+        # decode full images with IMREAD_REDUCED_COLOR_2/4/8 when the person
+        # is large enough, see decode_reduction
+        self.reduced_decode = cfg.DATASET.get('REDUCED_DECODE', False)
 
     def _get_db(self):
         raise NotImplementedError
@@ -111,23 +132,32 @@ class JointsDataset(Dataset):
         return len(self.db)
 
     def __getitem__(self, idx):
-        db_rec = copy.deepcopy(self.db[idx])
-
+        # JointsDB hands out fresh copies, no deepcopy needed
+        db_rec = self.db[idx]
+        reduction = self.decode_reduction(db_rec)
+        data_numpy, origin = self.read_record_image(
+            idx, db_rec['image'], reduction)
+        full_width = None if origin is None \
+            else self.crop_shards.image_width[idx]
+        return self.transform_record(
+            db_rec, data_numpy, origin, full_width, reduction)
+
+    def transform_record(self, db_rec, data_numpy, origin=None,
+                         full_width=None, reduction=1):
+        '''
+        Training / test sample of one db record, shared by __getitem__ and
+        the streaming dataset.record_shards.RecordShardDataset
+        :param data_numpy: decoded BGR image of the record
+        :param origin: position of data_numpy in the full image if it is a
+                       crop, full_width is then the width of the full image
+        :param reduction: data_numpy was decoded at 1 / reduction of the
+                          full size
+        '''
         image_file = db_rec['image']
         filename = db_rec['filename'] if 'filename' in db_rec else ''
         imgnum = db_rec['imgnum'] if 'imgnum' in db_rec else ''
 
-        if self.data_format == 'zip':
-            from utils import zipreader
-            data_numpy = zipreader.imread(
-                image_file, cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
-            )
-        else:
-            data_numpy = cv2.imread(
-                image_file, cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
-            )
-
-        if self.color_rgb:
+        if self.color_rgb and not self.uint8_input:
             data_numpy = cv2.cvtColor(data_numpy, cv2.COLOR_BGR2RGB)
 
         if data_numpy is None:
@@ -141,6 +171,18 @@ class JointsDataset(Dataset):
         s = db_rec['scale']
         score = db_rec['score'] if 'score' in db_rec else 1
         r = 0
+        flip_width = None
+        if origin is not None:
+            # crop coordinates, kept at 0 for the unlabeled joints
+            c = c - origin
+            joints[joints_vis[:, 0] > 0, 0:2] -= origin
+        if reduction > 1:
+            # pixel centres of the reduced image
+            c = (c - (reduction - 1) / 2.) / reduction
+            s = s / reduction
+            joints[joints_vis[:, 0] > 0, 0:2] = \
+                (joints[joints_vis[:, 0] > 0, 0:2] - (reduction - 1) / 2.) \
+                / reduction
 
         if self.is_train:
             if (np.sum(joints_vis[:, 0]) > self.num_joints_half_body
@@ -160,6 +202,7 @@ class JointsDataset(Dataset):
 
             if self.flip and random.random() <= 0.5:
                 data_numpy = data_numpy[:, ::-1, :]
+                flip_width = data_numpy.shape[1]
                 joints, joints_vis = fliplr_joints(
                     joints, joints_vis, data_numpy.shape[1], self.flip_pairs)
                 c[0] = data_numpy.shape[1] - c[0] - 1
@@ -171,18 +214,30 @@ class JointsDataset(Dataset):
             (int(self.image_size[0]), int(self.image_size[1])),
             flags=cv2.INTER_LINEAR)
 
-        if self.transform:
+        if self.uint8_input:
+            input = torch.from_numpy(input)
+        elif self.transform:
             input = self.transform(input)
 
         for i in range(self.num_joints):
             if joints_vis[i, 0] > 0.0:
                 joints[i, 0:2] = affine_transform(joints[i, 0:2], trans)
 
-        target, target_weight = self.generate_target(joints, joints_vis)
+        if self.target_on_device:
+            target, target_weight = self.generate_joint_target(
+                joints, joints_vis)
+        else:
+            target, target_weight = self.generate_target(joints, joints_vis)
 
         target = torch.from_numpy(target)
         target_weight = torch.from_numpy(target_weight)
 
+        if reduction > 1:
+            c = c * reduction + (reduction - 1) / 2.
+            s = s * reduction
+        if origin is not None:
+            c = full_image_center(c, origin, full_width, flip_width)
+
         meta = {
             'image': image_file,
             'filename': filename,
@@ -199,7 +254,7 @@ class JointsDataset(Dataset):
 
     def select_data(self, db):
         db_selected = []
-        for rec in db:
+        for idx, rec in enumerate(db):
             num_vis = 0
             joints_x = 0.0
             joints_y = 0.0
@@ -224,64 +279,43 @@ class JointsDataset(Dataset):
 
             metric = (0.2 / 16) * num_vis + 0.45 - 0.2 / 16
             if ks > metric:
-                db_selected.append(rec)
+                db_selected.append(idx)
 
         logger.info('=> num db: {}'.format(len(db)))
         logger.info('=> num selected db: {}'.format(len(db_selected)))
-        return db_selected
+        return db.take(db_selected)
 
-    def generate_target(self, joints, joints_vis):
+    def generate_joint_target(self, joints, joints_vis):
         '''
         :param joints:  [num_joints, 3]
         :param joints_vis: [num_joints, 3]
-        :return: target, target_weight(1: visible, 0: invisible)
+        :return: target [num_joints, 3] (x, y, visibility),
+                 target_weight [num_joints, 1] with the joint weights only
         '''
+        target = np.zeros((self.num_joints, 3), dtype=np.float64)
+        target[:, 0:2] = joints[:, 0:2]
+        target[:, 2] = joints_vis[:, 0]
         target_weight = np.ones((self.num_joints, 1), dtype=np.float32)
-        target_weight[:, 0] = joints_vis[:, 0]
 
+        if self.use_different_joints_weight:
+            target_weight = np.multiply(target_weight, self.joints_weight)
+
+        return target, target_weight
+
+    def generate_target(self, joints, joints_vis):
+        '''
+        :param joints:  [num_joints, 3]
+        :param joints_vis: [num_joints, 3]
+        :return: target, target_weight(1: visible, 0: invisible)
+        '''
         assert self.target_type == 'gaussian', \
             'Only support gaussian map now!'
 
         if self.target_type == 'gaussian':
-            target = np.zeros((self.num_joints,
-                               self.heatmap_size[1],
-                               self.heatmap_size[0]),
-                              dtype=np.float32)
-
-            tmp_size = self.sigma * 3
-
-            for joint_id in range(self.num_joints):
-                feat_stride = self.image_size / self.heatmap_size
-                mu_x = int(joints[joint_id][0] / feat_stride[0] + 0.5)
-                mu_y = int(joints[joint_id][1] / feat_stride[1] + 0.5)
-                # Check that any part of the gaussian is in-bounds
-                ul = [int(mu_x - tmp_size), int(mu_y - tmp_size)]
-                br = [int(mu_x + tmp_size + 1), int(mu_y + tmp_size + 1)]
-                if ul[0] >= self.heatmap_size[0] or ul[1] >= self.heatmap_size[1] \
-                        or br[0] < 0 or br[1] < 0:
-                    # If not, just return the image as is
-                    target_weight[joint_id] = 0
-                    continue
-
-                # # Generate gaussian
-                size = 2 * tmp_size + 1
-                x = np.arange(0, size, 1, np.float32)
-                y = x[:, np.newaxis]
-                x0 = y0 = size // 2
-                # The gaussian is not normalized, we want the center value to equal 1
-                g = np.exp(- ((x - x0) ** 2 + (y - y0) ** 2) / (2 * self.sigma ** 2))
-
-                # Usable gaussian range
-                g_x = max(0, -ul[0]), min(br[0], self.heatmap_size[0]) - ul[0]
-                g_y = max(0, -ul[1]), min(br[1], self.heatmap_size[1]) - ul[1]
-                # Image range
-                img_x = max(0, ul[0]), min(br[0], self.heatmap_size[0])
-                img_y = max(0, ul[1]), min(br[1], self.heatmap_size[1])
-
-                v = target_weight[joint_id]
-                if v > 0.5:
-                    target[joint_id][img_y[0]:img_y[1], img_x[0]:img_x[1]] = \
-                        g[g_y[0]:g_y[1], g_x[0]:g_x[1]]
+            target, target_weight = generate_gaussian_targets(
+                joints, joints_vis, self.sigma,
+                self.image_size, self.heatmap_size
+            )
 
         if self.use_different_joints_weight:
             target_weight = np.multiply(target_weight, self.joints_weight)
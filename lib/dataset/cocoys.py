@@ -13,6 +13,8 @@ import json_tricks as json
 import numpy as np
 
 from dataset.JointsDatasetys import JointsDataset
+from dataset.joints_db import JointsDB
+from dataset.joints_db import load_detections
 from nms.nms import oks_nms
 from nms.nms import soft_oks_nms
 
@@ -59,27 +61,9 @@ class COCODataset(JointsDataset):
         self.aspect_ratio = self.image_width * 1.0 / self.image_height
         self.pixel_std = 200
 
-        self.coco = COCO(self._get_ann_file_keypoint())
-
-        # deal with class names
-        cats = [cat['name']
-                for cat in self.coco.loadCats(self.coco.getCatIds())]
-        self.classes = ['__background__'] + cats
-        logger.info('=> classes: {}'.format(self.classes))
-        self.num_classes = len(self.classes)
-        self._class_to_ind = dict(zip(self.classes, range(self.num_classes)))
-        self._class_to_coco_ind = dict(zip(cats, self.coco.getCatIds()))
-        self._coco_ind_to_class_ind = dict(
-            [
-                (self._class_to_coco_ind[cls], self._class_to_ind[cls])
-                for cls in self.classes[1:]
-            ]
-        )
-
-        # load image file names
-        self.image_set_index = self._load_image_set_index()
-        self.num_images = len(self.image_set_index)
-        logger.info('=> num_images: {}'.format(self.num_images))
+        # the COCO api is built on first use, a db loaded from the
+        # annotation cache does not need it until evaluation
+        self._coco = None
 
         self.num_joints = 17
         self.flip_pairs = [[1, 2], [3, 4], [5, 6], [7, 8],
@@ -96,13 +80,43 @@ class COCODataset(JointsDataset):
             dtype=np.float32
         ).reshape((self.num_joints, 1))
 
-        self.db = self._get_db()
-
-        if is_train and cfg.DATASET.SELECT_DATA:
-            self.db = self.select_data(self.db)
+        sources = [self._get_ann_file_keypoint()]
+        if not (self.is_train or self.use_gt_bbox):
+            sources.append(self.bbox_file)
+        self.db = self.load_db(
+            cfg, sources, [bool(self.use_gt_bbox), float(self.image_thre)])
 
         logger.info('=> load {} samples'.format(len(self.db)))
 
+    @property
+    def coco(self):
+        if self._coco is None:
+            self._load_coco()
+        return self._coco
+
+    def _load_coco(self):
+        self._coco = COCO(self._get_ann_file_keypoint())
+
+        # deal with class names
+        cats = [cat['name']
+                for cat in self._coco.loadCats(self._coco.getCatIds())]
+        self.classes = ['__background__'] + cats
+        logger.info('=> classes: {}'.format(self.classes))
+        self.num_classes = len(self.classes)
+        self._class_to_ind = dict(zip(self.classes, range(self.num_classes)))
+        self._class_to_coco_ind = dict(zip(cats, self._coco.getCatIds()))
+        self._coco_ind_to_class_ind = dict(
+            [
+                (self._class_to_coco_ind[cls], self._class_to_ind[cls])
+                for cls in self.classes[1:]
+            ]
+        )
+
+        # load image file names
+        self.image_set_index = self._load_image_set_index()
+        self.num_images = len(self.image_set_index)
+        logger.info('=> num_images: {}'.format(self.num_images))
+
     def _get_ann_file_keypoint(self):
         """ self.root / annotations / person_keypoints_train2017.json """
         prefix = 'person_keypoints' \
@@ -129,6 +143,8 @@ class COCODataset(JointsDataset):
 
     def _load_coco_keypoint_annotations(self):
         """ ground truth bbox and keypoints """
+        if self._coco is None:
+            self._load_coco()
         gt_db = []
         for index in self.image_set_index:
             gt_db.extend(self._load_coco_keypoint_annotation_kernal(index))
@@ -238,44 +254,53 @@ class COCODataset(JointsDataset):
 
         return image_path
 
+    def _xywh2cs_array(self, boxes):
+        '''
+        _xywh2cs for boxes [N, 4] (x, y, w, h) at once
+        :return: center [N, 2], scale [N, 2], both float32
+        '''
+        x, y, w, h = boxes.T
+        center = np.stack([x + w * 0.5, y + h * 0.5], 1).astype(np.float32)
+
+        wide = w > self.aspect_ratio * h
+        tall = w < self.aspect_ratio * h
+        h = np.where(wide, w * 1.0 / self.aspect_ratio, h)
+        w = np.where(tall, h * self.aspect_ratio, w)
+        scale = np.stack(
+            [w * 1.0 / self.pixel_std, h * 1.0 / self.pixel_std], 1
+        ).astype(np.float32)
+        scale = np.where(center[:, 0:1] != -1, scale * 1.25, scale)
+
+        return center, scale
+
     def _load_coco_person_detection_results(self):
-        all_boxes = None
-        with open(self.bbox_file, 'r') as f:
-            all_boxes = json.load(f)
+        dets = load_detections(self.bbox_file)
 
-        if not all_boxes:
+        if not len(dets['score']):
             logger.error('=> Load %s fail!' % self.bbox_file)
             return None
 
-        logger.info('=> Total boxes: {}'.format(len(all_boxes)))
-
-        kpt_db = []
-        num_boxes = 0
-        for n_img in range(0, len(all_boxes)):
-            det_res = all_boxes[n_img]
-            if det_res['category_id'] != 1:
-                continue
-            img_name = self.image_path_from_index(det_res['image_id'])
-            box = det_res['bbox']
-            score = det_res['score']
-
-            if score < self.image_thre:
-                continue
-
-            num_boxes = num_boxes + 1
-
-            center, scale = self._box2cs(box)
-            joints_3d = np.zeros((self.num_joints, 3), dtype=np.float)
-            joints_3d_vis = np.ones(
-                (self.num_joints, 3), dtype=np.float)
-            kpt_db.append({
-                'image': img_name,
-                'center': center,
-                'scale': scale,
-                'score': score,
-                'joints_3d': joints_3d,
-                'joints_3d_vis': joints_3d_vis,
-            })
+        logger.info('=> Total boxes: {}'.format(len(dets['score'])))
+
+        keep = (dets['category_id'] == 1) & \
+            ~(dets['score'] < self.image_thre)
+        image_ids, image_index = np.unique(
+            dets['image_id'][keep], return_inverse=True)
+        num_boxes = int(keep.sum())
+
+        center, scale = self._xywh2cs_array(dets['bbox'][keep])
+        # every box shares the same all-zero joints / all-one visibility
+        joints_3d = np.broadcast_to(
+            np.zeros((1, self.num_joints, 3), dtype=np.float32),
+            (num_boxes, self.num_joints, 3))
+        joints_3d_vis = np.broadcast_to(
+            np.ones((1, self.num_joints, 3), dtype=np.float32),
+            (num_boxes, self.num_joints, 3))
+        kpt_db = JointsDB.from_arrays(
+            [self.image_path_from_index(i) for i in image_ids],
+            image_index, center, scale, joints_3d, joints_3d_vis,
+            dets['score'][keep]
+        )
 
         logger.info('=> Total boxes after fliter low score@{}: {}'.format(
             self.image_thre, num_boxes))
@@ -361,6 +386,8 @@ class COCODataset(JointsDataset):
             return {'Null': 0}, 0
 
     def _write_coco_keypoint_results(self, keypoints, res_file):
+        if self._coco is None:
+            self._load_coco()
         data_pack = [
             {
                 'cat_id': self._class_to_coco_ind[cls],
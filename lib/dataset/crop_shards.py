@@ -0,0 +1,195 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import logging
+import mmap
+import os
+
+import cv2
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+# bump when the shard or index layout changes
+CROP_SHARD_VERSION = 1
+CROP_SHARD_INDEX = 'index.npz'
+
+
+def crop_envelope(joints, joints_vis, center, scale, scale_factor,
+                  image_size, aspect_ratio, pixel_std=200):
+    '''
+    Region [x0, y0, x1, y1] of the full image that the training
+    augmentation of one record can sample: the person box at the largest
+    scale and any rotation, and the same for a half-body box anywhere over
+    the visible joints.
+    '''
+    # the warp samples (scale[0] * pixel_std) x (that * h / w) source
+    # pixels, a rotation can put any corner anywhere on the circumcircle
+    diagonal = np.sqrt(1 + (float(image_size[1]) / image_size[0]) ** 2)
+    grow = 1 + scale_factor
+
+    half = 0.5 * grow * scale[0] * pixel_std * diagonal
+    x0, y0 = center[0] - half, center[1] - half
+    x1, y1 = center[0] + half, center[1] + half
+
+    visible = joints[joints_vis[:, 0] > 0, :2]
+    if len(visible) >= 2:
+        left_top = visible.min(axis=0)
+        right_bottom = visible.max(axis=0)
+        w, h = right_bottom - left_top
+        if w > aspect_ratio * h:
+            h = w * 1.0 / aspect_ratio
+        elif w < aspect_ratio * h:
+            w = h * aspect_ratio
+        # half_body_transform: box of a subset of these joints times 1.5
+        half = 0.5 * grow * 1.5 * w * diagonal
+        x0 = min(x0, left_top[0] - half)
+        y0 = min(y0, left_top[1] - half)
+        x1 = max(x1, right_bottom[0] + half)
+        y1 = max(y1, right_bottom[1] + half)
+
+    return x0, y0, x1, y1
+
+
+def full_image_center(center, origin, image_width, flip_width=None):
+    '''
+    center of a (possibly flipped) crop made at origin back in the
+    coordinates of the (equally flipped) full image of width image_width
+    '''
+    origin = np.asarray(origin, dtype=np.float64).copy()
+    if flip_width is not None:
+        origin[0] = image_width - origin[0] - flip_width
+    return center + origin
+
+
+class CropShardWriter(object):
+    '''
+    Packs JPEG-encoded person crops into shard files of about shard_size
+    bytes, and writes the offset index that CropShards reads.
+    '''
+    def __init__(self, out_dir, num_records, shard_size=1 << 30,
+                 quality=95):
+        if not os.path.isdir(out_dir):
+            os.makedirs(out_dir)
+        self.out_dir = out_dir
+        self.shard_size = shard_size
+        self.quality = quality
+        self.shard = np.full(num_records, -1, dtype=np.int32)
+        self.offset = np.zeros(num_records, dtype=np.int64)
+        self.length = np.zeros(num_records, dtype=np.int64)
+        self.origin = np.zeros((num_records, 2), dtype=np.int32)
+        self.image_width = np.zeros(num_records, dtype=np.int32)
+        self._file = None
+        self._shard_id = -1
+        self._position = 0
+
+    def _shard_name(self, shard_id):
+        return os.path.join(self.out_dir, 'shard_{:05d}.bin'.format(shard_id))
+
+    def add(self, idx, crop, origin, image_width):
+        ok, encoded = cv2.imencode(
+            '.jpg', crop, [int(cv2.IMWRITE_JPEG_QUALITY), self.quality])
+        if not ok:
+            raise ValueError('Fail to encode crop of record {}'.format(idx))
+        encoded = encoded.tobytes()
+
+        if self._file is None or self._position >= self.shard_size:
+            if self._file is not None:
+                self._file.close()
+            self._shard_id += 1
+            self._file = open(self._shard_name(self._shard_id), 'wb')
+            self._position = 0
+
+        self._file.write(encoded)
+        self.shard[idx] = self._shard_id
+        self.offset[idx] = self._position
+        self.length[idx] = len(encoded)
+        self.origin[idx] = origin
+        self.image_width[idx] = image_width
+        self._position += len(encoded)
+
+    def close(self, center, info):
+        '''
+        :param center: [N, 2] centers of the db the crops were made for,
+                       checked against the db when reading
+        :param info: json-serializable build settings
+        '''
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        missing = int((self.shard < 0).sum())
+        if missing:
+            raise ValueError('{} records have no crop'.format(missing))
+        np.savez(
+            os.path.join(self.out_dir, CROP_SHARD_INDEX),
+            shard=self.shard, offset=self.offset, length=self.length,
+            origin=self.origin, image_width=self.image_width,
+            center=np.asarray(center, dtype=np.float32),
+            info=np.array(json.dumps(
+                dict(info, version=CROP_SHARD_VERSION)))
+        )
+        logger.info('=> wrote {} crops in {} shards to {}'.format(
+            len(self.shard), self._shard_id + 1, self.out_dir))
+
+
+class CropShards(object):
+    '''
+    Read side of tools/build_crop_shards.py. Record idx of the db is a JPEG
+    of the person crop at index offset[idx] of shard[idx]; origin[idx] is
+    the position of the crop in the full image, so the db coordinates are
+    rebased with - origin. Shards are memory mapped on first use in every
+    process.
+    '''
+    def __init__(self, shard_dir, db=None):
+        self.shard_dir = shard_dir
+        with np.load(os.path.join(shard_dir, CROP_SHARD_INDEX)) as index:
+            self.info = json.loads(str(index['info']))
+            self.shard = index['shard']
+            self.offset = index['offset']
+            self.length = index['length']
+            self.origin = index['origin']
+            self.image_width = index['image_width']
+            center = index['center']
+
+        if self.info.get('version') != CROP_SHARD_VERSION:
+            raise ValueError('{} was built with crop shard version {}'.format(
+                shard_dir, self.info.get('version')))
+        if db is not None and (
+                len(db) != len(center) or
+                not np.allclose(db.columns['center'], center)):
+            raise ValueError(
+                '{} was built for another db, rebuild it'.format(shard_dir))
+        self._maps = {}
+        self._pid = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_maps'] = {}
+        state['_pid'] = None
+        return state
+
+    def _map(self, shard_id):
+        if self._pid != os.getpid():
+            self._maps = {}
+            self._pid = os.getpid()
+        if shard_id not in self._maps:
+            name = os.path.join(
+                self.shard_dir, 'shard_{:05d}.bin'.format(shard_id))
+            with open(name, 'rb') as f:
+                self._maps[shard_id] = mmap.mmap(
+                    f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._maps[shard_id]
+
+    def read(self, idx):
+        '''
+        :return: decoded BGR crop of record idx, its origin [2] (float64)
+        '''
+        data = np.frombuffer(
+            self._map(self.shard[idx]), dtype=np.uint8,
+            count=self.length[idx], offset=self.offset[idx]
+        )
+        crop = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        return crop, self.origin[idx].astype(np.float64)
@@ -0,0 +1,45 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from collections import OrderedDict
+
+
+class DecodedImageCache(object):
+    '''
+    Small LRU of decoded images keyed by path. Every DataLoader worker has
+    its own copy of the dataset and therefore its own cache; it pays off
+    when the persons of one image are read back to back
+    (ImageGroupedBatchSampler). Cached arrays are made read-only, callers
+    must copy before writing.
+    '''
+    def __init__(self, capacity=0):
+        self.capacity = capacity
+        self._images = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self):
+        # workers start with an empty cache
+        state = self.__dict__.copy()
+        state['_images'] = OrderedDict()
+        return state
+
+    def get(self, path):
+        image = self._images.get(path)
+        if image is None:
+            self.misses += 1
+            return None
+        self._images.move_to_end(path)
+        self.hits += 1
+        return image
+
+    def put(self, path, image):
+        if self.capacity <= 0 or image is None:
+            return image
+        image.setflags(write=False)
+        self._images[path] = image
+        self._images.move_to_end(path)
+        while len(self._images) > self.capacity:
+            self._images.popitem(last=False)
+        return image
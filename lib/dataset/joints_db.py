@@ -0,0 +1,230 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+# bump when the layout of the saved db changes, invalidates every cache
+JOINTS_DB_VERSION = 1
+
+
+class StringTable(object):
+    '''
+    Interned strings packed into one uint8 buffer, so a table of image paths
+    is two numpy arrays instead of one python object per record.
+    '''
+    def __init__(self, chars, offsets):
+        self.chars = chars
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, strings):
+        ''' :return: table, int32 index of every string in the table '''
+        ids = {}
+        index = np.array(
+            [ids.setdefault(s, len(ids)) for s in strings], dtype=np.int32)
+        encoded = [s.encode('utf-8') for s in ids]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(e) for e in encoded])
+        chars = np.frombuffer(b''.join(encoded), dtype=np.uint8).copy()
+        return cls(chars, offsets), index
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.chars[self.offsets[i]:self.offsets[i + 1]] \
+            .tobytes().decode('utf-8')
+
+
+class JointsDB(object):
+    '''
+    Struct-of-arrays version of the JointsDataset.db list of dicts.
+
+    Every field is one contiguous array, so forked DataLoader workers do not
+    dirty the shared pages by touching the refcounts of millions of small
+    objects. db[i] still gives the record dict __getitem__ used to deepcopy,
+    built from fresh float64 copies of the rows.
+
+        joints:     float32 [N, num_joints, 3]
+        joints_vis: float32 [N, num_joints, 3]
+        center:     float32 [N, 2]
+        scale:      float32 [N, 2]
+        score:      float32 [N], 1 for ground truth boxes
+        imgnum:     int64 [N]
+        image:      int32 [N], index into strings
+        filename:   int32 [N], index into strings
+    '''
+    def __init__(self, columns, strings):
+        self.columns = columns
+        self.strings = strings
+
+    @classmethod
+    def from_records(cls, records, num_joints):
+        num = len(records)
+        strings, index = StringTable.build(
+            [rec['image'] for rec in records] +
+            [rec.get('filename', '') for rec in records]
+        )
+
+        columns = {
+            'joints': np.zeros((num, num_joints, 3), dtype=np.float32),
+            'joints_vis': np.zeros((num, num_joints, 3), dtype=np.float32),
+            'center': np.zeros((num, 2), dtype=np.float32),
+            'scale': np.zeros((num, 2), dtype=np.float32),
+            'score': np.ones(num, dtype=np.float32),
+            'imgnum': np.zeros(num, dtype=np.int64),
+            'image': index[:num],
+            'filename': index[num:],
+        }
+        for i, rec in enumerate(records):
+            columns['joints'][i] = rec['joints_3d']
+            columns['joints_vis'][i] = rec['joints_3d_vis']
+            columns['center'][i] = rec['center']
+            columns['scale'][i] = rec['scale']
+            columns['score'][i] = rec.get('score', 1)
+            imgnum = rec.get('imgnum', 0)
+            columns['imgnum'][i] = imgnum if imgnum != '' else 0
+
+        db = cls(columns, strings)
+        logger.info('=> db: {} records, {} strings, {:.1f} MB'.format(
+            len(db), len(strings), db.nbytes / 1024.0 ** 2))
+        return db
+
+    @classmethod
+    def from_arrays(cls, image_paths, image_index, center, scale, joints,
+                    joints_vis, score=None):
+        '''
+        db straight from columns, without going through record dicts
+        :param image_paths: list of distinct image paths
+        :param image_index: [N], index of the image of every row in
+                            image_paths
+        '''
+        num = len(image_index)
+        strings, index = StringTable.build(list(image_paths) + [''])
+        columns = {
+            'joints': joints,
+            'joints_vis': joints_vis,
+            'center': np.asarray(center, dtype=np.float32),
+            'scale': np.asarray(scale, dtype=np.float32),
+            'score': np.ones(num, dtype=np.float32) if score is None
+            else np.asarray(score, dtype=np.float32),
+            'imgnum': np.zeros(num, dtype=np.int64),
+            'image': index[:-1][np.asarray(image_index, dtype=np.int64)],
+            'filename': np.full(num, index[-1], dtype=np.int32),
+        }
+        return cls(columns, strings)
+
+    @property
+    def nbytes(self):
+        return sum(c.nbytes for c in self.columns.values()) \
+            + self.strings.chars.nbytes + self.strings.offsets.nbytes
+
+    def __len__(self):
+        return len(self.columns['score'])
+
+    def __getitem__(self, idx):
+        c = self.columns
+        return {
+            'image': self.strings[c['image'][idx]],
+            'filename': self.strings[c['filename'][idx]],
+            'imgnum': int(c['imgnum'][idx]),
+            'joints_3d': c['joints'][idx].astype(np.float64),
+            'joints_3d_vis': c['joints_vis'][idx].astype(np.float64),
+            'center': c['center'][idx].astype(np.float64),
+            'scale': c['scale'][idx].astype(np.float64),
+            'score': float(c['score'][idx]),
+        }
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def take(self, indices):
+        ''' records at indices, sharing the string table '''
+        indices = np.asarray(indices, dtype=np.int64)
+        return JointsDB(
+            {name: column[indices] for name, column in self.columns.items()},
+            self.strings
+        )
+
+    def save(self, file_name):
+        arrays = {'strings_chars': self.strings.chars,
+                  'strings_offsets': self.strings.offsets}
+        for name, column in self.columns.items():
+            arrays['column_' + name] = column
+        # write next to the target and rename, ranks may race on the cache
+        tmp_name = '{}.{}.tmp'.format(file_name, os.getpid())
+        with open(tmp_name, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_name, file_name)
+
+    @classmethod
+    def load(cls, file_name):
+        with np.load(file_name) as arrays:
+            columns = {
+                key[len('column_'):]: arrays[key]
+                for key in arrays.files if key.startswith('column_')
+            }
+            strings = StringTable(
+                arrays['strings_chars'], arrays['strings_offsets'])
+        return cls(columns, strings)
+
+
+def file_sha1(file_name):
+    sha1 = hashlib.sha1()
+    with open(file_name, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def annotation_cache_file(cache_dir, dataset_cls, sources, config):
+    '''
+    Path of the compiled db of dataset_cls in cache_dir, '' if caching is
+    off. The name changes with the content of every source file and with
+    config (a json-serializable list of the settings the db depends on).
+    '''
+    if not cache_dir:
+        return ''
+    key = hashlib.sha1(json.dumps([
+        JOINTS_DB_VERSION,
+        '{}.{}'.format(dataset_cls.__module__, dataset_cls.__name__),
+        [file_sha1(s) for s in sources],
+        config,
+    ], sort_keys=True).encode('utf-8')).hexdigest()
+
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, '{}_{}.npz'.format(
+        dataset_cls.__module__.split('.')[-1], key[:20]))
+
+
+def load_detections(file_name):
+    '''
+    COCO style detection results [{image_id, category_id, bbox, score}]
+    as numpy columns: image_id int64 [N], category_id int64 [N],
+    bbox float64 [N, 4] (x, y, w, h), score float64 [N]. Plain json is
+    used since the file holds no numpy types.
+    '''
+    with open(file_name, 'r') as f:
+        dets = json.load(f)
+    num = len(dets)
+    return {
+        'image_id': np.fromiter(
+            (d['image_id'] for d in dets), dtype=np.int64, count=num),
+        'category_id': np.fromiter(
+            (d['category_id'] for d in dets), dtype=np.int64, count=num),
+        'bbox': np.array(
+            [d['bbox'][:4] for d in dets], dtype=np.float64).reshape(-1, 4),
+        'score': np.fromiter(
+            (d['score'] for d in dets), dtype=np.float64, count=num),
+    }
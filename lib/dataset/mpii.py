@@ -33,10 +33,8 @@ class MPIIDataset(JointsDataset):
         self.upper_body_ids = (7, 8, 9, 10, 11, 12, 13, 14, 15)
         self.lower_body_ids = (0, 1, 2, 3, 4, 5, 6)
 
-        self.db = self._get_db()
-
-        if is_train and cfg.DATASET.SELECT_DATA:
-            self.db = self.select_data(self.db)
+        self.db = self.load_db(
+            cfg, [os.path.join(self.root, 'annot', self.image_set + '.json')])
 
         logger.info('=> load {} samples'.format(len(self.db)))
 
@@ -0,0 +1,291 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+import os
+import re
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+
+
+logger = logging.getLogger(__name__)
+
+OCCLUDER_ROOT = 'gengxin3'
+OCCLUDER_CATEGORIES = ('10', '14', '15', '20', '21', '23', '24')
+# level 0 is the patch as decoded, level k is downscaled by 2 ** k
+OCCLUDER_PYRAMID_LEVELS = 5
+# bump when the saved bank layout changes
+OCCLUDER_BANK_VERSION = 1
+
+# patches are named "<number>-<category>.png", e.g. gengxin3/17-24.png
+_OCCLUDER_NAME = re.compile(r'^(\d+)-(\d+)\.png$')
+
+
+def parse_occluder_name(path):
+    ''' gengxin3/17-24.png -> ('24', 17), None for foreign files '''
+    match = _OCCLUDER_NAME.match(os.path.basename(path))
+    if match is None:
+        return None
+    return match.group(2), int(match.group(1))
+
+
+def load_occluder(path):
+    ''' decode one occluder patch as uint8 RGBA [height, width, 4] '''
+    with Image.open(path) as img:
+        return np.asarray(img.convert('RGBA'))
+
+
+def premultiply(patch):
+    ''' straight RGBA -> premultiplied RGBA, both uint8 '''
+    patch = patch.astype(np.uint16)
+    out = np.empty(patch.shape, dtype=np.uint8)
+    out[..., :3] = (patch[..., :3] * patch[..., 3:4] + 127) // 255
+    out[..., 3] = patch[..., 3]
+    return out
+
+
+def pyramid_sizes(height, width, num_levels):
+    '''
+    (height, width) of every pyramid level of a patch. Levels that would
+    get below one pixel repeat the smallest real level.
+    '''
+    sizes = [(height, width)]
+    while len(sizes) < num_levels:
+        h, w = sizes[-1]
+        if h < 2 or w < 2:
+            sizes.append((h, w))
+        else:
+            sizes.append(((h + 1) // 2, (w + 1) // 2))
+    return sizes
+
+
+class OccluderBank(object):
+    '''
+    The whole occluder library decoded once and packed into one
+    premultiplied RGBA atlas per category. The atlas tensors are moved to
+    shared memory, so forked or spawned DataLoader workers read patches as
+    zero-copy views instead of opening PNGs for every sample.
+
+    Every patch is stored as a pyramid of power-of-two downscales, so a
+    patch of any source size only needs a resize by less than 2x to reach
+    its target size.
+
+    For every category:
+        pixels:  uint8 [num_bytes], levels stored back to back, row-major
+        offsets: int64 [num_patches, num_levels], byte offset of each level
+        sizes:   int64 [num_patches, num_levels, 2], (height, width)
+        index:   int64 [max_number + 1], patch number -> row, -1 if missing
+    '''
+    def __init__(self, tables):
+        self.tables = {}
+        for category, table in tables.items():
+            self.tables[category] = {
+                name: torch.as_tensor(np.ascontiguousarray(array))
+                for name, array in table.items()
+            }
+            for tensor in self.tables[category].values():
+                tensor.share_memory_()
+        self._make_views()
+
+    def _make_views(self):
+        self._views = {
+            category: {name: tensor.numpy() for name, tensor in table.items()}
+            for category, table in self.tables.items()
+        }
+
+    def __getstate__(self):
+        # only the shared tensors travel to the workers, views are rebuilt
+        return {'tables': self.tables}
+
+    def __setstate__(self, state):
+        self.tables = state['tables']
+        self._make_views()
+
+    @property
+    def categories(self):
+        return sorted(self.tables.keys())
+
+    @property
+    def nbytes(self):
+        return sum(
+            tensor.numel() * tensor.element_size()
+            for table in self.tables.values() for tensor in table.values()
+        )
+
+    @property
+    def num_levels(self):
+        return min(
+            views['offsets'].shape[1] for views in self._views.values()
+        ) if self._views else 0
+
+    def num_patches(self, category):
+        return len(self._views[category]['offsets'])
+
+    def _row(self, category, number):
+        views = self._views.get(category)
+        if views is None or not 0 <= number < len(views['index']):
+            return None, -1
+        return views, views['index'][number]
+
+    def get(self, category, number, level=0):
+        '''
+        premultiplied RGBA view [h, w, 4] of patch <number>-<category>,
+        downscaled by 2 ** level
+        '''
+        views, row = self._row(category, number)
+        if row < 0:
+            return None
+        level = min(level, views['offsets'].shape[1] - 1)
+        h, w = views['sizes'][row, level]
+        start = views['offsets'][row, level]
+        return views['pixels'][start:start + h * w * 4].reshape(h, w, 4)
+
+    def get_scaled(self, category, number, width, height):
+        '''
+        The smallest pyramid level of patch <number>-<category> that is still
+        at least width x height, level 0 when upscaling.
+        '''
+        views, row = self._row(category, number)
+        if row < 0:
+            return None
+        sizes = views['sizes'][row]
+        fits = (sizes[:, 0] >= height) & (sizes[:, 1] >= width)
+        return self.get(category, number, max(int(fits.sum()) - 1, 0))
+
+    def size(self, category, number):
+        ''' (width, height) of patch <number>-<category> '''
+        views, row = self._row(category, number)
+        if row < 0:
+            return None
+        h, w = views['sizes'][row, 0]
+        return int(w), int(h)
+
+    def lookup(self, path):
+        parsed = parse_occluder_name(path)
+        if parsed is None:
+            return None
+        return self.get(*parsed)
+
+    @classmethod
+    def build(cls, root=OCCLUDER_ROOT, categories=OCCLUDER_CATEGORIES,
+              num_levels=OCCLUDER_PYRAMID_LEVELS):
+        numbers = {category: [] for category in categories}
+        for file_name in os.listdir(root):
+            parsed = parse_occluder_name(file_name)
+            if parsed is not None and parsed[0] in numbers:
+                numbers[parsed[0]].append(parsed[1])
+
+        tables = {}
+        for category in categories:
+            patch_numbers = sorted(numbers[category])
+            paths = [
+                os.path.join(root, '{}-{}.png'.format(n, category))
+                for n in patch_numbers
+            ]
+
+            # first pass only reads the PNG headers to lay out the atlas
+            sizes = np.zeros((len(paths), num_levels, 2), dtype=np.int64)
+            for row, path in enumerate(paths):
+                with Image.open(path) as img:
+                    sizes[row] = pyramid_sizes(
+                        img.size[1], img.size[0], num_levels)
+            nbytes = sizes[..., 0] * sizes[..., 1] * 4
+            offsets = np.zeros(nbytes.size, dtype=np.int64)
+            offsets[1:] = np.cumsum(nbytes)[:-1]
+            offsets = offsets.reshape(nbytes.shape)
+
+            pixels = np.empty(int(nbytes.sum()), dtype=np.uint8)
+            for row, path in enumerate(paths):
+                # every level is filtered from the one above it, in
+                # premultiplied space so transparent borders do not bleed
+                patch = premultiply(load_occluder(path))
+                for level in range(num_levels):
+                    h, w = sizes[row, level]
+                    if patch.shape[0] != h or patch.shape[1] != w:
+                        patch = cv2.resize(
+                            patch, (int(w), int(h)),
+                            interpolation=cv2.INTER_AREA
+                        )
+                    start = offsets[row, level]
+                    pixels[start:start + nbytes[row, level]] = \
+                        patch.reshape(-1)
+
+            index = np.full(
+                (max(patch_numbers) + 1) if patch_numbers else 0, -1,
+                dtype=np.int64
+            )
+            index[patch_numbers] = np.arange(len(patch_numbers))
+
+            tables[category] = {
+                'pixels': pixels,
+                'offsets': offsets,
+                'sizes': sizes,
+                'index': index,
+            }
+            logger.info('=> occluder category -{}: {} patches'.format(
+                category, len(paths)))
+
+        return cls(tables)
+
+    def save(self, file_name):
+        arrays = {}
+        for category, table in self._views.items():
+            for name, array in table.items():
+                arrays['{}_{}'.format(category, name)] = array
+        np.savez(file_name, version=OCCLUDER_BANK_VERSION, **arrays)
+
+    @classmethod
+    def load(cls, file_name):
+        ''' raises ValueError for banks saved with another layout '''
+        tables = {}
+        with np.load(file_name) as arrays:
+            # unversioned banks hold straight alpha and a single level
+            version = int(arrays['version']) if 'version' in arrays.files \
+                else None
+            if version != OCCLUDER_BANK_VERSION:
+                raise ValueError('{} was saved with occluder bank version {}'
+                                 .format(file_name, version))
+            for key in arrays.files:
+                if key == 'version':
+                    continue
+                category, name = key.split('_', 1)
+                tables.setdefault(category, {})[name] = arrays[key]
+        return cls(tables)
+
+
+_occluder_banks = {}
+
+
+def get_occluder_bank(root=OCCLUDER_ROOT, cache_file='',
+                      num_levels=OCCLUDER_PYRAMID_LEVELS):
+    '''
+    Build (or load from cache_file) the bank once per process and share it
+    between the train and valid datasets.
+    '''
+    key = (os.path.abspath(root), num_levels)
+    if key not in _occluder_banks:
+        bank = None
+        if cache_file and os.path.isfile(cache_file):
+            logger.info('=> loading occluder bank from {}'.format(cache_file))
+            try:
+                bank = OccluderBank.load(cache_file)
+            except ValueError as e:
+                logger.info('=> {}, rebuilding'.format(e))
+            if bank is not None and bank.num_levels != num_levels:
+                logger.info('=> {} has {} pyramid levels, rebuilding'.format(
+                    cache_file, bank.num_levels))
+                bank = None
+        if bank is None:
+            logger.info('=> building occluder bank from {}'.format(root))
+            bank = OccluderBank.build(root, num_levels=num_levels)
+            if cache_file:
+                logger.info('=> saving occluder bank to {}'.format(cache_file))
+                bank.save(cache_file)
+        logger.info('=> occluder bank: {:.1f} MB in shared memory'.format(
+            bank.nbytes / 1024.0 ** 2))
+        _occluder_banks[key] = bank
+    return _occluder_banks[key]
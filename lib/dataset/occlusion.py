@@ -0,0 +1,292 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from collections import namedtuple
+import logging
+import os
+import random
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from dataset.occluder_bank import OCCLUDER_ROOT
+from dataset.occluder_bank import load_occluder
+from dataset.occluder_bank import premultiply
+
+
+logger = logging.getLogger(__name__)
+
+# number of patches of every category in the occluder library
+OCCLUDER_COUNTS = {
+    '10': 224,
+    '14': 2584,
+    '15': 2938,
+    '20': 2339,
+    '21': 2367,
+    '23': 8583,
+    '24': 9630,
+}
+
+# Joints the occluders are anchored to. first / second / body are indexed
+# by the x / y / x coin of the synthesis, hip joints are averaged for the
+# -10 patch and hip_gate keeps only 1 in 7 of those.
+OcclusionLayout = namedtuple(
+    'OcclusionLayout', ['first', 'second', 'body', 'hip', 'hip_gate'])
+
+COCO_OCCLUSION = OcclusionLayout(
+    first=(8, 7), second=(13, 14), body=(7, 8), hip=(11, 12), hip_gate=True)
+MPII_OCCLUSION = OcclusionLayout(
+    first=(11, 14), second=(4, 1), body=(14, 11), hip=(7,), hip_gate=False)
+
+# patch <number>-<category> resized to width x height, top-left at (x, y)
+Placement = namedtuple(
+    'Placement', ['category', 'number', 'x', 'y', 'width', 'height'])
+
+# sample_occluders draws at most one patch per slot
+MAX_OCCLUDERS = 3
+OCCLUDER_PARAMS = 11
+
+
+def occluder_path(category, number):
+    return os.path.join(OCCLUDER_ROOT, '{}-{}.png'.format(number, category))
+
+
+def occluder_size(category, number, occluder_bank=None):
+    ''' native (width, height) of a patch '''
+    size = None
+    if occluder_bank is not None:
+        size = occluder_bank.size(category, number)
+    if size is None:
+        with Image.open(occluder_path(category, number)) as img:
+            size = img.size
+    return size
+
+
+def fetch_occluder(category, number, width, height, occluder_bank=None):
+    '''
+    premultiplied RGBA patch resized to [height, width, 4], starting from
+    the closest pyramid level of the bank
+    '''
+    patch = None
+    if occluder_bank is not None:
+        patch = occluder_bank.get_scaled(category, number, width, height)
+    if patch is None:
+        patch = premultiply(load_occluder(occluder_path(category, number)))
+
+    if patch.shape[0] == height and patch.shape[1] == width:
+        return patch
+    shrink = width < patch.shape[1] and height < patch.shape[0]
+    return cv2.resize(
+        patch, (width, height),
+        interpolation=cv2.INTER_AREA if shrink else cv2.INTER_LINEAR
+    )
+
+
+def _occluder_extent(w, h, ref, small, large):
+    if w > h:
+        new_w = ref * small if w < ref * 0.3 else ref * large
+        new_h = h / w * new_w
+    else:
+        new_h = ref * small if h < ref * 0.3 else ref * large
+        new_w = w / h * new_h
+    return new_w, new_h
+
+
+def sample_occluders(scale, joints, joints_vis, layout,
+                     occluder_bank=None, origin=None, reduction=1):
+    '''
+    Draw the occluders of one person the way save_image1 always did
+    (same random stream), without touching any pixel.
+    :param scale: [2], person scale in pixel_std units
+    :param joints: [num_joints, 3], in full image coordinates
+    :param joints_vis: [num_joints, 3]
+    :param origin: integer (x, y) of the image the placements are for inside
+                   the full image, e.g. a crop of dataset.crop_shards
+    :param reduction: the placements are for that image decoded at
+                      1 / reduction of its size
+    :return: list of Placement in image coordinates
+    '''
+    joints = joints[:, 0:2]
+    x = random.randint(0, 1)
+    y = random.randint(0, 1)
+    z = random.randint(1, 3)
+    if z == 2:
+        return []
+
+    first = '14' if x == 0 else '15'
+    n1 = random.randint(1, OCCLUDER_COUNTS[first])
+    second = '20' if y == 0 else '21'
+    n2 = random.randint(1, OCCLUDER_COUNTS[second])
+    n4 = random.randint(1, OCCLUDER_COUNTS['23'])
+    if not random.randint(0, 1):
+        second, n2 = '23', n4
+    third = '24' if z == 1 else '10'
+    n3 = random.randint(1, OCCLUDER_COUNTS[third])
+
+    if joints[11][0] != 0 and joints[15][0] != 0 and (
+            abs(joints[2] - joints[0]) > scale * 40).all():
+        ref = abs(joints[2] - joints[0])[1]
+    else:
+        ref = (scale * 200 * 0.5 * 0.8)[1]
+
+    patches = [
+        (first, n1, 0.4, 0.6, (layout.first[x],)),
+        (second, n2, 0.5, 0.8, (layout.second[y],)),
+        (third, n3, 0.5, 1.0,
+         (layout.body[x],) if third == '24' else layout.hip),
+    ]
+
+    placements = []
+    for category, number, small, large, anchors in patches:
+        w, h = occluder_size(category, number, occluder_bank)
+        w, h = _occluder_extent(w, h, ref, small, large)
+        if int(w) <= 0 or int(h) <= 0:
+            logger.warning('=> degenerate occluder {}'.format(
+                occluder_path(category, number)))
+            continue
+
+        if not all(joints_vis[a][0] > 0 for a in anchors):
+            continue
+        if category == '10' and layout.hip_gate \
+                and not random.randint(0, 6) > 5:
+            continue
+
+        cx = sum(joints[a][0] for a in anchors) / len(anchors)
+        cy = sum(joints[a][1] for a in anchors) / len(anchors)
+        # the -10 patch hangs below its anchor, the others sit over it
+        dy = h / 2 * 0.5 if category == '10' else - h / 2 * 0.5
+        x, y, w, h = int(cx - w / 2), int(cy + dy), int(w), int(h)
+        if origin is not None:
+            x, y = x - int(origin[0]), y - int(origin[1])
+        if reduction > 1:
+            x, y = x // reduction, y // reduction
+            w, h = max(w // reduction, 1), max(h // reduction, 1)
+        placements.append(Placement(category, number, x, y, w, h))
+
+    return placements
+
+
+def alpha_composite(image, patch, x, y, rgb=False):
+    '''
+    Blend a premultiplied RGBA patch into image (uint8, BGR unless rgb)
+    in place with its top-left corner at (x, y). Only the part of the patch
+    that falls inside the image is touched.
+    '''
+    h, w = patch.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + w, image.shape[1]), min(y + h, image.shape[0])
+    if x0 >= x1 or y0 >= y1:
+        return image
+
+    src = patch[y0 - y:y1 - y, x0 - x:x1 - x]
+    roi = image[y0:y1, x0:x1]
+    color = src[..., :3] if rgb else src[..., 2::-1]
+    alpha = src[..., 3:4].astype(np.uint16)
+
+    # out = color + roi * (1 - alpha), in 255 fixed point
+    blended = color.astype(np.uint16) * 255 + roi * (255 - alpha)
+    roi[...] = (blended + 127) // 255
+    return image
+
+
+def composite_occluders(image, placements, occluder_bank=None, rgb=False):
+    for p in placements:
+        patch = fetch_occluder(
+            p.category, p.number, p.width, p.height, occluder_bank)
+        alpha_composite(image, patch, p.x, p.y, rgb)
+    return image
+
+
+def synthesize_occlusion(scale, joints, joints_vis, image, layout,
+                         occluder_bank=None, origin=None, reduction=1):
+    '''
+    Occluded copy of a decoded BGR image. The clean image is left untouched
+    and returned as is when no occluder was drawn.
+    '''
+    if image is None:
+        return None
+    placements = sample_occluders(
+        scale, joints, joints_vis, layout, occluder_bank, origin,
+        reduction)
+    if not placements:
+        return image
+    return composite_occluders(image.copy(), placements, occluder_bank)
+
+
+def crop_affine(trans, flip_width=None):
+    '''
+    3x3 map from full-image to crop coordinates, including the horizontal
+    flip that JointsDataset applies before cv2.warpAffine
+    '''
+    t = np.vstack([trans, [0., 0., 1.]])
+    if flip_width is not None:
+        t = t.dot(np.array([[-1., 0., flip_width - 1], [0., 1., 0.],
+                            [0., 0., 1.]]))
+    return t
+
+
+def composite_occluders_warped(image, placements, trans, flip_width=None,
+                               occluder_bank=None, rgb=False):
+    '''
+    Blend occluders placed in full-image coordinates straight into a crop
+    made by cv2.warpAffine(image, trans, ...), so the full-resolution image
+    never needs an occluded copy.
+    :param image: crop [height, width, 3] uint8, modified in place
+    :param trans: [2, 3] affine of the crop (get_affine_transform)
+    :param flip_width: width of the full image if it was flipped before
+                       the warp, None otherwise
+    '''
+    t = crop_affine(trans, flip_width)
+    # resize the patch to its size in the crop, the warp then only has to
+    # rotate and shift it
+    zoom = np.sqrt(abs(np.linalg.det(t[:2, :2])))
+
+    for p in placements:
+        w = max(int(round(p.width * zoom)), 1)
+        h = max(int(round(p.height * zoom)), 1)
+        patch = fetch_occluder(p.category, p.number, w, h, occluder_bank)
+
+        m = t.dot(np.array([[p.width / w, 0., p.x],
+                            [0., p.height / h, p.y],
+                            [0., 0., 1.]]))[:2]
+        corners = m.dot(np.array([[0., w, 0., w],
+                                  [0., 0., h, h],
+                                  [1., 1., 1., 1.]]))
+        x0 = max(int(np.floor(corners[0].min())), 0)
+        y0 = max(int(np.floor(corners[1].min())), 0)
+        x1 = min(int(np.ceil(corners[0].max())) + 1, image.shape[1])
+        y1 = min(int(np.ceil(corners[1].max())) + 1, image.shape[0])
+        if x0 >= x1 or y0 >= y1:
+            continue
+
+        m[:, 2] -= (x0, y0)
+        warped = cv2.warpAffine(
+            patch, m, (x1 - x0, y1 - y0),
+            flags=cv2.INTER_LINEAR,
+            borderMode=cv2.BORDER_CONSTANT,
+            borderValue=(0, 0, 0, 0)
+        )
+        alpha_composite(image, warped, x0, y0, rgb)
+
+    return image
+
+
+def encode_occluders(placements, trans, flip_width=None):
+    '''
+    Fixed size record of the occluders of one sample for the batch stage
+    (core.occlusion.BatchOcclusion), so it collates with the default
+    collate_fn. Rows follow the drawing order, unused rows are all zero:
+        valid, category, number, width, height, affine [2, 3]
+    where the affine maps the occluder box [0, width] x [0, height] to crop
+    coordinates.
+    '''
+    params = np.zeros((MAX_OCCLUDERS, OCCLUDER_PARAMS), dtype=np.float64)
+    t = crop_affine(trans, flip_width)
+    for k, p in enumerate(placements):
+        params[k, :5] = 1, int(p.category), p.number, p.width, p.height
+        params[k, 5:] = t.dot(np.array([[1., 0., p.x],
+                                        [0., 1., p.y],
+                                        [0., 0., 1.]]))[:2].reshape(-1)
+    return params
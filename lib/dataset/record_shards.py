@@ -0,0 +1,238 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import logging
+import math
+import os
+
+import cv2
+import numpy as np
+from torch.utils.data import IterableDataset
+from torch.utils.data import get_worker_info
+
+from dataset.joints_db import JointsDB
+from utils.distributed import get_rank
+from utils.distributed import get_world_size
+
+
+logger = logging.getLogger(__name__)
+
+# bump when the shard layout changes
+RECORD_SHARD_VERSION = 1
+RECORD_SHARD_LIST = 'shards.json'
+
+
+class RecordShardWriter(object):
+    '''
+    Packs encoded image files and the db records of their persons into
+    sequential shards of about shard_size bytes:
+
+        shard_XXXXX.bin  the encoded images back to back
+        shard_XXXXX.npz  JointsDB of the records, with the extra columns
+                         blob_offset / blob_length locating their image
+        shards.json      list of the shards and their sizes
+    '''
+    def __init__(self, out_dir, db, shard_size=256 << 20):
+        if not os.path.isdir(out_dir):
+            os.makedirs(out_dir)
+        self.out_dir = out_dir
+        self.db = db
+        self.shard_size = shard_size
+        self.shards = []
+        self._file = None
+        self._indices = []
+        self._offsets = []
+        self._lengths = []
+        self._position = 0
+
+    def _flush(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+
+        name = 'shard_{:05d}'.format(len(self.shards))
+        db = self.db.take(self._indices)
+        db.columns['blob_offset'] = np.asarray(self._offsets, dtype=np.int64)
+        db.columns['blob_length'] = np.asarray(self._lengths, dtype=np.int64)
+        db.save(os.path.join(self.out_dir, name + '.npz'))
+        self.shards.append({
+            'name': name,
+            'num_records': len(db),
+            'num_images': len(np.unique(db.columns['blob_offset'])),
+            'num_bytes': self._position,
+        })
+        self._indices, self._offsets, self._lengths = [], [], []
+
+    def add(self, image_bytes, indices):
+        ''' image_bytes: encoded image file, indices: its records in db '''
+        if self._file is not None and self._position >= self.shard_size:
+            self._flush()
+        if self._file is None:
+            self._file = open(os.path.join(
+                self.out_dir, 'shard_{:05d}.bin'.format(len(self.shards))),
+                'wb')
+            self._position = 0
+
+        self._file.write(image_bytes)
+        for idx in indices:
+            self._indices.append(idx)
+            self._offsets.append(self._position)
+            self._lengths.append(len(image_bytes))
+        self._position += len(image_bytes)
+
+    def close(self, info):
+        ''' :param info: json-serializable build settings '''
+        self._flush()
+        with open(os.path.join(self.out_dir, RECORD_SHARD_LIST), 'w') as f:
+            json.dump(dict(info, version=RECORD_SHARD_VERSION,
+                           num_records=sum(s['num_records']
+                                           for s in self.shards),
+                           shards=self.shards), f, indent=1)
+        logger.info('=> wrote {} records in {} shards to {}'.format(
+            sum(s['num_records'] for s in self.shards), len(self.shards),
+            self.out_dir))
+
+
+class RecordShardDataset(IterableDataset):
+    '''
+    Streams the shards of RecordShardWriter through the augmentation of a
+    JointsDataset (its transform_record), yielding exactly what its
+    __getitem__ would.
+
+    Every epoch the shard order is permuted (seed + epoch, call set_epoch
+    like with DistributedSampler) and the shards are dealt out to the
+    DataLoader workers of all ranks. Each shard is read with one sequential
+    read, its images go through a shuffle buffer of buffer_size encoded
+    images, and every image popped from the buffer is decoded once for all
+    of its persons. Every rank yields the same number of samples, wrapping
+    around its shards if needed, so distributed training stays in step.
+    '''
+    def __init__(self, dataset, shard_dir, shuffle=True, buffer_size=256,
+                 seed=0, num_replicas=None, rank=None):
+        with open(os.path.join(shard_dir, RECORD_SHARD_LIST), 'r') as f:
+            info = json.load(f)
+        if info.get('version') != RECORD_SHARD_VERSION:
+            raise ValueError('{} was built with record shard version {}'
+                             .format(shard_dir, info.get('version')))
+
+        self.dataset = dataset
+        self.shard_dir = shard_dir
+        self.shards = info['shards']
+        self.shuffle = shuffle
+        self.buffer_size = max(int(buffer_size), 1)
+        self.seed = seed
+        self.epoch = 0
+        self.num_replicas = get_world_size() if num_replicas is None \
+            else num_replicas
+        self.rank = get_rank() if rank is None else rank
+        self.num_samples = int(
+            math.ceil(info['num_records'] / self.num_replicas))
+        logger.info('=> streaming {} records from {} shards in {}'.format(
+            info['num_records'], len(self.shards), shard_dir))
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __len__(self):
+        return self.num_samples
+
+    def _read_shard(self, shard):
+        ''' :return: the images of a shard as (encoded bytes, records) '''
+        name = os.path.join(self.shard_dir, shard['name'])
+        with open(name + '.bin', 'rb') as f:
+            blob = memoryview(f.read())
+        db = JointsDB.load(name + '.npz')
+        offsets = db.columns['blob_offset']
+        lengths = db.columns['blob_length']
+
+        bounds = np.flatnonzero(np.diff(offsets)) + 1
+        for group in np.split(np.arange(len(db)), bounds):
+            start = int(offsets[group[0]])
+            # own copy, the shard is freed once its images left the buffer
+            image_bytes = bytes(blob[start:start + int(lengths[group[0]])])
+            yield image_bytes, [db[i] for i in group]
+
+    def _images(self, shards, rng):
+        ''' images of shards, cycled for as long as they are consumed '''
+        while True:
+            for shard in shards:
+                for image in self._read_shard(shard):
+                    yield image
+            if self.shuffle:
+                shards = [shards[i] for i in rng.permutation(len(shards))]
+
+    def _samples(self, images):
+        for image_bytes, records in images:
+            data_numpy = cv2.imdecode(
+                np.frombuffer(image_bytes, np.uint8),
+                cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
+            )
+            if data_numpy is None:
+                raise ValueError('Fail to decode {}'.format(
+                    records[0]['image']))
+            # shared by all persons of the image, like the image cache
+            data_numpy.setflags(write=False)
+            for db_rec in records:
+                yield self.dataset.transform_record(db_rec, data_numpy)
+
+    def _shuffled(self, images, rng):
+        buffer = []
+        for image in images:
+            if len(buffer) < self.buffer_size:
+                buffer.append(image)
+                continue
+            j = rng.randint(len(buffer))
+            yield buffer[j]
+            buffer[j] = image
+        rng.shuffle(buffer)
+        for image in buffer:
+            yield image
+
+    def __iter__(self):
+        worker_info = get_worker_info()
+        num_workers = 1 if worker_info is None else worker_info.num_workers
+        worker_id = 0 if worker_info is None else worker_info.id
+        consumer = self.rank * num_workers + worker_id
+        num_consumers = self.num_replicas * num_workers
+
+        rng = np.random.RandomState(
+            (self.seed + self.epoch * num_consumers + consumer) % (1 << 32))
+        order = np.arange(len(self.shards))
+        if self.shuffle:
+            order = np.random.RandomState(
+                self.seed + self.epoch).permutation(len(self.shards))
+        mine = order[consumer::num_consumers]
+        if len(mine) == 0:
+            # more consumers than shards, share one
+            mine = order[consumer % len(order):][:1]
+        shards = [self.shards[i] for i in mine]
+
+        # the samples of the rank split as evenly as possible over workers
+        quota = self.num_samples // num_workers \
+            + int(worker_id < self.num_samples % num_workers)
+        if quota == 0:
+            return
+
+        # the buffer sees only as many images as the quota needs
+        images = self._images(shards, rng)
+        if self.shuffle:
+            images = self._shuffled(_take_persons(images, quota), rng)
+        else:
+            images = _take_persons(images, quota)
+
+        for n, sample in enumerate(self._samples(images)):
+            yield sample
+            if n + 1 == quota:
+                return
+
+
+def _take_persons(images, num):
+    ''' images until they hold num persons, the last one trimmed '''
+    for image_bytes, records in images:
+        if num <= 0:
+            return
+        yield image_bytes, records[:num]
+        num -= len(records)
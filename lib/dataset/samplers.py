@@ -0,0 +1,108 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+import math
+
+import numpy as np
+from torch.utils.data import Dataset
+from torch.utils.data import Sampler
+
+from dataset.teacher_cache import augmentation_seed
+from dataset.teacher_cache import fixed_random
+from utils.distributed import get_rank
+from utils.distributed import get_world_size
+
+
+logger = logging.getLogger(__name__)
+
+
+class ImageGroupedBatchSampler(Sampler):
+    '''
+    Batch sampler that keeps the persons of one image next to each other,
+    so they end up in the same batch and therefore on the same DataLoader
+    worker, where JointsDataset's decoded-image cache serves all but the
+    first of them.
+
+    Shuffling happens at the image level: every epoch the images are put in
+    a new random order (seed + epoch, call set_epoch like with
+    DistributedSampler) and their persons are concatenated. The sequence is
+    padded by wrapping around and cut into one contiguous share per rank.
+    '''
+    def __init__(self, image_index, batch_size, shuffle=True,
+                 drop_last=False, num_replicas=None, rank=None, seed=0):
+        '''
+        :param image_index: [N], image of every sample (JointsDB 'image')
+        '''
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.num_replicas = get_world_size() if num_replicas is None \
+            else num_replicas
+        self.rank = get_rank() if rank is None else rank
+        self.seed = seed
+        self.epoch = 0
+
+        image_index = np.asarray(image_index)
+        order = np.argsort(image_index, kind='stable')
+        bounds = np.flatnonzero(np.diff(image_index[order])) + 1
+        self.groups = np.split(order, bounds)
+        self.num_samples = int(
+            math.ceil(len(image_index) / self.num_replicas))
+        logger.info('=> {} samples in {} images, {:.2f} per image'.format(
+            len(image_index), len(self.groups),
+            len(image_index) / max(len(self.groups), 1)))
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def _rank_indices(self):
+        if self.shuffle:
+            rng = np.random.RandomState(self.seed + self.epoch)
+            groups = [self.groups[i] for i in rng.permutation(len(self.groups))]
+        else:
+            groups = self.groups
+        indices = np.concatenate(groups) if groups \
+            else np.zeros(0, dtype=np.int64)
+        indices = np.resize(indices, self.num_samples * self.num_replicas)
+        start = self.rank * self.num_samples
+        return indices[start:start + self.num_samples]
+
+    def __iter__(self):
+        indices = self._rank_indices()
+        for start in range(0, len(indices), self.batch_size):
+            batch = indices[start:start + self.batch_size]
+            if self.drop_last and len(batch) < self.batch_size:
+                break
+            yield batch.tolist()
+
+    def __len__(self):
+        if self.drop_last:
+            return self.num_samples // self.batch_size
+        return int(math.ceil(self.num_samples / self.batch_size))
+
+
+class SeededDataset(Dataset):
+    '''
+    dataset whose sample idx is drawn with random and np.random seeded
+    from (seed, epoch, idx), so separate processes reading it in the same
+    order (e.g. a DistributedSampler with num_replicas=1 and the same
+    seed) get the same augmentation and occluders, whatever their
+    DataLoader workers did before. Call set_epoch every epoch.
+    '''
+    def __init__(self, dataset, seed=0):
+        self.dataset = dataset
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, idx):
+        entry = self.epoch * len(self.dataset) + idx
+        with fixed_random(augmentation_seed(self.seed, entry)):
+            return self.dataset[idx]
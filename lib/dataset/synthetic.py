@@ -0,0 +1,321 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import logging
+import os
+import shutil
+
+import cv2
+import numpy as np
+from scipy.io import savemat
+
+from dataset.occlusion import OCCLUDER_COUNTS
+
+
+logger = logging.getLogger(__name__)
+
+# rough standing person in a unit box, COCO keypoint order
+COCO_TEMPLATE = np.array([
+    [0.50, 0.08], [0.45, 0.06], [0.55, 0.06], [0.40, 0.08], [0.60, 0.08],
+    [0.30, 0.22], [0.70, 0.22], [0.22, 0.38], [0.78, 0.38], [0.18, 0.52],
+    [0.82, 0.52], [0.38, 0.55], [0.62, 0.55], [0.38, 0.75], [0.62, 0.75],
+    [0.38, 0.95], [0.62, 0.95],
+])
+
+# the same person in MPII joint order
+MPII_TEMPLATE = np.array([
+    [0.38, 0.95], [0.38, 0.75], [0.40, 0.55], [0.60, 0.55], [0.62, 0.75],
+    [0.62, 0.95], [0.50, 0.55], [0.50, 0.25], [0.50, 0.18], [0.50, 0.02],
+    [0.18, 0.52], [0.22, 0.38], [0.30, 0.22], [0.70, 0.22], [0.78, 0.38],
+    [0.82, 0.52],
+])
+MPII_JOINT_NAMES = ('rank', 'rkne', 'rhip', 'lhip', 'lkne', 'lank', 'pelv',
+                    'thor', 'neck', 'head', 'rwri', 'relb', 'rsho', 'lsho',
+                    'lelb', 'lwri')
+
+# (width, height) of typical images of both datasets
+COCO_IMAGE_SIZES = ((640, 480), (640, 427), (480, 640), (427, 640),
+                    (500, 375), (640, 360))
+MPII_IMAGE_SIZES = ((1280, 720), (1920, 1080), (720, 1280))
+
+
+def synthetic_image(rng, width, height):
+    '''
+    BGR image with smooth structure and some texture, so it compresses
+    like a photo instead of like noise or a flat colour
+    '''
+    coarse = rng.randint(
+        0, 256, (max(height // 32, 2), max(width // 32, 2), 3))
+    image = cv2.resize(coarse.astype(np.uint8), (width, height),
+                       interpolation=cv2.INTER_CUBIC)
+    texture = rng.randint(-12, 13, (height, width, 1))
+    return np.clip(image.astype(np.int16) + texture, 0, 255).astype(np.uint8)
+
+
+def synthetic_person(rng, width, height, template=COCO_TEMPLATE,
+                     visibility=(0, 1, 2), p=(0.2, 0.2, 0.6)):
+    '''
+    :param visibility: values of v drawn with probabilities p, MPII has
+                       no v = 1
+    :return: bbox [x, y, w, h] and keypoints [num_joints, 3] (x, y, v) of a
+             template person at a random position and size in the image,
+             all 0 for unlabeled joints
+    '''
+    h = rng.uniform(0.15, 0.9) * height
+    w = h * rng.uniform(0.35, 0.6)
+    x = rng.uniform(0, max(width - w, 1))
+    y = rng.uniform(0, max(height - h, 1))
+
+    num_joints = len(template)
+    keypoints = np.zeros((num_joints, 3))
+    offsets = template + rng.normal(0, 0.03, (num_joints, 2))
+    keypoints[:, 0] = x + offsets[:, 0] * w
+    keypoints[:, 1] = y + offsets[:, 1] * h
+    keypoints[:, 2] = rng.choice(visibility, num_joints, p=p)
+    inside = (keypoints[:, 0] >= 0) & (keypoints[:, 0] < width) \
+        & (keypoints[:, 1] >= 0) & (keypoints[:, 1] < height)
+    keypoints[~inside | (keypoints[:, 2] == 0)] = 0
+    return [float(x), float(y), float(w), float(h)], keypoints
+
+
+class ImageWriter(object):
+    '''
+    Writes the images of a stand-in, and for the paired datasets
+    (coconew, mpiinew) an occluded copy of each to paired_dir. Only the
+    first unique_images images are encoded, later ones are hard links to
+    them (copies where links are not supported), so sets of a million
+    records cost directory entries rather than encodes and disk.
+    '''
+    def __init__(self, rng, image_dir, paired_dir='', unique_images=0,
+                 image_sizes=COCO_IMAGE_SIZES, quality=90):
+        self.rng = rng
+        self.dirs = [d for d in (image_dir, paired_dir) if d]
+        for d in self.dirs:
+            if not os.path.isdir(d):
+                os.makedirs(d)
+        self.unique_images = unique_images
+        self.image_sizes = image_sizes
+        self.quality = quality
+        self.written = []
+
+    def _encode(self, file_name):
+        width, height = self.image_sizes[self.rng.randint(
+            len(self.image_sizes))]
+        image = synthetic_image(self.rng, width, height)
+        images = [image]
+        if len(self.dirs) > 1:
+            occluded = image.copy()
+            center = (int(self.rng.randint(width)),
+                      int(self.rng.randint(height)))
+            axes = (int(width * self.rng.uniform(0.05, 0.2)),
+                    int(height * self.rng.uniform(0.05, 0.2)))
+            cv2.ellipse(occluded, center, axes, 0, 0, 360,
+                        tuple(int(v) for v in self.rng.randint(0, 256, 3)),
+                        -1, lineType=cv2.LINE_AA)
+            images.append(occluded)
+        for d, image in zip(self.dirs, images):
+            cv2.imwrite(os.path.join(d, file_name), image,
+                        [int(cv2.IMWRITE_JPEG_QUALITY), self.quality])
+        return width, height
+
+    def _link(self, file_name, source):
+        for d in self.dirs:
+            target = os.path.join(d, file_name)
+            if os.path.lexists(target):
+                os.remove(target)
+            try:
+                os.link(os.path.join(d, source), target)
+            except OSError:
+                shutil.copyfile(os.path.join(d, source), target)
+
+    def write(self, file_name):
+        ''' :return: (width, height) of the image written as file_name '''
+        if 0 < self.unique_images <= len(self.written):
+            source, width, height = self.written[
+                len(self.written) % self.unique_images]
+            self._link(file_name, source)
+        else:
+            width, height = self._encode(file_name)
+        self.written.append((file_name, width, height))
+        return width, height
+
+
+def _count(num_images, image_set):
+    if isinstance(num_images, dict):
+        return num_images[image_set]
+    return num_images
+
+
+def write_coco_standin(root, image_sets=('train2017', 'val2017'),
+                       num_images=64, max_persons=3, unique_images=0,
+                       false_positives=0.3, paired=True,
+                       image_sizes=COCO_IMAGE_SIZES, quality=90, seed=0):
+    '''
+    COCO-shaped keypoint dataset under root: images/<set>/*.jpg (occluded
+    copies in imagesnew/<set>/ if paired), annotations/
+    person_keypoints_<set>.json and, per set, a detection result file
+    <set>_det.json usable as TEST.COCO_BBOX_FILE
+    :param num_images: images per set, or {image_set: images}
+    :param max_persons: persons per image are 1 .. max_persons
+    :param unique_images: encode only this many images per set and link
+                          the rest to them, 0 encodes all
+    :param false_positives: low scoring detections per person, on average
+    :return: {image_set: detection file}
+    '''
+    rng = np.random.RandomState(seed)
+    if not os.path.isdir(os.path.join(root, 'annotations')):
+        os.makedirs(os.path.join(root, 'annotations'))
+    det_files = {}
+    image_id = ann_id = 0
+    for image_set in image_sets:
+        writer = ImageWriter(
+            rng, os.path.join(root, 'images', image_set),
+            os.path.join(root, 'imagesnew', image_set) if paired else '',
+            unique_images, image_sizes, quality
+        )
+        images, annotations, detections = [], [], []
+        for _ in range(_count(num_images, image_set)):
+            image_id += 1
+            file_name = '%012d.jpg' % image_id
+            width, height = writer.write(file_name)
+            images.append({'id': image_id, 'width': width, 'height': height,
+                           'file_name': file_name})
+
+            for _ in range(rng.randint(1, max_persons + 1)):
+                ann_id += 1
+                bbox, keypoints = synthetic_person(rng, width, height)
+                annotations.append({
+                    'id': ann_id, 'image_id': image_id, 'category_id': 1,
+                    'bbox': bbox, 'area': bbox[2] * bbox[3], 'iscrowd': 0,
+                    'keypoints': keypoints.ravel().tolist(),
+                    'num_keypoints': int((keypoints[:, 2] > 0).sum()),
+                })
+                jitter = rng.normal(0, 0.05, 4) * (bbox[2:] * 2)
+                detections.append({
+                    'image_id': image_id, 'category_id': 1,
+                    'bbox': [float(v) for v in np.array(bbox) + jitter],
+                    'score': float(rng.uniform(0.5, 1.0)),
+                })
+                if rng.rand() < false_positives:
+                    bbox, _ = synthetic_person(rng, width, height)
+                    detections.append({
+                        'image_id': image_id, 'category_id': 1,
+                        'bbox': bbox,
+                        'score': float(rng.uniform(0.0, 0.5)),
+                    })
+
+        with open(os.path.join(root, 'annotations',
+                               'person_keypoints_%s.json' % image_set),
+                  'w') as f:
+            json.dump({
+                'images': images,
+                'annotations': annotations,
+                'categories': [{
+                    'id': 1, 'name': 'person', 'supercategory': 'person',
+                    'keypoints': [], 'skeleton': [],
+                }],
+            }, f)
+        det_files[image_set] = os.path.join(root, '%s_det.json' % image_set)
+        with open(det_files[image_set], 'w') as f:
+            json.dump(detections, f)
+        logger.info('=> wrote {} images, {} persons to {}'.format(
+            len(images), len(annotations), image_set))
+    return det_files
+
+
+def write_mpii_standin(root, image_sets=('train', 'valid'), num_images=64,
+                       max_persons=2, unique_images=0, paired=True,
+                       image_sizes=MPII_IMAGE_SIZES, quality=90, seed=0):
+    '''
+    MPII-shaped dataset under root: images/*.jpg (occluded copies in
+    imagesnew/ if paired), annot/<set>.json in the layout mpii.py reads
+    and annot/gt_<set>.mat for its evaluate. Coordinates are 1-based like
+    the matlab annotations. Parameters as in write_coco_standin.
+    '''
+    rng = np.random.RandomState(seed)
+    annot_dir = os.path.join(root, 'annot')
+    if not os.path.isdir(annot_dir):
+        os.makedirs(annot_dir)
+    # the sets share one image directory
+    writer = ImageWriter(
+        rng, os.path.join(root, 'images'),
+        os.path.join(root, 'imagesnew') if paired else '',
+        unique_images, image_sizes, quality
+    )
+    dataset_joints = np.empty((1, len(MPII_JOINT_NAMES)), dtype=object)
+    for j, name in enumerate(MPII_JOINT_NAMES):
+        dataset_joints[0, j] = name
+
+    image_id = 0
+    for image_set in image_sets:
+        annotations, headboxes = [], []
+        for _ in range(_count(num_images, image_set)):
+            image_id += 1
+            file_name = '%09d.jpg' % image_id
+            width, height = writer.write(file_name)
+
+            for _ in range(rng.randint(1, max_persons + 1)):
+                (x, y, w, h), keypoints = synthetic_person(
+                    rng, width, height, MPII_TEMPLATE, (0, 1), (0.15, 0.85))
+                joints_vis = keypoints[:, 2]
+                joints = np.where(joints_vis[:, None] > 0,
+                                  keypoints[:, :2] + 1, -1)
+                annotations.append({
+                    'image': file_name,
+                    'center': [x + w / 2 + 1, y + h / 2 + 1],
+                    'scale': h / 200,
+                    'joints': joints.tolist(),
+                    'joints_vis': joints_vis.tolist(),
+                })
+                headboxes.append([[x + 0.38 * w + 1, y + 1],
+                                  [x + 0.62 * w + 1, y + 0.16 * h + 1]])
+
+        with open(os.path.join(annot_dir, image_set + '.json'), 'w') as f:
+            json.dump(annotations, f)
+
+        num_joints = len(MPII_JOINT_NAMES)
+        joints = np.array([a['joints'] for a in annotations]) \
+            .reshape(-1, num_joints, 2)
+        joints_vis = np.array([a['joints_vis'] for a in annotations]) \
+            .reshape(-1, num_joints)
+        savemat(os.path.join(annot_dir, 'gt_{}.mat'.format(image_set)), {
+            'dataset_joints': dataset_joints,
+            'jnt_missing': 1 - joints_vis.T,
+            'pos_gt_src': joints.transpose(1, 2, 0),
+            'headboxes_src': np.array(headboxes).reshape(-1, 2, 2)
+            .transpose(1, 2, 0),
+        })
+        logger.info('=> wrote {} images, {} persons to {}'.format(
+            _count(num_images, image_set), len(annotations), image_set))
+
+
+def write_occluder_library(root, variants=8, max_size=96, counts=None,
+                           seed=0):
+    '''
+    Every <number>-<category>.png that dataset.occlusion can draw, as
+    RGBA blobs; each category cycles through a few distinct patches.
+    :param counts: {category: occluders}, OCCLUDER_COUNTS if None
+    '''
+    rng = np.random.RandomState(seed)
+    if not os.path.isdir(root):
+        os.makedirs(root)
+    counts = OCCLUDER_COUNTS if counts is None else counts
+    for category, count in sorted(counts.items()):
+        patches = []
+        for _ in range(variants):
+            w, h = rng.randint(max_size // 3, max_size + 1, 2)
+            patch = np.zeros((h, w, 4), dtype=np.uint8)
+            patch[..., :3] = synthetic_image(rng, w, h)
+            alpha = np.zeros((h, w), dtype=np.uint8)
+            cv2.ellipse(alpha, (w // 2, h // 2), (w // 2 - 1, h // 2 - 1),
+                        0, 0, 360, 255, -1, lineType=cv2.LINE_AA)
+            patch[..., 3] = alpha
+            patches.append(cv2.imencode('.png', patch)[1].tobytes())
+        for number in range(1, count + 1):
+            with open(os.path.join(
+                    root, '{}-{}.png'.format(number, category)), 'wb') as f:
+                f.write(patches[number % variants])
+    logger.info('=> wrote {} occluders to {}'.format(
+        sum(counts.values()), root))
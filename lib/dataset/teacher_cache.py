@@ -0,0 +1,233 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import contextlib
+import json
+import logging
+import os
+import random
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+# bump when the cache layout changes
+TEACHER_CACHE_VERSION = 1
+TEACHER_CACHE_INFO = 'teacher_cache.json'
+
+
+@contextlib.contextmanager
+def fixed_random(seed=None):
+    '''
+    Run the block with random and np.random seeded with seed, and give the
+    surrounding code its own random state back afterwards. A no-op for
+    seed None.
+    '''
+    if seed is None:
+        yield
+        return
+    state, np_state = random.getstate(), np.random.get_state()
+    random.seed(seed)
+    np.random.seed(seed)
+    try:
+        yield
+    finally:
+        random.setstate(state)
+        np.random.set_state(np_state)
+
+
+def augmentation_seed(seed, entry):
+    ''' seed of the augmentation behind cache entry idx * variants + v '''
+    return (seed + entry) % (1 << 32)
+
+
+def flatten_outputs(outputs):
+    '''
+    :param outputs: model output, a tensor or a list of tensors and lists
+                    of tensors like the (y_list2, y_list3, y_list4, x) of
+                    the _kd models
+    :return: the tensors in order and the layout to rebuild outputs, the
+             length of each inner list or None for a tensor
+    '''
+    if not isinstance(outputs, (list, tuple)):
+        return [outputs], None
+    tensors, layout = [], []
+    for output in outputs:
+        if isinstance(output, (list, tuple)):
+            tensors.extend(output)
+            layout.append(len(output))
+        else:
+            tensors.append(output)
+            layout.append(None)
+    return tensors, layout
+
+
+def unflatten_outputs(tensors, layout):
+    if layout is None:
+        return tensors[0]
+    outputs, i = [], 0
+    for length in layout:
+        if length is None:
+            outputs.append(tensors[i])
+            i += 1
+        else:
+            outputs.append(list(tensors[i:i + length]))
+            i += length
+    return outputs
+
+
+class TeacherCacheWriter(object):
+    '''
+    Teacher outputs of every (record, augmentation variant) as one memory
+    mapped array per output tensor, entry idx * variants + v:
+
+        output_XX.npy      [entries, C, H, W] fp16, or uint8 quantized per
+                           entry and channel to the range in
+        output_XX_lo/hi.npy  [entries, C] fp16
+        center.npy         centers of the db, checked when reading
+        teacher_cache.json layout and build settings
+    '''
+    def __init__(self, out_dir, num_records, variants, shapes, layout,
+                 dtype='fp16'):
+        if dtype not in ('fp16', 'uint8'):
+            raise ValueError('unknown teacher cache dtype {}'.format(dtype))
+        if not os.path.isdir(out_dir):
+            os.makedirs(out_dir)
+        self.out_dir = out_dir
+        self.num_entries = num_records * variants
+        self.num_records = num_records
+        self.variants = variants
+        self.shapes = [list(shape) for shape in shapes]
+        self.layout = layout
+        self.dtype = dtype
+        self.written = np.zeros(self.num_entries, dtype=bool)
+
+        self.arrays, self.ranges = [], []
+        for n, shape in enumerate(self.shapes):
+            name = os.path.join(out_dir, 'output_{:02d}'.format(n))
+            self.arrays.append(np.lib.format.open_memmap(
+                name + '.npy', 'w+',
+                np.float16 if dtype == 'fp16' else np.uint8,
+                (self.num_entries,) + tuple(shape)))
+            if dtype == 'uint8':
+                self.ranges.append(tuple(
+                    np.lib.format.open_memmap(
+                        '{}_{}.npy'.format(name, bound), 'w+', np.float16,
+                        (self.num_entries, shape[0]))
+                    for bound in ('lo', 'hi')))
+
+    def write(self, entries, tensors):
+        '''
+        :param entries: [B] cache entries of the batch
+        :param tensors: flattened teacher outputs [B, C, H, W] (numpy)
+        '''
+        entries = np.asarray(entries)
+        for n, tensor in enumerate(tensors):
+            if self.dtype == 'fp16':
+                self.arrays[n][entries] = tensor
+                continue
+            flat = tensor.reshape(tensor.shape[:2] + (-1,))
+            lo = flat.min(axis=2).astype(np.float16)
+            hi = flat.max(axis=2).astype(np.float16)
+            lo32 = lo.astype(np.float32)[..., None, None]
+            step = np.maximum(hi.astype(np.float32)[..., None, None] - lo32,
+                              1e-8) / 255.
+            self.arrays[n][entries] = np.clip(
+                np.rint((tensor - lo32) / step), 0, 255).astype(np.uint8)
+            self.ranges[n][0][entries] = lo
+            self.ranges[n][1][entries] = hi
+        self.written[entries] = True
+
+    def close(self, center, info):
+        '''
+        :param center: [N, 2] centers of the db the cache was made for
+        :param info: json-serializable build settings, with the seed of
+                     the augmentations
+        '''
+        missing = int((~self.written).sum())
+        if missing:
+            raise ValueError('{} cache entries were not written'.format(
+                missing))
+        for array in self.arrays + [a for r in self.ranges for a in r]:
+            array.flush()
+        np.save(os.path.join(self.out_dir, 'center.npy'),
+                np.asarray(center, dtype=np.float32))
+        with open(os.path.join(self.out_dir, TEACHER_CACHE_INFO), 'w') as f:
+            json.dump(dict(info, version=TEACHER_CACHE_VERSION,
+                           num_records=self.num_records,
+                           variants=self.variants, shapes=self.shapes,
+                           layout=self.layout, dtype=self.dtype), f, indent=1)
+        logger.info('=> wrote {} teacher outputs of {} records to {}'.format(
+            self.num_entries, self.num_records, self.out_dir))
+
+
+class TeacherCache(object):
+    '''
+    Read side of tools/build_teacher_cache.py. Training draws one of the
+    variants of a record (draw), augments it with the seed the cache was
+    built with (fixed_random(seed_of(entry))) and takes the teacher output
+    of that crop from the cache (read). The arrays are memory mapped on
+    first use in every process.
+    '''
+    def __init__(self, cache_dir, db=None):
+        self.cache_dir = cache_dir
+        with open(os.path.join(cache_dir, TEACHER_CACHE_INFO), 'r') as f:
+            self.info = json.load(f)
+        if self.info.get('version') != TEACHER_CACHE_VERSION:
+            raise ValueError('{} was built with teacher cache version {}'
+                             .format(cache_dir, self.info.get('version')))
+        if db is not None:
+            center = np.load(os.path.join(cache_dir, 'center.npy'))
+            if len(db) != len(center) or \
+                    not np.allclose(db.columns['center'], center):
+                raise ValueError(
+                    '{} was built for another db, rebuild it'.format(
+                        cache_dir))
+        self.variants = self.info['variants']
+        self.seed = self.info['seed']
+        self.layout = self.info['layout']
+        self._arrays = None
+        self._pid = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_arrays'] = None
+        state['_pid'] = None
+        return state
+
+    def _open(self):
+        if self._pid != os.getpid():
+            self._arrays = []
+            for n in range(len(self.info['shapes'])):
+                name = os.path.join(self.cache_dir, 'output_{:02d}'.format(n))
+                arrays = [np.load(name + '.npy', mmap_mode='r')]
+                if self.info['dtype'] == 'uint8':
+                    arrays += [np.load('{}_{}.npy'.format(name, bound),
+                                       mmap_mode='r')
+                               for bound in ('lo', 'hi')]
+                self._arrays.append(arrays)
+            self._pid = os.getpid()
+        return self._arrays
+
+    def draw(self, idx):
+        ''' :return: cache entry of a random variant of record idx '''
+        return idx * self.variants + random.randrange(self.variants)
+
+    def seed_of(self, entry):
+        return augmentation_seed(self.seed, entry)
+
+    def read(self, entry):
+        ''' :return: teacher outputs of entry, as the model returns them '''
+        tensors = []
+        for arrays in self._open():
+            if len(arrays) == 1:
+                tensors.append(np.array(arrays[0][entry]))
+                continue
+            q, lo, hi = (a[entry] for a in arrays)
+            lo = lo.astype(np.float32)[:, None, None]
+            step = np.maximum(hi.astype(np.float32)[:, None, None] - lo,
+                              1e-8) / 255.
+            tensors.append((q * step + lo).astype(np.float16))
+        return unflatten_outputs(tensors, self.layout)
@@ -0,0 +1,125 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import torch
+
+
+_gaussian_kernels = {}
+
+
+def gaussian_kernel(sigma):
+    '''
+    Unnormalized (6 * sigma + 1) ** 2 gaussian with a peak of 1, built once
+    per sigma exactly the way JointsDataset.generate_target built it for
+    every joint.
+    '''
+    if sigma not in _gaussian_kernels:
+        tmp_size = sigma * 3
+        size = 2 * tmp_size + 1
+        x = np.arange(0, size, 1, np.float32)
+        y = x[:, np.newaxis]
+        x0 = y0 = size // 2
+        g = np.exp(- ((x - x0) ** 2 + (y - y0) ** 2) / (2 * sigma ** 2))
+        g.setflags(write=False)
+        _gaussian_kernels[sigma] = g
+    return _gaussian_kernels[sigma]
+
+
+def generate_gaussian_targets(joints, joints_vis, sigma, image_size,
+                              heatmap_size):
+    '''
+    Gaussian heatmap targets for any number of people at once, identical to
+    the per-joint loop of JointsDataset.generate_target.
+    :param joints: [..., num_joints, >=2], in input image pixels
+    :param joints_vis: [..., num_joints, >=1]
+    :param image_size: [width, height] of the input image
+    :param heatmap_size: [width, height] of the heatmaps
+    :return: target [..., num_joints, height, width] float32,
+             target_weight [..., num_joints, 1] float32
+    '''
+    joints = np.asarray(joints)
+    joints_vis = np.asarray(joints_vis)
+    lead = joints.shape[:-1]
+    width, height = int(heatmap_size[0]), int(heatmap_size[1])
+
+    joints = joints.reshape(-1, joints.shape[-1])[:, :2]
+    target_weight = np.ones((len(joints), 1), dtype=np.float32)
+    target_weight[:, 0] = joints_vis.reshape(len(joints), -1)[:, 0]
+
+    g = gaussian_kernel(sigma)
+    tmp_size = sigma * 3
+    feat_stride = np.asarray(image_size) / np.asarray(heatmap_size)
+    mu = (joints / feat_stride + 0.5).astype(np.int64)
+    ul = (mu - tmp_size).astype(np.int64)
+    br = (mu + tmp_size + 1).astype(np.int64)
+
+    # joints whose gaussian misses the heatmap entirely get no weight
+    outside = (ul[:, 0] >= width) | (ul[:, 1] >= height) \
+        | (br[:, 0] < 0) | (br[:, 1] < 0)
+    target_weight[outside] = 0
+
+    # every joint pastes the whole kernel at ul into a canvas padded by the
+    # kernel size, the padding is cropped off afterwards. Kernel cells past
+    # br (br - ul can be one short of the kernel size for a fractional
+    # sigma) are sent to row / column 0 of the padding.
+    size = g.shape[0]
+    drawn = np.nonzero(target_weight[:, 0] > 0.5)[0]
+    canvas = np.zeros(
+        (len(joints), height + 2 * size, width + 2 * size), dtype=np.float32)
+    rows = ul[drawn, 1, None] + np.arange(size)
+    cols = ul[drawn, 0, None] + np.arange(size)
+    rows = np.where(rows < br[drawn, 1, None], rows + size, 0)
+    cols = np.where(cols < br[drawn, 0, None], cols + size, 0)
+    canvas[drawn[:, None, None], rows[:, :, None], cols[:, None, :]] = g
+    target = np.ascontiguousarray(
+        canvas[:, size:size + height, size:size + width])
+
+    return target.reshape(lead + (height, width)), \
+        target_weight.reshape(lead + (1,))
+
+
+def render_gaussian_targets(joints, sigma, image_size, heatmap_size):
+    '''
+    generate_gaussian_targets for a batch of joints already on the compute
+    device, same values bit for bit.
+    :param joints: tensor [batch_size, num_joints, 3], x and y in input image
+                   pixels and the visibility
+    :return: target [batch_size, num_joints, height, width],
+             target_weight [batch_size, num_joints, 1], both float32
+    '''
+    width, height = int(heatmap_size[0]), int(heatmap_size[1])
+    device = joints.device
+    g = torch.tensor(gaussian_kernel(sigma), device=device)
+    size = g.shape[0]
+    tmp_size = sigma * 3
+
+    feat_stride = torch.as_tensor(
+        np.asarray(image_size) / np.asarray(heatmap_size),
+        dtype=torch.float64, device=device
+    )
+    mu = (joints[..., :2].double() / feat_stride + 0.5).long()
+    ul = (mu - tmp_size).long()
+    br = (mu + tmp_size + 1).long()
+
+    target_weight = joints[..., 2:3].float().clone()
+    outside = (ul[..., 0] >= width) | (ul[..., 1] >= height) \
+        | (br[..., 0] < 0) | (br[..., 1] < 0)
+    target_weight[outside] = 0
+
+    # position of every heatmap row / column inside the kernel of a joint
+    cols = torch.arange(width, device=device)
+    rows = torch.arange(height, device=device)
+    kx = cols - ul[..., 0:1]
+    ky = rows - ul[..., 1:2]
+    cols_in = (kx >= 0) & (kx < size) & (cols < br[..., 0:1])
+    rows_in = (ky >= 0) & (ky < size) & (rows < br[..., 1:2])
+
+    target = g[ky.clamp(0, size - 1)[..., :, None],
+               kx.clamp(0, size - 1)[..., None, :]]
+    drawn = rows_in[..., :, None] & cols_in[..., None, :] \
+        & (target_weight[..., None] > 0.5)
+    target.masked_fill_(~drawn, 0)
+
+    return target, target_weight
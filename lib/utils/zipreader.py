@@ -8,63 +8,173 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import logging
+import mmap
 import os
+import struct
 import zipfile
+import zlib
 import xml.etree.ElementTree as ET
 
 import cv2
 import numpy as np
 
-_im_zfile = []
-_xml_path_zip = []
-_xml_zfile = []
 
+logger = logging.getLogger(__name__)
 
-def imread(filename, flags=cv2.IMREAD_COLOR):
-    global _im_zfile
-    path = filename
-    pos_at = path.index('@')
+# bump when the layout of the saved index changes
+ZIP_INDEX_VERSION = 1
+
+_LOCAL_HEADER = struct.Struct('<4s22xHH')
+_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+
+def split_zip_path(filename):
+    '''
+    'root/images/train2017.zip@/000000119993.jpg' ->
+    ('root/images/train2017.zip', '000000119993.jpg')
+    '''
+    pos_at = filename.find('@')
     if pos_at == -1:
-        print("character '@' is not found from the given path '%s'"%(path))
-        assert 0
-    path_zip = path[0: pos_at]
-    path_img = path[pos_at + 2:]
-    if not os.path.isfile(path_zip):
-        print("zip file '%s' is not found"%(path_zip))
-        assert 0
-    for i in range(len(_im_zfile)):
-        if _im_zfile[i]['path'] == path_zip:
-            data = _im_zfile[i]['zipfile'].read(path_img)
-            return cv2.imdecode(np.frombuffer(data, np.uint8), flags)
-
-    _im_zfile.append({
-        'path': path_zip,
-        'zipfile': zipfile.ZipFile(path_zip, 'r')
-    })
-    data = _im_zfile[-1]['zipfile'].read(path_img)
-
-    return cv2.imdecode(np.frombuffer(data, np.uint8), flags)
+        raise ValueError(
+            "character '@' is not found from the given path '{}'".format(
+                filename))
+    return filename[:pos_at], filename[pos_at + 2:]
+
+
+class ZipImageStore(object):
+    '''
+    Read-only view of one zip archive: a member -> (offset, size,
+    compression) index built once from the central directory and cached
+    next to the archive, and the archive memory mapped. Stored members are
+    handed out as views of the map, deflated ones are inflated from it.
+
+    The index is shared with forked DataLoader workers, the map is reopened
+    lazily in every process that reads.
+    '''
+    def __init__(self, path_zip, index_file=None):
+        if not os.path.isfile(path_zip):
+            raise IOError("zip file '{}' is not found".format(path_zip))
+        self.path_zip = path_zip
+        self.index_file = path_zip + '.index.npz' \
+            if index_file is None else index_file
+
+        stat = os.stat(path_zip)
+        self._stamp = np.array([ZIP_INDEX_VERSION, stat.st_size,
+                                int(stat.st_mtime)], dtype=np.int64)
+        names, self.offset, self.size, self.compression = self._load_index()
+        self._members = {name: i for i, name in enumerate(names)}
+        self._map = None
+        self._pid = None
+
+    def _load_index(self):
+        if self.index_file and os.path.isfile(self.index_file):
+            with np.load(self.index_file) as index:
+                if np.array_equal(index['stamp'], self._stamp):
+                    return (index['names'].tolist(), index['offset'],
+                            index['size'], index['compression'])
+
+        index = self._build_index()
+        if self.index_file:
+            # next to the target and renamed, workers may race on it
+            tmp_name = '{}.{}.tmp'.format(self.index_file, os.getpid())
+            try:
+                with open(tmp_name, 'wb') as f:
+                    np.savez(f, stamp=self._stamp, names=np.array(index[0]),
+                             offset=index[1], size=index[2],
+                             compression=index[3])
+                os.replace(tmp_name, self.index_file)
+            except (IOError, OSError) as e:
+                logger.warning('=> cannot cache zip index {}: {}'.format(
+                    self.index_file, e))
+        return index
+
+    def _build_index(self):
+        logger.info('=> indexing {}'.format(self.path_zip))
+        with zipfile.ZipFile(self.path_zip, 'r') as zf:
+            infos = [i for i in zf.infolist() if not i.is_dir()]
+        names = [i.filename for i in infos]
+        offset = np.zeros(len(infos), dtype=np.int64)
+        size = np.array([i.compress_size for i in infos], dtype=np.int64)
+        compression = np.array(
+            [i.compress_type for i in infos], dtype=np.int16)
+
+        # data starts after the local header, whose name and extra field
+        # may differ in length from the central directory
+        with open(self.path_zip, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for i, info in enumerate(infos):
+                    signature, name_len, extra_len = \
+                        _LOCAL_HEADER.unpack_from(data, info.header_offset)
+                    if signature != _LOCAL_HEADER_SIGNATURE:
+                        raise IOError('bad local header for {} in {}'.format(
+                            info.filename, self.path_zip))
+                    offset[i] = info.header_offset + _LOCAL_HEADER.size \
+                        + name_len + extra_len
+            finally:
+                data.close()
+        return names, offset, size, compression
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_map'] = None
+        state['_pid'] = None
+        return state
+
+    def __contains__(self, member):
+        return member in self._members
+
+    def __len__(self):
+        return len(self._members)
+
+    def _data(self):
+        if self._pid != os.getpid():
+            # the inherited map may still back views of the parent, leave
+            # it to be collected instead of closing it
+            with open(self.path_zip, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._pid = os.getpid()
+        return self._map
+
+    def read(self, member):
+        ''' :return: uint8 array of the member, a view of the map if stored '''
+        i = self._members.get(member)
+        if i is None:
+            raise KeyError("'{}' is not in '{}'".format(
+                member, self.path_zip))
+        data = self._data()
+        offset, size = int(self.offset[i]), int(self.size[i])
+
+        if self.compression[i] == zipfile.ZIP_STORED:
+            return np.frombuffer(data, np.uint8, count=size, offset=offset)
+        if self.compression[i] == zipfile.ZIP_DEFLATED:
+            raw = zlib.decompressobj(-zlib.MAX_WBITS).decompress(
+                memoryview(data)[offset:offset + size])
+            return np.frombuffer(raw, np.uint8)
+        with zipfile.ZipFile(self.path_zip, 'r') as zf:
+            return np.frombuffer(zf.read(member), np.uint8)
+
+    def imread(self, member, flags=cv2.IMREAD_COLOR):
+        return cv2.imdecode(self.read(member), flags)
+
+
+_zip_stores = {}
+
+
+def get_zip_store(path_zip):
+    ''' ZipImageStore of path_zip, indexed once per process tree '''
+    key = os.path.abspath(path_zip)
+    if key not in _zip_stores:
+        _zip_stores[key] = ZipImageStore(path_zip)
+    return _zip_stores[key]
+
+
+def imread(filename, flags=cv2.IMREAD_COLOR):
+    path_zip, path_img = split_zip_path(filename)
+    return get_zip_store(path_zip).imread(path_img, flags)
 
 
 def xmlread(filename):
-    global _xml_path_zip
-    global _xml_zfile
-    path = filename
-    pos_at = path.index('@')
-    if pos_at == -1:
-        print("character '@' is not found from the given path '%s'"%(path))
-        assert 0
-    path_zip = path[0: pos_at]
-    path_xml = path[pos_at + 2:]
-    if not os.path.isfile(path_zip):
-        print("zip file '%s' is not found"%(path_zip))
-        assert 0
-    for i in xrange(len(_xml_path_zip)):
-        if _xml_path_zip[i] == path_zip:
-            data = _xml_zfile[i].open(path_xml)
-            return ET.fromstring(data.read())
-    _xml_path_zip.append(path_zip)
-    print("read new xml file '%s'"%(path_zip))
-    _xml_zfile.append(zipfile.ZipFile(path_zip, 'r'))
-    data = _xml_zfile[-1].open(path_xml)
-    return ET.fromstring(data.read())
+    path_zip, path_xml = split_zip_path(filename)
+    return ET.fromstring(get_zip_store(path_zip).read(path_xml).tobytes())
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the library modules import each other as top-level packages (core.X,
+# dataset.X, utils.X), like tools/_init_paths.py sets up
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(__file__)), 'lib'))
@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+import torch
+
+from utils.heatmap import generate_gaussian_targets
+from utils.heatmap import render_gaussian_targets
+
+
+IMAGE_SIZE = np.array([192, 256])
+HEATMAP_SIZE = np.array([48, 64])
+
+
+def loop_targets(joints, joints_vis, sigma, image_size, heatmap_size):
+    ''' the per-joint loop of the original JointsDataset.generate_target '''
+    num_joints = len(joints)
+    target_weight = np.ones((num_joints, 1), dtype=np.float32)
+    target_weight[:, 0] = joints_vis[:, 0]
+    target = np.zeros((num_joints, heatmap_size[1], heatmap_size[0]),
+                      dtype=np.float32)
+    tmp_size = sigma * 3
+
+    for joint_id in range(num_joints):
+        feat_stride = image_size / heatmap_size
+        mu_x = int(joints[joint_id][0] / feat_stride[0] + 0.5)
+        mu_y = int(joints[joint_id][1] / feat_stride[1] + 0.5)
+        ul = [int(mu_x - tmp_size), int(mu_y - tmp_size)]
+        br = [int(mu_x + tmp_size + 1), int(mu_y + tmp_size + 1)]
+        if ul[0] >= heatmap_size[0] or ul[1] >= heatmap_size[1] \
+                or br[0] < 0 or br[1] < 0:
+            target_weight[joint_id] = 0
+            continue
+
+        size = 2 * tmp_size + 1
+        x = np.arange(0, size, 1, np.float32)
+        y = x[:, np.newaxis]
+        x0 = y0 = size // 2
+        g = np.exp(- ((x - x0) ** 2 + (y - y0) ** 2) / (2 * sigma ** 2))
+
+        g_x = max(0, -ul[0]), min(br[0], heatmap_size[0]) - ul[0]
+        g_y = max(0, -ul[1]), min(br[1], heatmap_size[1]) - ul[1]
+        img_x = max(0, ul[0]), min(br[0], heatmap_size[0])
+        img_y = max(0, ul[1]), min(br[1], heatmap_size[1])
+
+        if target_weight[joint_id] > 0.5:
+            target[joint_id][img_y[0]:img_y[1], img_x[0]:img_x[1]] = \
+                g[g_y[0]:g_y[1], g_x[0]:g_x[1]]
+
+    return target, target_weight
+
+
+def make_joints(seed, num_people=4, num_joints=17):
+    '''
+    joints inside the image, partly outside (gaussian clipped by the
+    border), entirely outside and with zero or fractional visibility
+    '''
+    rng = np.random.RandomState(seed)
+    joints = np.zeros((num_people, num_joints, 3), dtype=np.float32)
+    joints[..., 0] = rng.uniform(-40, IMAGE_SIZE[0] + 40,
+                                 (num_people, num_joints))
+    joints[..., 1] = rng.uniform(-40, IMAGE_SIZE[1] + 40,
+                                 (num_people, num_joints))
+    joints[0, 0, :2] = [-2, 5]                                  # clipped left
+    joints[0, 1, :2] = [IMAGE_SIZE[0] + 3, IMAGE_SIZE[1] - 1]   # clipped right
+    joints[0, 2, :2] = [-200, 100]                              # outside
+    joints[0, 3, :2] = [100, IMAGE_SIZE[1] + 200]               # outside
+    vis = (rng.rand(num_people, num_joints) > 0.3).astype(np.float32)
+    vis[0, :4] = 1
+    vis[1, 0] = 0.4
+    joints[..., 2] = vis
+    return joints
+
+
+@pytest.mark.parametrize('sigma', [2, 3, 1.5])
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_generate_gaussian_targets_matches_loop(sigma, seed):
+    joints = make_joints(seed)
+    target, target_weight = generate_gaussian_targets(
+        joints[..., :2], joints[..., 2:], sigma, IMAGE_SIZE, HEATMAP_SIZE)
+
+    assert target.shape == (4, 17, HEATMAP_SIZE[1], HEATMAP_SIZE[0])
+    assert target_weight.shape == (4, 17, 1)
+    for person in range(len(joints)):
+        expected, expected_weight = loop_targets(
+            joints[person], joints[person, :, 2:], sigma,
+            IMAGE_SIZE, HEATMAP_SIZE)
+        np.testing.assert_array_equal(target[person], expected)
+        np.testing.assert_array_equal(target_weight[person], expected_weight)
+
+
+@pytest.mark.parametrize('sigma', [2, 1.5])
+def test_render_gaussian_targets_matches_loop(sigma):
+    joints = make_joints(3)
+    target, target_weight = render_gaussian_targets(
+        torch.from_numpy(joints), sigma, IMAGE_SIZE, HEATMAP_SIZE)
+
+    for person in range(len(joints)):
+        expected, expected_weight = loop_targets(
+            joints[person], joints[person, :, 2:], sigma,
+            IMAGE_SIZE, HEATMAP_SIZE)
+        np.testing.assert_array_equal(target[person].numpy(), expected)
+        np.testing.assert_array_equal(target_weight[person].numpy(),
+                                      expected_weight)
+
+
+def test_zero_weight_and_outside_joints_are_blank():
+    joints = make_joints(0)
+    target, target_weight = generate_gaussian_targets(
+        joints[..., :2], joints[..., 2:], 2, IMAGE_SIZE, HEATMAP_SIZE)
+
+    assert target_weight[0, 2, 0] == 0 and target_weight[0, 3, 0] == 0
+    blank = target_weight[..., 0] <= 0.5
+    assert blank.any()
+    assert not target[blank].any()
+    assert target[0, 0].max() == 1 and target[0, 1].max() > 0
@@ -0,0 +1,186 @@
+import pytest
+import torch
+import torch.nn as nn
+
+from core.loss import JointsMSELoss
+from core.loss import JointsOHKMMSELoss
+from core.loss import MultiStageDistillLoss
+
+
+def loop_mse(output, target, target_weight, use_target_weight):
+    ''' the per-joint loop of the original JointsMSELoss '''
+    criterion = nn.MSELoss(reduction='mean')
+    batch_size = output.size(0)
+    num_joints = output.size(1)
+    heatmaps_pred = output.reshape((batch_size, num_joints, -1)).split(1, 1)
+    heatmaps_gt = target.reshape((batch_size, num_joints, -1)).split(1, 1)
+    loss = 0
+    for idx in range(num_joints):
+        heatmap_pred = heatmaps_pred[idx].squeeze()
+        heatmap_gt = heatmaps_gt[idx].squeeze()
+        if use_target_weight:
+            loss += 0.5 * criterion(
+                heatmap_pred.mul(target_weight[:, idx]),
+                heatmap_gt.mul(target_weight[:, idx])
+            )
+        else:
+            loss += 0.5 * criterion(heatmap_pred, heatmap_gt)
+    return loss / num_joints
+
+
+def loop_ohkm(output, target, target_weight, use_target_weight, topk):
+    ''' the per-joint and per-sample loops of the original OHKM loss '''
+    criterion = nn.MSELoss(reduction='none')
+    batch_size = output.size(0)
+    num_joints = output.size(1)
+    heatmaps_pred = output.reshape((batch_size, num_joints, -1)).split(1, 1)
+    heatmaps_gt = target.reshape((batch_size, num_joints, -1)).split(1, 1)
+    loss = []
+    for idx in range(num_joints):
+        heatmap_pred = heatmaps_pred[idx].squeeze()
+        heatmap_gt = heatmaps_gt[idx].squeeze()
+        if use_target_weight:
+            loss.append(0.5 * criterion(
+                heatmap_pred.mul(target_weight[:, idx]),
+                heatmap_gt.mul(target_weight[:, idx])
+            ))
+        else:
+            loss.append(0.5 * criterion(heatmap_pred, heatmap_gt))
+    loss = torch.cat([l.mean(dim=1).unsqueeze(dim=1) for l in loss], dim=1)
+
+    ohkm_loss = 0.
+    for i in range(loss.size()[0]):
+        sub_loss = loss[i]
+        topk_val, topk_idx = torch.topk(sub_loss, k=topk, dim=0, sorted=False)
+        ohkm_loss += torch.sum(torch.gather(sub_loss, 0, topk_idx)) / topk
+    return ohkm_loss / loss.size()[0]
+
+
+def make_batch(seed, batch_size=4, num_joints=17, height=64, width=48):
+    ''' heatmaps and weights of 1, 0 and in between '''
+    g = torch.Generator().manual_seed(seed)
+    output = torch.rand(batch_size, num_joints, height, width, generator=g,
+                        dtype=torch.float32, requires_grad=True)
+    target = torch.rand(batch_size, num_joints, height, width, generator=g,
+                        dtype=torch.float32)
+    target_weight = (torch.rand(batch_size, num_joints, 1, generator=g,
+                                dtype=torch.float32) > 0.3).float()
+    target_weight[0, :3, 0] = torch.tensor([0., 0.5, 2.])
+    return output, target, target_weight
+
+
+def grad(loss, output):
+    return torch.autograd.grad(loss, output)[0]
+
+
+@pytest.mark.parametrize('use_target_weight', [True, False])
+@pytest.mark.parametrize('seed', [0, 1])
+def test_joints_mse_loss_matches_loop(use_target_weight, seed):
+    output, target, target_weight = make_batch(seed)
+    loss = JointsMSELoss(use_target_weight)(output, target, target_weight)
+    expected = loop_mse(output, target, target_weight, use_target_weight)
+
+    torch.testing.assert_close(loss, expected, rtol=1e-5, atol=0)
+    torch.testing.assert_close(grad(loss, output), grad(expected, output),
+                               rtol=1e-4, atol=1e-10)
+
+
+@pytest.mark.parametrize('use_target_weight', [True, False])
+@pytest.mark.parametrize('topk', [8, 17])
+def test_joints_ohkm_mse_loss_matches_loop(use_target_weight, topk):
+    output, target, target_weight = make_batch(2)
+    loss = JointsOHKMMSELoss(use_target_weight, topk)(
+        output, target, target_weight)
+    expected = loop_ohkm(output, target, target_weight, use_target_weight,
+                         topk)
+
+    torch.testing.assert_close(loss, expected, rtol=1e-5, atol=0)
+    torch.testing.assert_close(grad(loss, output), grad(expected, output),
+                               rtol=1e-4, atol=1e-10)
+
+
+def loop_distill(outputs_s, outputs_t, criterion, weight, detach=True):
+    '''
+    the per-stage sum mutual_learning and distilling computed before
+    MultiStageDistillLoss
+    '''
+    def target(t):
+        return t.data if detach else t
+
+    loss_dist = []
+    for j in range(3):
+        for k in range(len(outputs_s[j])):
+            if k == 0:
+                loss_dist.append(criterion(outputs_s[j][k],
+                                           target(outputs_t[j][k])))
+            else:
+                loss_dist[j] += criterion(outputs_s[j][k],
+                                          target(outputs_t[j][k]))
+        loss_dist[j] = loss_dist[j] / (k + 1)
+    loss_dist_last = criterion(outputs_s[-1], target(outputs_t[-1]))
+    return weight * (loss_dist[0] + loss_dist[1] + loss_dist[2]
+                     + loss_dist_last)
+
+
+def make_kd_outputs(seed, batch_size=2):
+    ''' (stage 2, stage 3, stage 4 branch lists, heatmap) of a _kd model '''
+    g = torch.Generator().manual_seed(seed)
+
+    def feature(channels, height, width):
+        return torch.randn(batch_size, channels, height, width, generator=g,
+                           requires_grad=True)
+
+    return [
+        [feature(32, 64, 48), feature(64, 32, 24)],
+        [feature(32, 64, 48), feature(64, 32, 24), feature(128, 16, 12)],
+        [feature(32, 64, 48), feature(64, 32, 24), feature(128, 16, 12),
+         feature(256, 8, 6)],
+        feature(17, 64, 48),
+    ]
+
+
+def flat(outputs):
+    return [t for stage in outputs
+            for t in (stage if isinstance(stage, list) else [stage])]
+
+
+@pytest.mark.parametrize('name,criterion,weight', [
+    ('mse', nn.MSELoss(), 0.001),
+    ('smooth_l1', nn.SmoothL1Loss(), 0.00001),
+])
+@pytest.mark.parametrize('detach_targets', [True, False])
+def test_multi_stage_distill_loss_matches_loop(name, criterion, weight,
+                                               detach_targets):
+    outputs_s, outputs_t = make_kd_outputs(0), make_kd_outputs(1)
+    loss = MultiStageDistillLoss(name, weight, detach_targets=detach_targets)(
+        outputs_s, outputs_t)
+    expected = loop_distill(outputs_s, outputs_t, criterion, weight,
+                            detach_targets)
+    torch.testing.assert_close(loss, expected, rtol=1e-5, atol=0)
+
+    inputs = flat(outputs_s) + flat(outputs_t)
+    grads = torch.autograd.grad(loss, inputs, allow_unused=True)
+    expected_grads = torch.autograd.grad(expected, inputs, allow_unused=True)
+    for g, e in zip(grads, expected_grads):
+        if e is None:
+            assert g is None
+        else:
+            torch.testing.assert_close(g, e, rtol=1e-4, atol=1e-12)
+    assert (grads[-1] is None) == detach_targets
+
+
+def test_multi_stage_distill_loss_stage_weights():
+    outputs_s, outputs_t = make_kd_outputs(2), make_kd_outputs(3)
+    stage_weights = [0., 0.5, 1., 2.]
+    loss = MultiStageDistillLoss('mse', 0.001, stage_weights)(
+        outputs_s, outputs_t)
+
+    criterion = nn.MSELoss()
+    expected = 0.001 * sum(
+        w * sum(criterion(s, t) for s, t in zip(stage_s, stage_t))
+        / len(stage_s)
+        for w, stage_s, stage_t in zip(
+            stage_weights,
+            [outputs_s[0], outputs_s[1], outputs_s[2], [outputs_s[3]]],
+            [outputs_t[0], outputs_t[1], outputs_t[2], [outputs_t[3]]]))
+    torch.testing.assert_close(loss, expected, rtol=1e-5, atol=0)
@@ -0,0 +1,266 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+import torch
+import torch.utils.data
+import torchvision.transforms as transforms
+from torch.utils.data import default_collate
+
+from lib.config import cfg
+from lib.config import update_config
+import lib.dataset as dataset
+from lib.dataset.synthetic import write_coco_standin
+from lib.dataset.synthetic import write_mpii_standin
+from lib.dataset.synthetic import write_occluder_library
+
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('decode', 'occlusion', 'colour', 'warp', 'target', 'transform',
+          'collate')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Time the data pipeline of a dataset, stage by stage')
+
+    parser.add_argument('--cfg',
+                        help='experiment configure file name',
+                        required=True,
+                        type=str)
+    parser.add_argument('--dataset',
+                        help='registered dataset, DATASET.DATASET if empty',
+                        type=str,
+                        default='')
+    parser.add_argument('--test',
+                        help='time the test set instead of the train set',
+                        action='store_true')
+    parser.add_argument('--synthetic',
+                        help='write a COCO or MPII stand-in (images, '
+                             'annotations, detections, occluders) to this '
+                             'directory and run on it instead of '
+                             'DATASET.ROOT',
+                        type=str,
+                        default='')
+    parser.add_argument('--synthetic-images',
+                        help='images per set of the stand-in',
+                        type=int,
+                        default=64)
+    parser.add_argument('--samples',
+                        help='samples timed in the main process',
+                        type=int,
+                        default=200)
+    parser.add_argument('--workers',
+                        help='comma separated DataLoader worker counts',
+                        type=str,
+                        default='0,2,4,8')
+    parser.add_argument('--batches',
+                        help='batches timed per DataLoader',
+                        type=int,
+                        default=20)
+    parser.add_argument('--batch-size',
+                        help='TRAIN.BATCH_SIZE_PER_GPU if 0',
+                        type=int,
+                        default=0)
+    parser.add_argument('opts',
+                        help="Modify config options using the command-line",
+                        default=None,
+                        nargs=argparse.REMAINDER)
+    # update_config reads these
+    parser.add_argument('--modelDir', type=str, default='')
+    parser.add_argument('--logDir', type=str, default='')
+    parser.add_argument('--dataDir', type=str, default='')
+    parser.add_argument('--prevModelDir', type=str, default='')
+
+    return parser.parse_args()
+
+
+class StageTimer(object):
+    '''
+    Exclusive wall time per stage: time spent in a stage nested in
+    another one counts only for the inner stage. Wrappers made with
+    nested=False (the cv2 calls) only count outside of any other stage,
+    so the warps of the occlusion synthesis stay in 'occlusion'.
+    '''
+    def __init__(self):
+        self.totals = OrderedDict((stage, 0.) for stage in STAGES)
+        self._stack = []
+
+    def wrap(self, stage, fn, nested=True):
+        def timed(*args, **kwargs):
+            if not nested and self._stack:
+                return fn(*args, **kwargs)
+            self._stack.append(0.)
+            tic = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - tic
+                children = self._stack.pop()
+                self.totals[stage] += elapsed - children
+                if self._stack:
+                    self._stack[-1] += elapsed
+        return timed
+
+
+class Patches(object):
+    ''' setattr that can be undone '''
+    def __init__(self):
+        self._undo = []
+
+    def set(self, owner, name, value):
+        if hasattr(owner, name):
+            # methods live on the class, undo those by deleting the shadow
+            original = vars(owner).get(name, None)
+            self._undo.append((owner, name, original))
+            setattr(owner, name, value)
+
+    def restore(self):
+        for owner, name, original in reversed(self._undo):
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self._undo = []
+
+
+def instrument(train_dataset, timer):
+    '''
+    route the stages of train_dataset.__getitem__ through timer: methods
+    of the instance, the occlusion functions of the dataset modules and
+    the cv2 calls they make
+    '''
+    patches = Patches()
+    ds = train_dataset
+    patches.set(ds, 'read_image', timer.wrap('decode', ds.read_image))
+    patches.set(ds, 'generate_target',
+                timer.wrap('target', ds.generate_target))
+    if hasattr(ds, 'generate_joint_target'):
+        patches.set(ds, 'generate_joint_target',
+                    timer.wrap('target', ds.generate_joint_target))
+    if ds.transform is not None:
+        patches.set(ds, 'transform', timer.wrap('transform', ds.transform))
+
+    modules = {sys.modules[cls.__module__] for cls in type(ds).__mro__}
+    for module in modules:
+        for name in ('save_image1', 'sample_occluders',
+                     'composite_occluders_warped'):
+            if hasattr(module, name):
+                patches.set(module, name,
+                            timer.wrap('occlusion', getattr(module, name)))
+    patches.set(cv2, 'imdecode',
+                timer.wrap('decode', cv2.imdecode, nested=False))
+    patches.set(cv2, 'cvtColor',
+                timer.wrap('colour', cv2.cvtColor, nested=False))
+    patches.set(cv2, 'warpAffine',
+                timer.wrap('warp', cv2.warpAffine, nested=False))
+    return patches
+
+
+def time_stages(train_dataset, num_samples, batch_size):
+    timer = StageTimer()
+    patches = instrument(train_dataset, timer)
+    collate = timer.wrap('collate', default_collate)
+    indices = np.random.RandomState(0).randint(
+        0, len(train_dataset), num_samples)
+
+    try:
+        batch = []
+        tic = time.perf_counter()
+        for idx in indices:
+            batch.append(train_dataset[idx])
+            if len(batch) == batch_size:
+                collate(batch)
+                batch = []
+        elapsed = time.perf_counter() - tic
+    finally:
+        patches.restore()
+
+    logger.info('=> single process: {:.1f} samples/s ({:.2f} ms/sample)'
+                .format(num_samples / elapsed, 1000. * elapsed / num_samples))
+    other = elapsed - sum(timer.totals.values())
+    for stage, total in list(timer.totals.items()) + [('other', other)]:
+        logger.info('   {:<10} {:7.2f} ms/sample {:5.1f}%'.format(
+            stage, 1000. * total / num_samples, 100. * total / elapsed))
+
+
+def time_loaders(train_dataset, workers, num_batches, batch_size):
+    for num_workers in workers:
+        loader = torch.utils.data.DataLoader(
+            train_dataset, batch_size=batch_size, shuffle=True,
+            num_workers=num_workers, drop_last=True
+        )
+        iterator = iter(loader)
+        # the first batch pays for the worker start-up
+        next(iterator)
+        count = 0
+        tic = time.perf_counter()
+        for count, _ in enumerate(iterator, 1):
+            if count == num_batches:
+                break
+        elapsed = time.perf_counter() - tic
+        del iterator
+        logger.info('=> {:2d} workers: {:.1f} samples/s'.format(
+            num_workers, count * batch_size / max(elapsed, 1e-9)))
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)-15s %(message)s')
+    args = parse_args()
+    update_config(cfg, args)
+
+    cfg.defrost()
+    if args.dataset:
+        cfg.DATASET.DATASET = args.dataset
+    if args.synthetic:
+        root = os.path.abspath(args.synthetic)
+        image_sets = (cfg.DATASET.TRAIN_SET, cfg.DATASET.TEST_SET)
+        if cfg.DATASET.DATASET.startswith('mpii'):
+            write_mpii_standin(root, image_sets,
+                               num_images=args.synthetic_images)
+        else:
+            det_files = write_coco_standin(root, image_sets,
+                                           num_images=args.synthetic_images)
+            cfg.TEST.COCO_BBOX_FILE = det_files[cfg.DATASET.TEST_SET]
+        occluder_root = os.path.join(root, 'gengxin3')
+        write_occluder_library(occluder_root)
+        cfg.DATASET.ROOT = root
+        cfg.DATASET.OCCLUDER_BANK = True
+        cfg.DATASET.OCCLUDER_ROOT = occluder_root
+    cfg.freeze()
+
+    random.seed(0)
+    np.random.seed(0)
+    normalize = transforms.Normalize(
+        mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]
+    )
+    image_set = cfg.DATASET.TEST_SET if args.test else cfg.DATASET.TRAIN_SET
+    train_dataset = eval('dataset.'+cfg.DATASET.DATASET)(
+        cfg, cfg.DATASET.ROOT, image_set, not args.test,
+        transforms.Compose([
+            transforms.ToTensor(),
+            normalize,
+        ])
+    )
+    batch_size = args.batch_size or cfg.TRAIN.BATCH_SIZE_PER_GPU
+    logger.info('=> {} {}: {} samples, batch size {}'.format(
+        cfg.DATASET.DATASET, image_set, len(train_dataset), batch_size))
+
+    time_stages(train_dataset, args.samples, batch_size)
+    time_loaders(train_dataset, [int(w) for w in args.workers.split(',')],
+                 args.batches, batch_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import logging
+import math
+import time
+
+import numpy as np
+import torchvision.transforms as transforms
+
+from lib.config import cfg
+from lib.config import update_config
+import lib.dataset as dataset
+from lib.dataset.crop_shards import CropShardWriter
+from lib.dataset.crop_shards import crop_envelope
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Pre-crop the persons of the training set into shards')
+
+    parser.add_argument('--cfg',
+                        help='experiment configure file name',
+                        required=True,
+                        type=str)
+    parser.add_argument('--out',
+                        help='output directory, use as DATASET.CROP_SHARDS',
+                        required=True,
+                        type=str)
+    parser.add_argument('--shard-size',
+                        help='bytes per shard file',
+                        type=int,
+                        default=1 << 30)
+    parser.add_argument('--quality',
+                        help='JPEG quality of the crops',
+                        type=int,
+                        default=95)
+    parser.add_argument('--margin',
+                        help='pixels added around the augmentation envelope',
+                        type=int,
+                        default=2)
+    parser.add_argument('--benchmark',
+                        help='time this many samples with and without the '
+                             'shards after building them',
+                        type=int,
+                        default=0)
+    parser.add_argument('opts',
+                        help="Modify config options using the command-line",
+                        default=None,
+                        nargs=argparse.REMAINDER)
+    # update_config reads these
+    parser.add_argument('--modelDir', type=str, default='')
+    parser.add_argument('--logDir', type=str, default='')
+    parser.add_argument('--dataDir', type=str, default='')
+    parser.add_argument('--prevModelDir', type=str, default='')
+
+    return parser.parse_args()
+
+
+def build_crop_shards(train_dataset, out_dir, shard_size, quality, margin):
+    db = train_dataset.db
+    columns = db.columns
+    writer = CropShardWriter(out_dir, len(db), shard_size, quality)
+
+    # every image is decoded once for all of its persons
+    order = np.argsort(columns['image'], kind='stable')
+    groups = np.split(
+        order, np.nonzero(np.diff(columns['image'][order]))[0] + 1)
+
+    tic = time.time()
+    full_pixels = crop_pixels = 0
+    for n, group in enumerate(groups):
+        image_file = db.strings[columns['image'][group[0]]]
+        data_numpy = train_dataset.read_image(image_file)
+        if data_numpy is None:
+            raise ValueError('Fail to read {}'.format(image_file))
+        height, width = data_numpy.shape[:2]
+
+        for idx in group:
+            x0, y0, x1, y1 = crop_envelope(
+                columns['joints'][idx].astype(np.float64),
+                columns['joints_vis'][idx],
+                columns['center'][idx].astype(np.float64),
+                columns['scale'][idx].astype(np.float64),
+                train_dataset.scale_factor, train_dataset.image_size,
+                train_dataset.aspect_ratio, train_dataset.pixel_std
+            )
+            x0 = min(max(int(math.floor(x0)) - margin, 0), width - 1)
+            y0 = min(max(int(math.floor(y0)) - margin, 0), height - 1)
+            x1 = max(min(int(math.ceil(x1)) + margin + 1, width), x0 + 1)
+            y1 = max(min(int(math.ceil(y1)) + margin + 1, height), y0 + 1)
+
+            writer.add(idx, data_numpy[y0:y1, x0:x1], (x0, y0), width)
+            full_pixels += width * height
+            crop_pixels += (x1 - x0) * (y1 - y0)
+
+        if (n + 1) % 1000 == 0:
+            logger.info('=> {}/{} images, {:.1f} images/s'.format(
+                n + 1, len(groups), (n + 1) / (time.time() - tic)))
+
+    writer.close(columns['center'], {
+        'dataset': type(train_dataset).__name__,
+        'image_set': train_dataset.image_set,
+        'scale_factor': float(train_dataset.scale_factor),
+        'image_size': [int(x) for x in train_dataset.image_size],
+        'quality': quality,
+        'margin': margin,
+    })
+    logger.info('=> crops hold {:.1f}% of the decoded pixels'.format(
+        100.0 * crop_pixels / max(full_pixels, 1)))
+
+
+def benchmark(train_dataset, out_dir, num_samples):
+    indices = np.random.RandomState(0).randint(
+        0, len(train_dataset), num_samples)
+    for name, shard_dir in [('full images', ''), ('crop shards', out_dir)]:
+        train_dataset.crop_shard_dir = shard_dir
+        train_dataset.crop_shards = None
+        tic = time.time()
+        for idx in indices:
+            train_dataset[idx]
+        elapsed = time.time() - tic
+        logger.info('=> {}: {:.2f} ms/sample, {:.1f} samples/s'.format(
+            name, 1000.0 * elapsed / num_samples, num_samples / elapsed))
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)-15s %(message)s')
+    args = parse_args()
+    update_config(cfg, args)
+
+    normalize = transforms.Normalize(
+        mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]
+    )
+    train_dataset = eval('dataset.'+cfg.DATASET.DATASET)(
+        cfg, cfg.DATASET.ROOT, cfg.DATASET.TRAIN_SET, True,
+        transforms.Compose([
+            transforms.ToTensor(),
+            normalize,
+        ])
+    )
+    # the shards are cut from the full images
+    train_dataset.crop_shard_dir = ''
+
+    build_crop_shards(train_dataset, args.out, args.shard_size,
+                      args.quality, args.margin)
+    if args.benchmark > 0:
+        benchmark(train_dataset, args.out, args.benchmark)
+
+
+if __name__ == '__main__':
+    main()
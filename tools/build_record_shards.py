@@ -0,0 +1,116 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import logging
+import time
+
+import numpy as np
+import torchvision.transforms as transforms
+
+from lib.config import cfg
+from lib.config import update_config
+import lib.dataset as dataset
+from lib.dataset.record_shards import RecordShardWriter
+from lib.utils import zipreader
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Pack images and annotations into sequential shards')
+
+    parser.add_argument('--cfg',
+                        help='experiment configure file name',
+                        required=True,
+                        type=str)
+    parser.add_argument('--out',
+                        help='output directory, use as DATASET.RECORD_SHARDS',
+                        required=True,
+                        type=str)
+    parser.add_argument('--image-set',
+                        help='image set to pack, DATASET.TRAIN_SET if empty',
+                        type=str,
+                        default='')
+    parser.add_argument('--shard-size',
+                        help='bytes per shard file',
+                        type=int,
+                        default=256 << 20)
+    parser.add_argument('--seed',
+                        help='seed of the image order across shards',
+                        type=int,
+                        default=0)
+    parser.add_argument('opts',
+                        help="Modify config options using the command-line",
+                        default=None,
+                        nargs=argparse.REMAINDER)
+    # update_config reads these
+    parser.add_argument('--modelDir', type=str, default='')
+    parser.add_argument('--logDir', type=str, default='')
+    parser.add_argument('--dataDir', type=str, default='')
+    parser.add_argument('--prevModelDir', type=str, default='')
+
+    return parser.parse_args()
+
+
+def read_image_bytes(data_format, image_file):
+    ''' the encoded image file, as stored on disk or in the zip '''
+    if data_format == 'zip':
+        path_zip, member = zipreader.split_zip_path(image_file)
+        return zipreader.get_zip_store(path_zip).read(member).tobytes()
+    with open(image_file, 'rb') as f:
+        return f.read()
+
+
+def build_record_shards(train_dataset, out_dir, shard_size, seed):
+    db = train_dataset.db
+    image_index = db.columns['image']
+    writer = RecordShardWriter(out_dir, db, shard_size)
+
+    # the persons of an image are stored once with it, images in a random
+    # order so every shard is a sample of the whole set
+    order = np.argsort(image_index, kind='stable')
+    groups = np.split(order, np.flatnonzero(np.diff(image_index[order])) + 1)
+    groups = [groups[i]
+              for i in np.random.RandomState(seed).permutation(len(groups))]
+
+    tic = time.time()
+    for n, group in enumerate(groups):
+        image_file = db.strings[image_index[group[0]]]
+        writer.add(read_image_bytes(train_dataset.data_format, image_file),
+                   group)
+        if (n + 1) % 1000 == 0:
+            logger.info('=> {}/{} images, {:.1f} images/s'.format(
+                n + 1, len(groups), (n + 1) / (time.time() - tic)))
+
+    writer.close({
+        'dataset': type(train_dataset).__name__,
+        'image_set': train_dataset.image_set,
+        'seed': seed,
+    })
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)-15s %(message)s')
+    args = parse_args()
+    update_config(cfg, args)
+
+    normalize = transforms.Normalize(
+        mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]
+    )
+    train_dataset = eval('dataset.'+cfg.DATASET.DATASET)(
+        cfg, cfg.DATASET.ROOT, args.image_set or cfg.DATASET.TRAIN_SET, True,
+        transforms.Compose([
+            transforms.ToTensor(),
+            normalize,
+        ])
+    )
+
+    build_record_shards(train_dataset, args.out, args.shard_size, args.seed)
+
+
+if __name__ == '__main__':
+    main()
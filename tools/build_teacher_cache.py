@@ -0,0 +1,153 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import importlib
+import logging
+import time
+
+import torch
+import torch.utils.data
+import torchvision.transforms as transforms
+
+from lib.config import cfg
+from lib.config import update_config
+from lib.core.amp import build_mixed_precision
+from lib.core.normalize import build_input_normalize
+import lib.dataset as dataset
+from lib.dataset.teacher_cache import TeacherCacheWriter
+from lib.dataset.teacher_cache import augmentation_seed
+from lib.dataset.teacher_cache import flatten_outputs
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Run the distillation teacher once over fixed '
+                    'augmentations of the training set and cache its outputs')
+
+    parser.add_argument('--cfg',
+                        help='experiment configure file name',
+                        required=True,
+                        type=str)
+    parser.add_argument('--out',
+                        help='output directory, use as DATASET.TEACHER_CACHE',
+                        required=True,
+                        type=str)
+    parser.add_argument('--variants',
+                        help='augmentations cached per record',
+                        type=int,
+                        default=4)
+    parser.add_argument('--dtype',
+                        help='fp16, or uint8 quantized per channel',
+                        choices=['fp16', 'uint8'],
+                        default='fp16')
+    parser.add_argument('--seed',
+                        help='seed of the augmentations',
+                        type=int,
+                        default=0)
+    parser.add_argument('--batch-size',
+                        help='TEST.BATCH_SIZE_PER_GPU if 0',
+                        type=int,
+                        default=0)
+    parser.add_argument('opts',
+                        help="Modify config options using the command-line",
+                        default=None,
+                        nargs=argparse.REMAINDER)
+    # update_config reads these
+    parser.add_argument('--modelDir', type=str, default='')
+    parser.add_argument('--logDir', type=str, default='')
+    parser.add_argument('--dataDir', type=str, default='')
+    parser.add_argument('--prevModelDir', type=str, default='')
+
+    return parser.parse_args()
+
+
+class TeacherInputs(torch.utils.data.Dataset):
+    ''' clean input crop of every cache entry, entry = idx * variants + v '''
+    def __init__(self, train_dataset, variants, seed):
+        self.dataset = train_dataset
+        self.variants = variants
+        self.seed = seed
+
+    def __len__(self):
+        return len(self.dataset) * self.variants
+
+    def __getitem__(self, entry):
+        sample = self.dataset.get_record(
+            entry // self.variants, augmentation_seed(self.seed, entry))
+        return sample[0], entry
+
+
+def build_teacher_cache(train_dataset, teacher, out_dir, variants, dtype,
+                        seed, batch_size, num_workers):
+    inputs = TeacherInputs(train_dataset, variants, seed)
+    loader = torch.utils.data.DataLoader(
+        inputs, batch_size=batch_size, shuffle=False,
+        num_workers=num_workers, pin_memory=True
+    )
+    normalize = build_input_normalize(train_dataset)
+    amp = build_mixed_precision(cfg)
+
+    writer = None
+    tic = time.time()
+    teacher.eval()
+    with torch.no_grad():
+        for i, (input, entries) in enumerate(loader):
+            with amp.autocast():
+                outputs = teacher(normalize(input.cuda(non_blocking=True)))
+            tensors, layout = flatten_outputs(outputs)
+            tensors = [t.float().cpu().numpy() for t in tensors]
+            if writer is None:
+                writer = TeacherCacheWriter(
+                    out_dir, len(train_dataset), variants,
+                    [t.shape[1:] for t in tensors], layout, dtype)
+            writer.write(entries.numpy(), tensors)
+            if i % 100 == 0:
+                logger.info('=> {}/{} entries, {:.1f} entries/s'.format(
+                    (i + 1) * batch_size, len(inputs),
+                    (i + 1) * batch_size / (time.time() - tic)))
+
+    writer.close(train_dataset.db.columns['center'], {
+        'dataset': type(train_dataset).__name__,
+        'image_set': train_dataset.image_set,
+        'model': cfg.MODEL.NAME,
+        'teacher': cfg.MODEL.TEACHER,
+        'seed': seed,
+    })
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)-15s %(message)s')
+    args = parse_args()
+    update_config(cfg, args)
+
+    normalize = transforms.Normalize(
+        mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]
+    )
+    train_dataset = eval('dataset.'+cfg.DATASET.DATASET)(
+        cfg, cfg.DATASET.ROOT, cfg.DATASET.TRAIN_SET, True,
+        transforms.Compose([
+            transforms.ToTensor(),
+            normalize,
+        ])
+    )
+    # only the clean input is needed, skip blending the occluders
+    train_dataset.occlusion_space = 'batch'
+
+    teacher = importlib.import_module(
+        'lib.models.' + cfg.MODEL.NAME + '_kd').get_pose_net_kd(
+            cfg, is_train=True)
+    teacher = teacher.cuda()
+
+    build_teacher_cache(
+        train_dataset, teacher, args.out, args.variants, args.dtype,
+        args.seed, args.batch_size or cfg.TEST.BATCH_SIZE_PER_GPU,
+        cfg.WORKERS)
+
+
+if __name__ == '__main__':
+    main()
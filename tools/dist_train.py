@@ -28,6 +28,7 @@ import torch.utils.data.distributed
 
 from lib.config import cfg
 from lib.config import update_config
+from lib.core.amp import build_mixed_precision
 from lib.core.loss import JointsMSELoss
 from lib.core.function import train
 from lib.core.function import validateys as validate
@@ -37,6 +38,8 @@ from lib.utils.utils import create_logger
 from lib.utils.utils import get_model_summary
 
 import lib.dataset as dataset
+from lib.dataset.record_shards import RecordShardDataset
+from lib.dataset.samplers import ImageGroupedBatchSampler
 import lib.models as models
 from lib.utils.distributed import is_distributed
 import lib.models.pose_resnet as pose_resnet
@@ -166,16 +169,47 @@ def main():
         ])
     )
     train_sampler = get_sampler(train_dataset)
-
-    train_loader = torch.utils.data.DataLoader(
-        train_dataset,
-        batch_size=batch_size,
-        shuffle=cfg.TRAIN.SHUFFLE and train_sampler is None,
-        num_workers=cfg.WORKERS,
-        pin_memory=cfg.PIN_MEMORY,
-        drop_last=True,
-        sampler=train_sampler
-    )
+    train_batch_sampler = None
+    train_stream = None
+
+    if cfg.DATASET.get('RECORD_SHARDS', ''):
+        # sequential shards of tools/build_record_shards.py, shuffled by
+        # shard and through a buffer instead of by a sampler
+        train_stream = RecordShardDataset(
+            train_dataset, cfg.DATASET.RECORD_SHARDS,
+            shuffle=cfg.TRAIN.SHUFFLE,
+            buffer_size=cfg.DATASET.get('RECORD_SHUFFLE_BUFFER', 256),
+            seed=args.seed
+        )
+        train_loader = torch.utils.data.DataLoader(
+            train_stream,
+            batch_size=batch_size,
+            num_workers=cfg.WORKERS,
+            pin_memory=cfg.PIN_MEMORY,
+            drop_last=True
+        )
+    elif cfg.DATASET.get('IMAGE_GROUPED_SAMPLER', False):
+        # persons of one image share a batch (and a worker's image cache)
+        train_batch_sampler = ImageGroupedBatchSampler(
+            train_dataset.db.columns['image'], batch_size,
+            shuffle=cfg.TRAIN.SHUFFLE, drop_last=True, seed=args.seed
+        )
+        train_loader = torch.utils.data.DataLoader(
+            train_dataset,
+            batch_sampler=train_batch_sampler,
+            num_workers=cfg.WORKERS,
+            pin_memory=cfg.PIN_MEMORY
+        )
+    else:
+        train_loader = torch.utils.data.DataLoader(
+            train_dataset,
+            batch_size=batch_size,
+            shuffle=cfg.TRAIN.SHUFFLE and train_sampler is None,
+            num_workers=cfg.WORKERS,
+            pin_memory=cfg.PIN_MEMORY,
+            drop_last=True,
+            sampler=train_sampler
+        )
 
     test_sampler = get_sampler(valid_dataset)
     valid_loader1 = torch.utils.data.DataLoader(
@@ -209,6 +243,7 @@ def main():
     best_model = False
     last_epoch = -1
     optimizer = get_optimizer(cfg, model)
+    amp = build_mixed_precision(cfg)
     begin_epoch = cfg.TRAIN.BEGIN_EPOCH
     checkpoint_file = os.path.join(
         final_output_dir, 'checkpoint.pth'
@@ -223,6 +258,8 @@ def main():
         model.load_state_dict(checkpoint['state_dict'])
 
         optimizer.load_state_dict(checkpoint['optimizer'])
+        if 'scaler' in checkpoint:
+            amp.load_state_dict(checkpoint['scaler'])
         logger.info("=> loaded checkpoint '{}' (epoch {})".format(
             checkpoint_file, checkpoint['epoch']))
 
@@ -232,11 +269,14 @@ def main():
     )
 
     for epoch in range(begin_epoch, cfg.TRAIN.END_EPOCH):
-        
-        
+        if train_batch_sampler is not None:
+            train_batch_sampler.set_epoch(epoch)
+        if train_stream is not None:
+            train_stream.set_epoch(epoch)
+
         # train for one epoch
         train(cfg, train_loader, model, criterion, optimizer, epoch,
-              final_output_dir, tb_log_dir)
+              final_output_dir, tb_log_dir, amp)
         lr_scheduler.step()
 
         if args.local_rank <= 0:
@@ -257,6 +297,7 @@ def main():
             'best_state_dict': model.module.state_dict(),
             'perf': perf_indicator,
             'optimizer': optimizer.state_dict(),
+            'scaler': amp.state_dict(),
         }, best_model, final_output_dir)
         
     if args.local_rank <= 0:
@@ -0,0 +1,98 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import logging
+import os
+import time
+
+from lib.dataset.synthetic import write_coco_standin
+from lib.dataset.synthetic import write_mpii_standin
+from lib.dataset.synthetic import write_occluder_library
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Write a synthetic COCO / MPII stand-in dataset')
+
+    parser.add_argument('--out',
+                        help='output directory, coco/ mpii/ and gengxin3/ '
+                             'are written below it',
+                        required=True,
+                        type=str)
+    parser.add_argument('--format',
+                        help='coco, mpii or both',
+                        choices=['coco', 'mpii', 'both'],
+                        default='both')
+    parser.add_argument('--images',
+                        help='images of the train set',
+                        type=int,
+                        default=1000)
+    parser.add_argument('--val-images',
+                        help='images of the validation set',
+                        type=int,
+                        default=100)
+    parser.add_argument('--persons',
+                        help='maximum persons per image',
+                        type=int,
+                        default=3)
+    parser.add_argument('--unique-images',
+                        help='encode only this many images per set and hard '
+                             'link the rest to them, 0 encodes all',
+                        type=int,
+                        default=0)
+    parser.add_argument('--no-paired',
+                        help='skip the occluded imagesnew/ copies',
+                        action='store_true')
+    parser.add_argument('--occluder-variants',
+                        help='distinct patches per occluder category, '
+                             '0 skips the occluder library',
+                        type=int,
+                        default=8)
+    parser.add_argument('--seed',
+                        type=int,
+                        default=0)
+
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)-15s %(message)s')
+    args = parse_args()
+
+    tic = time.time()
+    if args.format in ('coco', 'both'):
+        root = os.path.join(args.out, 'coco')
+        write_coco_standin(
+            root, ('train2017', 'val2017'),
+            num_images={'train2017': args.images,
+                        'val2017': args.val_images},
+            max_persons=args.persons, unique_images=args.unique_images,
+            paired=not args.no_paired, seed=args.seed
+        )
+        logger.info('=> COCO: DATASET.ROOT {} TEST.COCO_BBOX_FILE {}'.format(
+            root, os.path.join(root, 'val2017_det.json')))
+    if args.format in ('mpii', 'both'):
+        root = os.path.join(args.out, 'mpii')
+        write_mpii_standin(
+            root, ('train', 'valid'),
+            num_images={'train': args.images, 'valid': args.val_images},
+            max_persons=args.persons, unique_images=args.unique_images,
+            paired=not args.no_paired, seed=args.seed
+        )
+        logger.info('=> MPII: DATASET.ROOT {}'.format(root))
+    if args.occluder_variants > 0:
+        # gengxin3/ is read relative to the working directory, or point
+        # DATASET.OCCLUDER_ROOT at it
+        write_occluder_library(os.path.join(args.out, 'gengxin3'),
+                               variants=args.occluder_variants,
+                               seed=args.seed)
+    logger.info('=> done in {:.1f}s'.format(time.time() - tic))
+
+
+if __name__ == '__main__':
+    main()
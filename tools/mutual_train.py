@@ -0,0 +1,245 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import importlib
+import os
+import pprint
+import random
+
+import torch
+import torch.backends.cudnn as cudnn
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import torch.optim
+import torch.utils.data
+import torchvision.transforms as transforms
+from torch.utils.data.distributed import DistributedSampler
+
+from lib.config import cfg
+from lib.config import update_config
+from lib.core.amp import build_mixed_precision
+from lib.core.exchange import FeatureExchange
+from lib.core.exchange import GNET_RANK
+from lib.core.exchange import ROLES
+from lib.core.function import mutual_learning_worker
+from lib.core.function import validate
+from lib.core.loss import JointsMSELoss
+from lib.utils.utils import create_logger
+from lib.utils.utils import get_optimizer
+from lib.utils.utils import save_checkpoint1
+
+import lib.dataset as dataset
+from lib.dataset.samplers import SeededDataset
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Mutual learning with GNet and ENet in two processes')
+
+    parser.add_argument('--cfg',
+                        help='experiment configure file name',
+                        required=True,
+                        type=str)
+    parser.add_argument('--seed', type=int, default=304)
+    parser.add_argument('--rank',
+                        help='0 for GNet, 1 for ENet when every process is '
+                             'started by hand (e.g. on two hosts), -1 to '
+                             'start both here',
+                        type=int,
+                        default=-1)
+    parser.add_argument('--dist-url',
+                        help='rendezvous of the two processes',
+                        type=str,
+                        default='tcp://127.0.0.1:23456')
+    parser.add_argument('--backend',
+                        help='gloo, or nccl with both networks on GPUs',
+                        type=str,
+                        default='gloo')
+    parser.add_argument('--cpu',
+                        help='train and validate on the CPU',
+                        action='store_true')
+    parser.add_argument('opts',
+                        help="Modify config options using the command-line",
+                        default=None,
+                        nargs=argparse.REMAINDER)
+    parser.add_argument('--modelDir',
+                        help='model directory',
+                        type=str,
+                        default='')
+    parser.add_argument('--logDir',
+                        help='log directory',
+                        type=str,
+                        default='')
+    parser.add_argument('--dataDir',
+                        help='data directory',
+                        type=str,
+                        default='')
+    parser.add_argument('--prevModelDir',
+                        help='prev Model directory',
+                        type=str,
+                        default='')
+
+    return parser.parse_args()
+
+
+def worker(rank, args):
+    update_config(cfg, args)
+    role = ROLES[rank]
+
+    # the data order and augmentation are shared, the initial weights not
+    random.seed(args.seed + rank)
+    torch.manual_seed(args.seed + rank)
+
+    logger, final_output_dir, tb_log_dir = create_logger(
+        cfg, args.cfg, 'train_' + role.lower())
+    output_dir = os.path.join(final_output_dir, role.lower())
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    logger.info(pprint.pformat(args))
+    logger.info(cfg)
+
+    # cudnn related setting
+    cudnn.benchmark = cfg.CUDNN.BENCHMARK
+    torch.backends.cudnn.deterministic = cfg.CUDNN.DETERMINISTIC
+    torch.backends.cudnn.enabled = cfg.CUDNN.ENABLED
+
+    if args.cpu or not torch.cuda.is_available():
+        device = torch.device('cpu')
+    else:
+        gpus = list(cfg.GPUS)
+        device = torch.device('cuda:{}'.format(gpus[rank % len(gpus)]))
+        torch.cuda.set_device(device)
+    dist.init_process_group(
+        backend=args.backend, init_method=args.dist_url,
+        world_size=2, rank=rank
+    )
+    exchange = FeatureExchange()
+
+    suffix = '_kd' if rank == GNET_RANK else '_kdstu'
+    model = importlib.import_module(
+        'lib.models.' + cfg.MODEL.NAME + suffix).get_pose_net_kd(
+            cfg, is_train=True)
+    model = model.to(device)
+    logger.info('=> {} is {} on {}'.format(
+        role, type(model).__name__, device))
+
+    criterion = JointsMSELoss(
+        use_target_weight=cfg.LOSS.USE_TARGET_WEIGHT
+    )
+
+    # Data loading code, both processes read the same batches
+    normalize = transforms.Normalize(
+        mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]
+    )
+    train_dataset = SeededDataset(eval('dataset.'+cfg.DATASET.DATASET)(
+        cfg, cfg.DATASET.ROOT, cfg.DATASET.TRAIN_SET, True,
+        transforms.Compose([
+            transforms.ToTensor(),
+            normalize,
+        ])
+    ), seed=args.seed)
+    valid_dataset = eval('dataset.'+cfg.DATASET.DATASET)(
+        cfg, cfg.DATASET.ROOT, cfg.DATASET.TEST_SET, False,
+        transforms.Compose([
+            transforms.ToTensor(),
+            normalize,
+        ])
+    )
+    train_sampler = DistributedSampler(
+        train_dataset, num_replicas=1, rank=0,
+        shuffle=cfg.TRAIN.SHUFFLE, seed=args.seed
+    )
+    train_loader = torch.utils.data.DataLoader(
+        train_dataset,
+        batch_size=cfg.TRAIN.BATCH_SIZE_PER_GPU,
+        num_workers=cfg.WORKERS,
+        pin_memory=cfg.PIN_MEMORY and device.type == 'cuda',
+        drop_last=True,
+        sampler=train_sampler
+    )
+    valid_loader = torch.utils.data.DataLoader(
+        valid_dataset,
+        batch_size=cfg.TEST.BATCH_SIZE_PER_GPU,
+        shuffle=False,
+        num_workers=cfg.WORKERS,
+        pin_memory=cfg.PIN_MEMORY and device.type == 'cuda'
+    )
+
+    best_perf = 0.0
+    best_model = False
+    last_epoch = -1
+    optimizer = get_optimizer(cfg, model)
+    amp = build_mixed_precision(cfg, device.type)
+    begin_epoch = cfg.TRAIN.BEGIN_EPOCH
+    checkpoint_file = os.path.join(output_dir, 'checkpoint.pth')
+
+    if cfg.AUTO_RESUME and os.path.exists(checkpoint_file):
+        logger.info("=> loading checkpoint '{}'".format(checkpoint_file))
+        checkpoint = torch.load(checkpoint_file, map_location=device)
+        begin_epoch = checkpoint['epoch']
+        best_perf = checkpoint['perf']
+        last_epoch = checkpoint['epoch']
+        model.load_state_dict(checkpoint['state_dict'])
+
+        optimizer.load_state_dict(checkpoint['optimizer'])
+        amp.load_state_dict(checkpoint['scaler'])
+        logger.info("=> loaded checkpoint '{}' (epoch {})".format(
+            checkpoint_file, checkpoint['epoch']))
+
+    lr_scheduler = torch.optim.lr_scheduler.MultiStepLR(
+        optimizer, cfg.TRAIN.LR_STEP, cfg.TRAIN.LR_FACTOR,
+        last_epoch=last_epoch
+    )
+
+    for epoch in range(begin_epoch, cfg.TRAIN.END_EPOCH):
+        train_sampler.set_epoch(epoch)
+        train_dataset.set_epoch(epoch)
+
+        # train for one epoch, in step with the other process
+        mutual_learning_worker(cfg, train_loader, model, criterion, optimizer,
+                               epoch, output_dir, tb_log_dir, exchange, amp)
+        lr_scheduler.step()
+
+        perf_indicator = validate(
+            cfg, valid_loader, valid_dataset, model, criterion,
+            output_dir, tb_log_dir,
+            'teacher' if rank == GNET_RANK else 'student', device
+        )
+        if perf_indicator >= best_perf:
+            best_perf = perf_indicator
+            best_model = True
+        else:
+            best_model = False
+        logger.info('=> saving {} checkpoint to {}'.format(role, output_dir))
+        save_checkpoint1({
+            'epoch': epoch + 1,
+            'model': cfg.MODEL.NAME + suffix,
+            'state_dict': model.state_dict(),
+            'perf': perf_indicator,
+            'optimizer': optimizer.state_dict(),
+            'scaler': amp.state_dict(),
+        }, best_model, output_dir)
+
+    final_model_state_file = os.path.join(output_dir, 'final_state.pth')
+    logger.info('=> saving final model state to {}'.format(
+        final_model_state_file))
+    torch.save(model.state_dict(), final_model_state_file)
+    dist.destroy_process_group()
+
+
+def main():
+    args = parse_args()
+    if args.rank >= 0:
+        worker(args.rank, args)
+    else:
+        # forked, so the DataLoader workers of every epoch are forked as
+        # well instead of spawned with a fresh import of everything
+        mp.start_processes(worker, args=(args,), nprocs=2,
+                           start_method='fork')
+
+
+if __name__ == '__main__':
+    main()